@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of calling builtins with many arguments, and passing them as
+values, against the nested calls and wrapping lambdas needed otherwise.
+
+    $ python benchmarks/builtins.py [engine]
+"""
+
+import sys
+import timeit
+from os.path import dirname, join, abspath
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from diylisp.interpreter import ENGINES
+from diylisp.parser import parse, parse_multiple
+from diylisp.types import Environment
+
+SETUP = """
+    (define sum4
+        (lambda (n acc)
+            (if (eq n 0) acc (sum4 (- n 1) %s))))
+    (define fold
+        (lambda (f lst acc)
+            (if (empty lst) acc (fold f (tail lst) (f acc (head lst))))))
+"""
+
+PROGRAMS = [
+    ("nested", "(+ (+ (+ acc n) n) n)", "(sum4 %d 0)"),
+    ("variadic", "(+ acc n n n)", "(sum4 %d 0)"),
+    ("lambda", "acc", "(fold (lambda (a b) (+ a b)) quoted 0) ; %d"),
+    ("builtin", "acc", "(fold + quoted 0) ; %d"),
+]
+
+# small enough for the engines without tail calls
+SIZE = 300
+
+
+def run(engine, body, program, size, number=50, repeat=3):
+    execute = ENGINES[engine]
+    env = Environment()
+    for ast in parse_multiple(SETUP % body):
+        execute(ast, env)
+    execute(parse("(define quoted '(%s))" % " ".join(map(str, range(size)))), env)
+    ast = parse(program % size)
+    return min(timeit.repeat(lambda: execute(ast, env), number=number, repeat=repeat))
+
+
+def main(engine):
+    for name, body, program in PROGRAMS:
+        print("%-10s %.4fs" % (name, run(engine, body, program, SIZE)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else "eval")
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the memory kept alive by closures.
+
+Each closure is made in a call with a large list in scope, which its body
+does not use. Reports the memory held by the closures, measured as the size
+of the objects tracked by the garbage collector.
+
+    $ python benchmarks/closures.py [engine]
+"""
+
+import gc
+import sys
+from os.path import dirname, join, abspath
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from diylisp.interpreter import ENGINES, interpret_file
+from diylisp.parser import parse, parse_multiple
+from diylisp.types import Environment
+
+SETUP = """
+    (define make-adder
+        (lambda (n)
+            ((lambda (data)
+                (lambda (x) (+ x n)))
+             (range 1 1000))))
+    (define build
+        (lambda (n acc)
+            (if (eq n 0) acc (build (- n 1) (cons (make-adder n) acc)))))
+"""
+
+COUNT = 1000
+
+
+def memory():
+    gc.collect()
+    return sum(sys.getsizeof(obj) for obj in gc.get_objects())
+
+
+def run(engine):
+    execute = ENGINES[engine]
+    env = Environment()
+    interpret_file(join(dirname(abspath(__file__)), '..', 'stdlib.diy'), env)
+    for ast in parse_multiple(SETUP):
+        execute(ast, env)
+
+    before = memory()
+    execute(parse("(define adders (build %d '()))" % COUNT), env)
+    return memory() - before
+
+
+def main(engine):
+    sys.setrecursionlimit(10000)
+    used = run(engine)
+    print("%d closures: %.0f KB, %.0f bytes per closure"
+          % (COUNT, used / 1024.0, float(used) / COUNT))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else "eval")
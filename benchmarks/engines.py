@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the evaluation engines on a few typical workloads.
+
+    $ python benchmarks/engines.py [engine ...]
+"""
+
+import sys
+import timeit
+from os.path import dirname, join, abspath
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from diylisp.interpreter import ENGINES
+from diylisp.parser import parse_multiple
+from diylisp.types import Environment
+
+sys.setrecursionlimit(10000)
+
+WORKLOADS = [
+    ("sum-to (call heavy)", """
+        (define sum-to
+            (lambda (n)
+                (if (eq n 0)
+                    0
+                    (+ n (sum-to (- n 1))))))
+     """, "(sum-to 500)"),
+
+    ("fib (call heavy)", """
+        (define fib
+            (lambda (n)
+                (if (< n 2)
+                    n
+                    (+ (fib (- n 1)) (fib (- n 2))))))
+     """, "(fib 15)"),
+
+    ("list building (list heavy)", """
+        (define build
+            (lambda (n acc)
+                (if (eq n 0)
+                    acc
+                    (build (- n 1) (cons n acc)))))
+        (define total
+            (lambda (lst)
+                (if (empty lst)
+                    0
+                    (+ (head lst) (total (tail lst))))))
+     """, "(total (build 300 '()))"),
+]
+
+
+def run(engine, setup, program, repeat=5):
+    execute = ENGINES[engine]
+    env = Environment()
+    for ast in parse_multiple(setup):
+        execute(ast, env)
+    ast, = parse_multiple(program)
+    return min(timeit.repeat(lambda: execute(ast, env), number=1, repeat=repeat))
+
+
+def main(engines):
+    for name, setup, program in WORKLOADS:
+        print(name)
+        baseline = None
+        for engine in engines:
+            time = run(engine, setup, program)
+            baseline = baseline or time
+            print("    %-10s %.4fs  (%.1fx)" % (engine, time, baseline / time))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or ["eval"] + sorted(set(ENGINES) - set(["eval"])))
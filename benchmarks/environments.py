@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of function calls, as the global environment grows.
+
+The cost of a call should not depend on the number of global definitions.
+
+    $ python benchmarks/environments.py [engine]
+"""
+
+import sys
+import timeit
+from os.path import dirname, join, abspath
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from diylisp.interpreter import ENGINES
+from diylisp.parser import parse, parse_multiple
+from diylisp.types import Environment
+
+sys.setrecursionlimit(10000)
+
+SETUP = """
+    (define count-down
+        (lambda (n)
+            (if (eq n 0)
+                0
+                (count-down (- n 1)))))
+"""
+
+PROGRAM = "(count-down 1000)"
+
+SIZES = [10, 100, 1000, 10000]
+
+
+def run(engine, size, repeat=5):
+    execute = ENGINES[engine]
+    env = Environment()
+    for n in range(size):
+        env.set("global-%d" % n, n)
+    for ast in parse_multiple(SETUP):
+        execute(ast, env)
+    ast = parse(PROGRAM)
+    return min(timeit.repeat(lambda: execute(ast, env), number=1, repeat=repeat))
+
+
+def main(engine):
+    print("%s, 1000 calls" % PROGRAM)
+    for size in SIZES:
+        print("    %6d globals  %.4fs" % (size, run(engine, size)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else "eval")
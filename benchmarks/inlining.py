@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of a boolean heavy program, with and without the optimizer
+inlining the small logical functions.
+
+    $ python benchmarks/inlining.py [engine]
+"""
+
+import sys
+import timeit
+from os.path import dirname, join, abspath
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from diylisp.interpreter import ENGINES
+from diylisp.optimizer import optimize_all
+from diylisp.parser import parse_multiple
+from diylisp.types import Environment
+
+sys.setrecursionlimit(10000)
+
+SETUP = """
+    (define not (lambda (b) (if b #f #t)))
+    (define and (lambda (a b) (if a b #f)))
+    (define or (lambda (a b) (if a #t b)))
+    (define rule
+        (lambda (fizz buzz small)
+            (or (and fizz (not buzz))
+                (and (not fizz) (or buzz small)))))
+    (define count
+        (lambda (n acc)
+            (if (eq n 0)
+                acc
+                (count (- n 1)
+                       (if (rule (eq (mod n 3) 0) (eq (mod n 5) 0) (< n 10))
+                           (+ acc 1)
+                           acc)))))
+"""
+
+PROGRAM = "(count 500 0)"
+
+
+def run(engine, optimize, repeat=5):
+    execute = ENGINES[engine]
+    env = Environment()
+    asts = parse_multiple(SETUP + PROGRAM)
+    if optimize:
+        asts = optimize_all(asts, env)
+    for ast in asts:
+        program = ast
+        execute(ast, env)
+    return min(timeit.repeat(lambda: execute(program, env), number=1, repeat=repeat))
+
+
+def main(engine):
+    plain = run(engine, optimize=False)
+    inlined = run(engine, optimize=True)
+    print(PROGRAM)
+    print("    plain      %.4fs" % plain)
+    print("    inlined    %.4fs  (%.1fx)" % (inlined, plain / inlined))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else "eval")
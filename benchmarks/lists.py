@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of building and walking long lists with `cons`, `head` and `tail`.
+
+    $ python benchmarks/lists.py [engine]
+"""
+
+import sys
+import timeit
+from os.path import dirname, join, abspath
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from diylisp.interpreter import ENGINES
+from diylisp.parser import parse, parse_multiple
+from diylisp.types import Environment
+
+SETUP = """
+    (define build
+        (lambda (n acc)
+            (if (eq n 0) acc (build (- n 1) (cons n acc)))))
+    (define total
+        (lambda (lst acc)
+            (if (empty lst) acc (total (tail lst) (+ acc (head lst))))))
+"""
+
+SIZES = [10000, 30000, 100000]
+
+
+def run(engine, program, size, repeat=3):
+    execute = ENGINES[engine]
+    env = Environment()
+    for ast in parse_multiple(SETUP):
+        execute(ast, env)
+    execute(parse("(define quoted '(%s))" % " ".join(map(str, range(size)))), env)
+    ast = parse(program % size)
+    return min(timeit.repeat(lambda: execute(ast, env), number=1, repeat=repeat))
+
+
+def main(engine):
+    for program in ["(build %d '())",
+                    "(total (build %d '()) 0)",
+                    "(total quoted 0) ; %d"]:
+        print(program.split(";")[0].strip())
+        for size in SIZES:
+            print("    %6d elements  %.4fs" % (size, run(engine, program, size)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else "eval")
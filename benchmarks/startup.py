@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+"""
+Startup benchmark for the on-disk AST cache.
+
+Compares the time it takes to load a program with the cache disabled
+(parsing from scratch), on a cold cache (parsing and writing the entry)
+and on a warm cache (loading the entry).
+
+    $ python benchmarks/startup.py [number-of-definitions]
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import timeit
+from os.path import dirname, join, abspath
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from diylisp import cache
+from diylisp.parser import parse_file
+
+DEFINITION = """
+(define fn-%(n)d
+    ;; A generated function, like the ones in our rule files
+    (lambda (x y)
+        (if (> x %(n)d)
+            (cons x '(%(n)d a b c))
+            (fn-%(n)d (+ x 1) (* y 2)))))
+"""
+
+
+def load(filename):
+    for _ in parse_file(filename):
+        pass
+
+
+def best_of(fn, repeat=5):
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+def main(size):
+    tmp = tempfile.mkdtemp()
+    try:
+        filename = join(tmp, "program.diy")
+        with open(filename, "w") as f:
+            for n in range(size):
+                f.write(DEFINITION % {"n": n})
+
+        cache.enabled = False
+        uncached = best_of(lambda: load(filename))
+
+        cache.enabled = True
+        with open(filename) as sourcefile:
+            cache_file = cache.path_for(cache.file_key(sourcefile), filename)
+
+        def cold():
+            if os.path.exists(cache_file):
+                os.remove(cache_file)
+            load(filename)
+        cold_time = best_of(cold)
+
+        load(filename)
+        warm = best_of(lambda: load(filename))
+
+        print("definitions:     %d (%d bytes)" % (size, os.path.getsize(filename)))
+        print("no cache:        %.4fs" % uncached)
+        print("cold cache:      %.4fs" % cold_time)
+        print("warm cache:      %.4fs (%.1fx faster)" % (warm, uncached / warm))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the list functions of `stdlib.diy`, with their native
+implementations and with their lisp definitions.
+
+    $ python benchmarks/stdlib.py [engine]
+"""
+
+import sys
+import timeit
+from os.path import dirname, join, abspath
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from diylisp.evaluator import use_natives
+from diylisp.interpreter import ENGINES, interpret_file
+from diylisp.parser import parse
+from diylisp.types import Environment
+
+PROGRAMS = [
+    "(length (range 1 %d))",
+    "(sum (map (lambda (x) (* x x)) (range 1 %d)))",
+    "(reverse (filter (lambda (x) (> x 10)) (range 1 %d)))",
+    "(sort (reverse (range 1 %d)))",
+]
+
+SIZES = [50, 100, 200]
+
+
+def run(engine, program, size, repeat=3):
+    execute = ENGINES[engine]
+    env = Environment()
+    interpret_file(join(dirname(abspath(__file__)), '..', 'stdlib.diy'), env)
+    ast = parse(program % size)
+    return min(timeit.repeat(lambda: execute(ast, env), number=1, repeat=repeat))
+
+
+def main(engine):
+    # the lisp definitions are not tail recursive
+    sys.setrecursionlimit(20000)
+    for program in PROGRAMS:
+        print(program.replace("%d", "n"))
+        for size in SIZES:
+            use_natives(False)
+            pure = run(engine, program, size)
+            use_natives(True)
+            native = run(engine, program, size)
+            print("    %4d elements  lisp %.4fs  native %.4fs  (%.0fx)"
+                  % (size, pure, native, pure / native))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else "eval")
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of tiered execution: programs evaluated as usual, and with a
+tiering policy promoting the functions they call most often to Python code.
+
+    $ python benchmarks/tiering.py [call threshold]
+"""
+
+import sys
+import timeit
+from os.path import dirname, join, abspath
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from diylisp import tiering
+from diylisp.interpreter import interpret_file
+from diylisp.evaluator import evaluate
+from diylisp.parser import parse, parse_multiple
+from diylisp.types import Environment
+
+SETUP = """
+    (define fib (lambda (n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))))
+    (define loop (lambda (n acc) (if (eq n 0) acc (loop (- n 1) (+ acc n)))))
+"""
+
+PROGRAMS = [
+    "(fib 16)",
+    "(loop 20000 0)",
+    "(sum (map (lambda (x) (* x x)) (range 1 2000)))",
+]
+
+
+def run(program, policy, repeat=3):
+    def execute():
+        env = Environment()
+        interpret_file(join(dirname(abspath(__file__)), '..', 'stdlib.diy'), env)
+        for ast in parse_multiple(SETUP):
+            evaluate(ast, env)
+        evaluate(parse(program), env)
+
+    previous = tiering.install(policy)
+    try:
+        return min(timeit.repeat(execute, number=1, repeat=repeat))
+    finally:
+        tiering.install(previous)
+
+
+def main(threshold):
+    for program in PROGRAMS:
+        cold = run(program, None)
+        policy = tiering.Tiering(call_threshold=threshold)
+        tiered = run(program, policy)
+        print("%-50s %.4fs  tiered %.4fs (%.1fx, %d promoted)"
+              % (program, cold, tiered, cold / tiered, policy.promoted))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else tiering.DEFAULT_CALL_THRESHOLD)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of transpiled functions, against the same functions evaluated by
+an engine, and written in Python.
+
+    $ python benchmarks/transpiler.py [engine]
+"""
+
+import sys
+import timeit
+from os.path import dirname, join, abspath
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from diylisp.interpreter import ENGINES
+from diylisp.parser import parse
+from diylisp.types import Environment
+
+FUNCTIONS = [
+    ("fact", "(lambda (n) (if (eq n 0) 1 (* n (fact (- n 1)))))", "(fact 12)"),
+    ("fib", "(lambda (n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))", "(fib 15)"),
+    ("loop", "(lambda (n acc) (if (eq n 0) acc (loop (- n 1) (+ acc n))))", "(loop 300 0)"),
+]
+
+
+def fact(n):
+    return 1 if n == 0 else n * fact(n - 1)
+
+
+def fib(n):
+    return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+
+def loop(n, acc):
+    while n != 0:
+        n, acc = n - 1, acc + n
+    return acc
+
+
+PYTHON = {"fact": lambda: fact(12), "fib": lambda: fib(15), "loop": lambda: loop(300, 0)}
+
+
+def run(engine, name, function, program, transpile, number=20, repeat=3):
+    execute = ENGINES[engine]
+    env = Environment()
+    if transpile:
+        function = "(transpile %s)" % function
+    execute(parse("(define %s %s)" % (name, function)), env)
+    ast = parse(program)
+    return min(timeit.repeat(lambda: execute(ast, env), number=number, repeat=repeat))
+
+
+def main(engine):
+    for name, function, program in FUNCTIONS:
+        evaluated = run(engine, name, function, program, transpile=False)
+        transpiled = run(engine, name, function, program, transpile=True)
+        python = min(timeit.repeat(PYTHON[name], number=20, repeat=3))
+        print("%-5s %s  %.4fs  transpiled %.4fs (%.0fx)  python %.4fs"
+              % (name, engine, evaluated, transpiled, evaluated / transpiled, python))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else "eval")
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of summing and scaling numbers, as lists walked by lisp functions
+and as vectors.
+
+    $ python benchmarks/vectors.py [engine]
+"""
+
+import sys
+import timeit
+from os.path import dirname, join, abspath
+
+sys.path.insert(0, join(dirname(abspath(__file__)), '..'))
+
+from diylisp.interpreter import ENGINES
+from diylisp.parser import parse, parse_multiple
+from diylisp.types import Environment
+
+SETUP = """
+    (define sum-squares
+        (lambda (lst acc)
+            (if (empty lst) acc (sum-squares (tail lst) (+ acc (* (head lst) (head lst)))))))
+    (define scale
+        (lambda (lst k)
+            (if (empty lst) '() (cons (* k (head lst)) (scale (tail lst) k)))))
+"""
+
+PROGRAMS = [
+    ("(sum-squares numbers 0)", "(vsum (* numbers numbers))"),
+    ("(scale numbers 3)", "(* numbers 3)"),
+]
+
+# small enough for the engines without tail calls
+SIZE = 200
+
+
+def run(engine, numbers, program, repeat=3, number=20):
+    execute = ENGINES[engine]
+    env = Environment()
+    for ast in parse_multiple(SETUP):
+        execute(ast, env)
+    execute(parse("(define numbers %s)" % numbers), env)
+    ast = parse(program)
+    return min(timeit.repeat(lambda: execute(ast, env), number=number, repeat=repeat))
+
+
+def main(engine):
+    items = " ".join(map(str, range(SIZE)))
+    for lists, vectors in PROGRAMS:
+        print("%-40s %.4fs" % (lists, run(engine, "'(%s)" % items, lists)))
+        print("%-40s %.4fs" % (vectors, run(engine, "[%s]" % items, vectors)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else "eval")
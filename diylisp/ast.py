@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
-from .types import Closure
+from array import array
+
+from .types import Closure, Builtin, LispList
 
 """
 This module contains a few simple helper functions for
@@ -16,6 +18,11 @@ def is_list(x):
     return isinstance(x, list)
 
 
+def is_list_value(x):
+    """Whether `x` is a list, as an AST or a value made by `cons` or `tail`."""
+    return isinstance(x, (list, LispList))
+
+
 def is_boolean(x):
     return isinstance(x, bool)
 
@@ -24,12 +31,37 @@ def is_integer(x):
     return isinstance(x, int)
 
 
+def is_vector(x):
+    return isinstance(x, array)
+
+
 def is_closure(x):
     return isinstance(x, Closure)
 
 
+def is_builtin(x):
+    return isinstance(x, Builtin)
+
+
+def is_procedure(x):
+    """Whether `x` can be called, as a closure or a builtin."""
+    return isinstance(x, (Closure, Builtin))
+
+
 def is_atom(x):
     return (is_symbol(x) or
     	is_integer(x) or
     	is_boolean(x) or
-    	is_closure(x))
+    	is_closure(x) or
+    	is_builtin(x) or
+    	is_vector(x))
+
+
+def hashable(value):
+    """A hashable key for a lisp value, equal for equal values. Lists become
+    tuples, and the type is part of the key for atoms, since `1 == True`."""
+    if is_list_value(value):
+        return tuple(hashable(item) for item in value)
+    if is_vector(value):
+        return (array, tuple(value))
+    return (type(value), value)
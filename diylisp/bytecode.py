@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+from array import array
+
+from .types import LispError, Symbol
+from .ast import is_boolean, is_atom, is_symbol, is_list, is_closure, is_integer, \
+    is_vector
+from .asserts import assert_exp_length
+from .parser import unparse
+from .evaluator import BUILTINS, FOLDED, QUOTE, IF, ATOM, EQ, DEFINE, LAMBDA, CONS, \
+    HEAD, TAIL, EMPTY, is_special_form, accepts_args, free_variables
+from .optimizer import INLINED
+
+"""
+This module compiles ASTs into bytecode for the virtual machine in `vm.py`.
+
+The bytecode of an expression is kept in a `Code` object. Instructions are
+stored as pairs of integers, an opcode and an argument, in a compact `array`.
+Values the instructions refer to, such as constants, symbols and the code of
+nested lambdas, are kept in the constant pool of the code object, and the
+instruction arguments are indices into this pool.
+
+Like with the `compiler` module, malformed expressions compile to code raising
+the same error `evaluate` would, once it is run.
+"""
+
+# Opcodes. The argument is unused where not mentioned.
+CONST = 0           # push constant #arg
+LOOKUP = 1          # push the value of symbol #arg
+CALL = 2            # call the closure below the top arg values on the stack
+TAIL_CALL = 3       # ... replacing the current frame
+CHECK_CALL = 4      # verify that the top of the stack is a closure taking
+                    # `n` arguments, where constant #arg is (n, callee)
+BUILTIN = 5         # pop two values, and push the result of builtin #arg
+JUMP_IF_FALSE = 6   # pop a value, and jump to instruction arg if false
+JUMP = 7            # jump to instruction arg
+RETURN = 8          # return the top of the stack from the current frame
+ATOM_P = 9
+EQ_P = 10
+CONS_P = 11
+HEAD_P = 12
+TAIL_P = 13
+EMPTY_P = 14
+DEFINE_SYM = 15     # bind symbol #arg to the top of the stack, leaving it there
+MAKE_CLOSURE = 16   # push a closure for the lambda in constant #arg
+FAIL = 17           # raise the error in constant #arg
+EVAL_LIST = 18      # push the value of special form #arg, using `eval_list`
+BUILTIN_N = 19      # pop n values, and push the result of builtin `name`,
+                    # where constant #arg is (name, n)
+UNCHANGED = 20      # push whether symbol `name` is bound to `closure`, where
+                    # constant #arg is (name, closure)
+
+OPNAMES = dict((value, name) for name, value in list(globals().items())
+               if isinstance(value, int) and name.isupper() and name != "OPNAMES")
+
+
+class Code:
+    """A compiled expression."""
+
+    def __init__(self):
+        self.ops = array('i')
+        self.consts = []
+        self.const_index = {}
+
+    def __repr__(self):
+        return "<code /%d>" % (len(self.ops) // 2)
+
+    def emit(self, op, arg=0):
+        """Append an instruction, returning its index."""
+        self.ops.append(op)
+        self.ops.append(arg)
+        return len(self.ops) - 2
+
+    def patch(self, index, arg):
+        """Set the argument of the instruction at `index`."""
+        self.ops[index + 1] = arg
+
+    def here(self):
+        """Index of the next instruction to be emitted."""
+        return len(self.ops)
+
+    def const(self, value):
+        """Index of a value in the constant pool, adding it if needed."""
+        index = self.const_index.get(id(value))
+        if index is None:
+            index = self.const_index[id(value)] = len(self.consts)
+            self.consts.append(value)
+        return index
+
+    def disassemble(self):
+        """Human readable listing of the instructions."""
+        lines = []
+        for pc in range(0, len(self.ops), 2):
+            op, arg = self.ops[pc], self.ops[pc + 1]
+            lines.append("%4d %-14s %d" % (pc, OPNAMES[op], arg))
+        return "\n".join(lines)
+
+
+class Lambda:
+    """Constant pool entry for a lambda expression, with the variables its
+    closures capture from the environment they are made in."""
+
+    def __init__(self, params, body, code):
+        self.params = params
+        self.body = body
+        self.code = code
+        self.free = free_variables(params, body)
+
+
+def compile_ast(ast):
+    """Compile a top level expression into a code object."""
+    code = Code()
+    compile_exp(ast, code, tail=False)
+    code.emit(RETURN)
+    return code
+
+
+def compile_body(body):
+    """Compile the body of a function. Calls in tail position of the
+    body will reuse the frame of the function."""
+    code = Code()
+    compile_exp(body, code, tail=True)
+    code.emit(RETURN)
+    return code
+
+
+def compile_exp(ast, code, tail):
+    start = code.here()
+    try:
+        if is_boolean(ast) or is_integer(ast) or is_vector(ast):
+            code.emit(CONST, code.const(ast))
+        elif is_symbol(ast):
+            code.emit(LOOKUP, code.const(Symbol(ast)))
+        elif is_list(ast):
+            compile_list(ast, code, tail)
+        elif is_atom(ast):
+            raise LispError("Cannot evaluate atom: %s" % unparse(ast))
+        else:
+            code.emit(CONST, code.const(None))
+    except LispError as e:
+        del code.ops[start:]
+        code.emit(FAIL, code.const(e))
+
+
+def compile_list(ast, code, tail):
+    if len(ast) == 0:
+        code.emit(CONST, code.const([]))
+        return
+
+    first = ast[0]
+    if is_symbol(first):
+        first = Symbol(first)
+        if first in SPECIAL_FORMS:
+            SPECIAL_FORMS[first](ast, code, tail)
+        elif first in BUILTINS:
+            compile_builtin(ast, code)
+        elif is_special_form(first):
+            # registered from Python, leave it to the evaluator
+            code.emit(EVAL_LIST, code.const(ast))
+        else:
+            code.emit(LOOKUP, code.const(first))
+            compile_call(ast, code, tail, callee=None)
+    elif is_closure(first):
+        code.emit(CONST, code.const(first))
+        compile_call(ast, code, tail, callee=None)
+    elif is_list(first):
+        compile_exp(first, code, tail=False)
+        compile_call(ast, code, tail, callee=first)
+    else:
+        raise LispError("not a function: %s" % unparse(first))
+
+
+def compile_call(ast, code, tail, callee):
+    """Compile a call, with the code for the function already emitted."""
+    args = ast[1:]
+    code.emit(CHECK_CALL, code.const((len(args), callee)))
+    for arg in args:
+        compile_exp(arg, code, tail=False)
+    code.emit(TAIL_CALL if tail else CALL, len(args))
+
+
+def compile_quote(ast, code, tail):
+    assert_exp_length(ast, 2)
+    code.emit(CONST, code.const(ast[1]))
+
+
+def compile_if(ast, code, tail):
+    assert_exp_length(ast, 4)
+    compile_exp(ast[1], code, tail=False)
+    jump_if_false = code.emit(JUMP_IF_FALSE)
+    compile_exp(ast[2], code, tail)
+    jump = code.emit(JUMP)
+    code.patch(jump_if_false, code.here())
+    compile_exp(ast[3], code, tail)
+    code.patch(jump, code.here())
+
+
+def compile_define(ast, code, tail):
+    if len(ast) != 3:
+        raise LispError("define: Wrong number of arguments")
+
+    symbol = ast[1]
+    if not is_symbol(symbol):
+        raise LispError("define: non-symbol: %s" % unparse(symbol))
+    compile_exp(ast[2], code, tail=False)
+    code.emit(DEFINE_SYM, code.const(Symbol(symbol)))
+
+
+def compile_lambda(ast, code, tail):
+    if len(ast) != 3:
+        raise LispError("lambda: Wrong number of arguments")
+    params = ast[1]
+    body = ast[2]
+
+    if not is_list(params):
+        raise LispError("lambda: params must be lists: %s" % unparse(params))
+    code.emit(MAKE_CLOSURE, code.const(Lambda(params, body, compile_body(body))))
+
+
+def compile_inlined(ast, code, tail):
+    """The `%inlined` form made by the optimizer: the inlined body if the
+    function still is the one that was inlined, else the original call."""
+    assert_exp_length(ast, 5)
+    _, name, closure, body, call = ast
+    code.emit(UNCHANGED, code.const((Symbol(name), closure)))
+    jump_if_false = code.emit(JUMP_IF_FALSE)
+    compile_exp(body, code, tail)
+    jump = code.emit(JUMP)
+    code.patch(jump_if_false, code.here())
+    compile_exp(call, code, tail)
+    code.patch(jump, code.here())
+
+
+def compile_cons(ast, code, tail):
+    if len(ast) != 3:
+        raise LispError("cons: wrong number of arguments")
+    compile_exp(ast[1], code, tail=False)
+    compile_exp(ast[2], code, tail=False)
+    code.emit(CONS_P)
+
+
+def compile_atom(ast, code, tail):
+    assert_exp_length(ast, 2)
+    compile_exp(ast[1], code, tail=False)
+    code.emit(ATOM_P)
+
+
+def compile_unary(name, op):
+    def compile_form(ast, code, tail):
+        if len(ast) != 2:
+            raise LispError("%s: wrong number of arguments" % name)
+        compile_exp(ast[1], code, tail=False)
+        code.emit(op)
+    return compile_form
+
+
+def compile_eq(ast, code, tail):
+    assert_exp_length(ast, 3)
+    compile_exp(ast[1], code, tail=False)
+    compile_exp(ast[2], code, tail=False)
+    code.emit(EQ_P)
+
+
+def compile_builtin(ast, code):
+    name = ast[0]
+    args = ast[1:]
+    if len(args) != 2 and not accepts_args(name, len(args)):
+        assert_exp_length(ast, 3)
+
+    if name in FOLDED or len(args) == 2:
+        # combine the values from the left as they are computed
+        if len(args) == 1:
+            code.emit(CONST, code.const(FOLDED[name]))
+        else:
+            compile_exp(args[0], code, tail=False)
+            args = args[1:]
+        for arg in args:
+            compile_exp(arg, code, tail=False)
+            code.emit(BUILTIN, code.const(name))
+    else:
+        for arg in args:
+            compile_exp(arg, code, tail=False)
+        code.emit(BUILTIN_N, code.const((name, len(args))))
+
+
+SPECIAL_FORMS = {
+    QUOTE: compile_quote,
+    IF: compile_if,
+    ATOM: compile_atom,
+    EQ: compile_eq,
+    DEFINE: compile_define,
+    LAMBDA: compile_lambda,
+    CONS: compile_cons,
+    HEAD: compile_unary("head", HEAD_P),
+    TAIL: compile_unary("tail", TAIL_P),
+    EMPTY: compile_unary("empty", EMPTY_P),
+    INLINED: compile_inlined,
+}
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import marshal
+import hashlib
+import binascii
+import tempfile
+from os.path import basename, dirname, exists, join
+
+from . import __version__
+from .ast import is_vector
+from .types import Symbol, make_vector
+
+"""
+An on-disk cache of parsed programs.
+
+Parsing is by far the most expensive part of starting the interpreter, so the
+ASTs of each program are stored in a compact binary form (using `marshal`) the
+first time it is read. Later runs load the ASTs straight from the cache.
+`marshal` does not keep the type of `array`s, so vectors are stored as tuples,
+which do not otherwise occur in ASTs. Each entry ends with a marker, so an
+entry that was cut short, say by a full disk, is not used, and the program
+is parsed again.
+
+Cache entries are keyed by a hash of the source together with the versions of
+the interpreter and of Python, so stale entries are never used. By default,
+the cache for `some/file.diy` is kept in `some/__diycache__/file.diyc`. When
+the `DIYLISP_CACHE_DIR` environment variable is set, all entries are instead
+kept in that directory, named by their key. Sources that are not files (as
+passed to `parse_multiple`) are only cached when a cache directory is set.
+Files that can not seek, like pipes, are not cached, as they can not be read
+again after computing their key.
+
+Set `DIYLISP_NO_CACHE` to disable the cache altogether.
+"""
+
+# Changed along with the format of entries, or the ASTs the parser makes
+MAGIC = b"DIYC\x03"
+# Ends complete entries, after the ASTs
+END = b"DIYC-END"
+CHUNK_SIZE = 1 << 16
+
+enabled = not os.environ.get("DIYLISP_NO_CACHE")
+cache_dir = os.environ.get("DIYLISP_CACHE_DIR") or None
+
+
+def new_key():
+    """A hash object for a cache key, to be updated with the source."""
+    key = hashlib.sha1(MAGIC)
+    key.update(__version__.encode("ascii"))
+    key.update(sys.version.encode("ascii"))
+    return key
+
+
+def source_key(source):
+    """Cache key of a program given as a string."""
+    key = new_key()
+    key.update(source.encode("utf-8") if not isinstance(source, bytes) else source)
+    return key.digest()
+
+
+def can_seek(sourcefile):
+    """Whether an open file can be read again after computing its key. Pipes
+    and other streams can not, and are parsed without the cache."""
+    try:
+        sourcefile.seek(0, os.SEEK_CUR)
+    except (IOError, OSError):
+        return False
+    return True
+
+
+def file_key(sourcefile):
+    """Cache key of an open file, which must be able to seek. Leaves the
+    file positioned at the start."""
+    key = new_key()
+    for chunk in iter(lambda: sourcefile.read(CHUNK_SIZE), ""):
+        key.update(chunk)
+    sourcefile.seek(0)
+    return key.digest()
+
+
+def path_for(key, filename=None):
+    """Path of the cache entry with the given key, or None if the source
+    has no place to be cached."""
+    if cache_dir is not None:
+        return join(cache_dir, binascii.hexlify(key).decode("ascii") + ".diyc")
+    if filename is not None:
+        return join(dirname(filename), "__diycache__", basename(filename) + "c")
+    return None
+
+
+def load(path, key):
+    """Return an iterator over the ASTs cached at `path`, or None if there
+    is no valid entry for `key`. The ASTs are loaded one at a time."""
+    if not enabled or path is None or not exists(path):
+        return None
+
+    try:
+        entry = open(path, "rb")
+    except IOError:
+        return None
+
+    end = entry_end(entry)
+    if end is None or entry.read(len(MAGIC)) != MAGIC or entry.read(len(key)) != key:
+        entry.close()
+        return None
+
+    return _load_asts(entry, end)
+
+
+def entry_end(entry):
+    """The position of the `END` marker closing a complete entry, or None
+    if the entry was cut short. Leaves the entry positioned at the start."""
+    try:
+        entry.seek(-len(END), os.SEEK_END)
+    except (IOError, OSError):
+        # shorter than the marker
+        return None
+    end = entry.tell()
+    complete = entry.read() == END
+    entry.seek(0)
+    return end if complete else None
+
+
+def _load_asts(entry, end):
+    with entry:
+        while entry.tell() < end:
+            yield intern_symbols(marshal.load(entry))
+
+
+def intern_symbols(ast):
+    """Turn the plain strings `marshal` gives back into Symbols again, and
+    the tuples into vectors."""
+    if isinstance(ast, str):
+        return Symbol(ast)
+    if isinstance(ast, tuple):
+        return make_vector(ast)
+
+    symbols = Symbol.table
+    lists = [ast] if isinstance(ast, list) else []
+    while lists:
+        items = lists.pop()
+        for n, item in enumerate(items):
+            kind = type(item)
+            if kind is str:
+                items[n] = symbols.get(item) or Symbol(item)
+            elif kind is list:
+                lists.append(item)
+            elif kind is tuple:
+                items[n] = make_vector(item)
+    return ast
+
+
+def encode_vectors(ast):
+    """A copy of `ast` with the vectors in it replaced by tuples."""
+    if is_vector(ast):
+        return tuple(ast)
+    if not isinstance(ast, list):
+        return ast
+
+    copy = list(ast)
+    lists = [copy]
+    while lists:
+        items = lists.pop()
+        for n, item in enumerate(items):
+            if is_vector(item):
+                items[n] = tuple(item)
+            elif isinstance(item, list):
+                items[n] = item = list(item)
+                lists.append(item)
+    return copy
+
+
+def store(asts, path, key):
+    """Pass the ASTs through, writing them to a cache entry on the way.
+    The entry is only kept if all of the ASTs are read."""
+    writer = Writer(path, key)
+    try:
+        for ast in asts:
+            writer.dump(ast)
+            yield ast
+        writer.commit()
+    finally:
+        writer.discard()
+
+
+class Writer:
+    """Writes ASTs to a new cache entry as they are parsed.
+
+    The entry is written to a temporary file, and only moved into place by
+    `commit`. Entries of programs that were never completely read are thus
+    discarded, as are entries that can not be written at all."""
+
+    def __init__(self, path, key):
+        self.path = path
+        self.entry = None
+        self.tmp = None
+        if not enabled or path is None:
+            return
+        try:
+            directory = dirname(path)
+            if directory and not exists(directory):
+                os.makedirs(directory)
+            fd, self.tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            self.entry = os.fdopen(fd, "wb")
+            self.entry.write(MAGIC + key)
+        except (IOError, OSError):
+            self.entry = None
+
+    def dump(self, ast):
+        if self.entry is None:
+            return
+        try:
+            marshal.dump(encode_vectors(ast), self.entry)
+        except (ValueError, RuntimeError):
+            # too deeply nested to be marshalled; the program is still
+            # parsed, but not cached
+            self.discard()
+
+    def commit(self):
+        if self.entry is None:
+            return
+        try:
+            self.entry.write(END)
+            self.entry.close()
+        except (IOError, OSError):
+            self.discard()
+            return
+        self.entry = None
+        try:
+            os.rename(self.tmp, self.path)
+            self.tmp = None
+        except OSError:
+            self.discard()
+
+    def discard(self):
+        if self.entry is not None:
+            self.entry.close()
+            self.entry = None
+        if self.tmp is not None:
+            try:
+                os.remove(self.tmp)
+            except OSError:
+                pass
+            self.tmp = None
@@ -0,0 +1,378 @@
+# -*- coding: utf-8 -*-
+
+from .types import LispError, Closure, Builtin, Symbol, Environment, Frame, TailCall
+from .ast import is_boolean, is_atom, is_symbol, is_list, is_closure, is_integer, \
+    is_vector
+from .asserts import assert_exp_length
+from .parser import unparse
+from .evaluator import BUILTINS, FOLDED, QUOTE, IF, ATOM, EQ, DEFINE, LAMBDA, CONS, \
+    HEAD, TAIL, EMPTY, is_special_form, eval_list, apply_eq, apply_builtin, apply_builtins, \
+    apply_cons, apply_head, apply_tail, apply_empty, accepts_args, check_arity, \
+    check_builtin_args, free_variables
+from .optimizer import INLINED
+
+"""
+This module is an alternative to the `evaluate` function, compiling ASTs into
+trees of Python closures, like the "analyzing evaluator" in section 4.1.7 of
+SICP.
+
+`analyze` inspects an AST once, and returns a procedure which takes an
+environment and does the actual evaluation. All syntactic dispatch and checking
+is done up front, so running the procedure does no work besides the evaluation
+itself. The compiled body of a function is kept on its `Closure`, so each
+function is analyzed only once, no matter how often it is called.
+
+Malformed expressions compile into procedures raising the same errors as
+`evaluate` would, so errors are still only reported if the expression is run.
+
+References to function parameters are resolved while compiling. The `scope`
+passed around is a tuple of the parameter lists of the enclosing lambdas,
+innermost last. Each function call runs in a `Frame` holding the arguments in
+a list, and a parameter is found by going up a known number of frames, and
+indexing the list. Other variables are looked up by name, starting from the
+environment the outermost lambda was created in.
+
+Like with `evaluate`, closures only keep the variables they use from the
+environment they are made in, when `Environment.capture` can tell which
+those are. Their body is then compiled a second time, for a scope of their
+own parameters only, and the variables of the enclosing lambdas are looked
+up by name in the captured environment.
+
+The body of a function is compiled knowing which calls are in tail position.
+These return a `TailCall` instead of making the call, and `call_closure`
+makes it in a loop, so tail calls run in constant stack space.
+
+Each place such a variable is looked up caches the value it found, and uses it
+again while `Environment.version` shows no new definitions have been made.
+Calls to global functions thus skip the lookup. See `lookup_cache_info` for
+how well this works.
+"""
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+stats = CacheStats()
+
+
+def lookup_cache_info():
+    """Counts of lookups served from the cache, and of those that were not,
+    since the last reset, with the current version of the environments."""
+    total = stats.hits + stats.misses
+    return {
+        "hits": stats.hits,
+        "misses": stats.misses,
+        "hit_rate": float(stats.hits) / total if total else 0.0,
+        "version": Environment.version,
+    }
+
+
+def reset_lookup_cache_info():
+    stats.hits = stats.misses = 0
+
+
+def execute(ast, env):
+    """Evaluate an AST by compiling it, and running the result."""
+    return analyze(ast, ())(env)
+
+
+def analyze(ast, scope=(), tail=False):
+    """Compile an AST into a procedure taking an environment, to be run in
+    environments of the shape described by `scope`. With `tail`, the AST is
+    in tail position of the body of a function, and calls are left to the
+    caller (see `call_closure`)."""
+    try:
+        if is_boolean(ast) or is_integer(ast) or is_vector(ast):
+            return analyze_constant(ast)
+        elif is_symbol(ast):
+            return analyze_symbol(ast, scope)
+        elif is_list(ast):
+            return analyze_list(ast, scope, tail)
+        elif is_atom(ast):
+            raise LispError("Cannot evaluate atom: %s" % unparse(ast))
+        else:
+            return analyze_constant(None)
+    except LispError as e:
+        return analyze_error(e)
+
+
+def analyze_constant(value):
+    def constant(env):
+        return value
+    return constant
+
+
+def analyze_error(error):
+    def fail(env):
+        raise error
+    return fail
+
+
+def analyze_symbol(symbol, scope):
+    symbol = Symbol(symbol)
+    depth, slot = resolve(symbol, scope)
+
+    if slot is None:
+        return analyze_lookup(symbol, depth)
+    if depth == 0:
+        return lambda env: env.values[slot]
+    if depth == 1:
+        return lambda env: env.parent.values[slot]
+
+    def parameter(env):
+        for _ in range(depth):
+            env = env.parent
+        return env.values[slot]
+    return parameter
+
+
+def analyze_lookup(symbol, depth):
+    """Look a symbol up by name, from the environment `depth` frames up.
+    Variables defined in the frames on the way are found too."""
+    # the environment, version and value of the last lookup
+    cache = [None, -1, None]
+
+    def cached_lookup(env):
+        if env is cache[0] and cache[1] == Environment.version:
+            stats.hits += 1
+            return cache[2]
+        stats.misses += 1
+        value = env.lookup(symbol)
+        cache[:] = env, Environment.version, value
+        return value
+
+    if depth == 0:
+        return cached_lookup
+
+    def lookup(env):
+        for _ in range(depth):
+            if env.defined and symbol in env.defined:
+                return env.defined[symbol]
+            env = env.parent
+        return cached_lookup(env)
+    return lookup
+
+
+def resolve(symbol, scope):
+    """Find the parameter `symbol` refers to. Returns the number of frames
+    to go up, and the position of the parameter in that frame. If it is not
+    a parameter, the position is None, and the number of frames is that to
+    the environment of the outermost lambda."""
+    for depth, params in enumerate(reversed(scope)):
+        if symbol in params:
+            return depth, params.index(symbol)
+    return len(scope), None
+
+
+def analyze_list(ast, scope, tail):
+    if len(ast) == 0:
+        return lambda env: []
+
+    first = ast[0]
+    if is_symbol(first):
+        first = Symbol(first)
+        if first in SPECIAL_FORMS:
+            return SPECIAL_FORMS[first](ast, scope, tail)
+        if first in BUILTINS:
+            return analyze_builtin(ast, scope)
+        if is_special_form(first):
+            # registered from Python, leave it to the evaluator
+            return lambda env: eval_list(ast, env)
+        return analyze_call(ast, scope, analyze_symbol(first, scope), None, tail)
+    elif is_closure(first):
+        return analyze_call(ast, scope, analyze_constant(first), first, tail)
+    elif is_list(first):
+        return analyze_call(ast, scope, analyze(first, scope), first, tail)
+    else:
+        raise LispError("not a function: %s" % unparse(first))
+
+
+def analyze_quote(ast, scope, tail):
+    assert_exp_length(ast, 2)
+    return analyze_constant(ast[1])
+
+
+def analyze_if(ast, scope, tail):
+    assert_exp_length(ast, 4)
+    predicate = analyze(ast[1], scope)
+    consequence = analyze(ast[2], scope, tail)
+    alternative = analyze(ast[3], scope, tail)
+
+    def run_if(env):
+        if predicate(env):
+            return consequence(env)
+        return alternative(env)
+    return run_if
+
+
+def analyze_atom(ast, scope, tail):
+    assert_exp_length(ast, 2)
+    arg = analyze(ast[1], scope)
+    return lambda env: is_atom(arg(env))
+
+
+def analyze_eq(ast, scope, tail):
+    assert_exp_length(ast, 3)
+    a = analyze(ast[1], scope)
+    b = analyze(ast[2], scope)
+    return lambda env: apply_eq(a(env), b(env))
+
+
+def analyze_define(ast, scope, tail):
+    if len(ast) != 3:
+        raise LispError("define: Wrong number of arguments")
+
+    symbol = ast[1]
+    if not is_symbol(symbol):
+        raise LispError("define: non-symbol: %s" % unparse(symbol))
+    symbol = Symbol(symbol)
+    value = analyze(ast[2], scope)
+
+    def run_define(env):
+        result = value(env)
+        env.set(symbol, result)
+        return result
+    return run_define
+
+
+def analyze_lambda(ast, scope, tail):
+    if len(ast) != 3:
+        raise LispError("lambda: Wrong number of arguments")
+    params = ast[1]
+    body = ast[2]
+
+    if not is_list(params):
+        raise LispError("lambda: params must be lists: %s" % unparse(params))
+    compiled = analyze(body, scope + (params,), tail=True)
+    free = free_variables(params, body)
+    # the body compiled for closures with a captured environment, once
+    # needed
+    captured = [compiled if not scope else None]
+
+    def run_lambda(env):
+        closure_env = env.capture(free)
+        closure = Closure(closure_env, params, body)
+        if closure_env is env:
+            closure.compiled = compiled
+        else:
+            if captured[0] is None:
+                captured[0] = analyze(body, (params,), tail=True)
+            closure.compiled = captured[0]
+        return closure
+    return run_lambda
+
+
+def analyze_inlined(ast, scope, tail):
+    """Compile the `%inlined` form made by the optimizer: the inlined body,
+    run while the function still is the one that was inlined, and the
+    original call otherwise."""
+    assert_exp_length(ast, 5)
+    _, name, closure, body, call = ast
+    function = analyze_symbol(name, scope)
+    inlined = analyze(body, scope, tail)
+    original = analyze(call, scope, tail)
+
+    def run_inlined(env):
+        try:
+            unchanged = function(env) is closure
+        except LispError:
+            unchanged = False
+        if unchanged:
+            return inlined(env)
+        return original(env)
+    return run_inlined
+
+
+def analyze_cons(ast, scope, tail):
+    if len(ast) != 3:
+        raise LispError("cons: wrong number of arguments")
+    value = analyze(ast[1], scope)
+    lst = analyze(ast[2], scope)
+    return lambda env: apply_cons(value(env), lst(env))
+
+
+def analyze_unary(name, operation):
+    def analyze_form(ast, scope, tail):
+        if len(ast) != 2:
+            raise LispError("%s: wrong number of arguments" % name)
+        arg = analyze(ast[1], scope)
+        return lambda env: operation(arg(env))
+    return analyze_form
+
+
+def analyze_builtin(ast, scope):
+    name = ast[0]
+    if len(ast) != 3 and not accepts_args(name, len(ast) - 1):
+        assert_exp_length(ast, 3)
+    args = [analyze(arg, scope) for arg in ast[1:]]
+
+    if name in FOLDED:
+        # combine the values from the left as they are computed, rather
+        # than collecting them first
+        if len(args) == 1:
+            args.insert(0, analyze_constant(FOLDED[name]))
+        result = args[0]
+        for arg in args[1:]:
+            result = analyze_apply(name, result, arg)
+        return result
+    if len(args) == 2:
+        return analyze_apply(name, args[0], args[1])
+    return lambda env: apply_builtins(name, [arg(env) for arg in args])
+
+
+def analyze_apply(name, a, b):
+    return lambda env: apply_builtin(name, a(env), b(env))
+
+
+def analyze_call(ast, scope, operator, callee, tail):
+    """Compile a function call. `callee` is the AST in operator position when
+    it should be used in the error message if it is not a function, and None
+    if the value itself should. Calls to closures in `tail` position return
+    a `TailCall`."""
+    args = [analyze(arg, scope) for arg in ast[1:]]
+    nargs = len(args)
+
+    def call(env):
+        closure = operator(env)
+        if type(closure) is Builtin:
+            check_builtin_args(closure, nargs)
+            return closure.function(*[arg(env) for arg in args])
+        if not is_closure(closure):
+            raise LispError("Can't call: %s" % unparse(closure if callee is None else callee))
+        check_arity(closure, nargs)
+        if tail:
+            return TailCall(closure, [arg(env) for arg in args])
+        return call_closure(closure, [arg(env) for arg in args])
+    return call
+
+
+def call_closure(closure, values):
+    """Call a closure with already evaluated arguments, compiling its body
+    the first time around, and then make the tail calls it returns in turn.
+    Closures not created by compiled code do not know the scope they were
+    created in, so all but their own parameters are looked up by name."""
+    while True:
+        body = closure.compiled
+        if body is None:
+            body = closure.compiled = analyze(closure.body, (closure.params,), tail=True)
+        value = body(Frame(closure.params, values, closure.env))
+        if type(value) is not TailCall:
+            return value
+        closure, values = value.closure, value.values
+
+
+SPECIAL_FORMS = {
+    QUOTE: analyze_quote,
+    IF: analyze_if,
+    ATOM: analyze_atom,
+    EQ: analyze_eq,
+    DEFINE: analyze_define,
+    LAMBDA: analyze_lambda,
+    CONS: analyze_cons,
+    HEAD: analyze_unary("head", apply_head),
+    TAIL: analyze_unary("tail", apply_tail),
+    EMPTY: analyze_unary("empty", apply_empty),
+    INLINED: analyze_inlined,
+}
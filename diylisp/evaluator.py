@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
-import logging
+import os
 
-from .types import Environment, LispError, Closure
-from .ast import is_boolean, is_atom, is_symbol, is_list, is_closure, is_integer
+from .types import Environment, LispError, Closure, Builtin, Symbol, Frame, Cons, \
+    TailCall, list_tail, make_vector
+from .ast import is_boolean, is_atom, is_symbol, is_list, is_list_value, is_closure, \
+    is_builtin, is_procedure, is_integer, is_vector
 from .asserts import assert_exp_length, assert_valid_definition, assert_boolean
 from .parser import unparse
 
@@ -15,11 +17,35 @@ making your work a bit easier. (We're supposed to get through this thing
 in a day, after all.)
 """
 
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-
 import operator
 
+# The installed tracer, see the `trace` module.
+tracer = None
+
+# The installed tiering policy, see the `tiering` module.
+tiering = None
+
+QUOTE  = Symbol("quote")
+IF     = Symbol("if")
+ATOM   = Symbol("atom")
+EQ     = Symbol("eq")
+DEFINE = Symbol("define")
+LAMBDA = Symbol("lambda")
+CONS   = Symbol("cons")
+HEAD   = Symbol("head")
+TAIL   = Symbol("tail")
+EMPTY  = Symbol("empty")
+NATIVE = Symbol("native")
+NATIVE_CALL = Symbol("%native-call")
+
+# The special forms, by name. Handlers are called with the whole form and the
+# environment, and return its value. Handlers of the forms in `TAIL_FORMS`
+# instead return an AST and environment to continue evaluating with. Use
+# `register_special_form` to add new ones. The builtins are registered too,
+# so a single lookup tells whether a list is a function call.
+SPECIAL_FORMS = {}
+TAIL_FORMS = {}
+
 BUILTINS = {
     "+": operator.add,
     "-": operator.sub,
@@ -30,17 +56,98 @@ BUILTINS = {
     "<": operator.lt
 }
 
+# Builtins taking any number of arguments, combined from the left, with the
+# value a single argument is combined with: (+ 1 2 3) is (+ (+ 1 2) 3), and
+# (- 5) is (- 0 5).
+FOLDED = {"+": 0, "-": 0, "*": 1, "/": 1}
+
+# Comparisons taking two or more arguments, true when each adjacent pair
+# compares true: (< 1 2 3) is (and (< 1 2) (< 2 3)).
+CHAINED = set([">", "<"])
+
+# Other builtins take exactly two arguments.
+
+# The flag set in `co_flags` of functions taking *args
+VARARGS = 0x04
+
+# Native implementations of the list functions of the standard library, by
+# name, for use with the `native` form. See `eval_native`.
+NATIVES = {}
+natives_enabled = not os.environ.get("DIYLISP_NO_NATIVES")
+
+# The free variables of lambda expressions, by the `id` of the expression,
+# along with the expression itself to keep the `id` from being reused. See
+# `lambda_free_variables`.
+FREE_VARIABLES = {}
+MAX_FREE_VARIABLES = 1024
+
 
 def evaluate(ast, env):
-    """Evaluate an Abstract Syntax Tree in the specified environment."""
-    logger.debug("evaluate: %r in %r", ast, env)
-    if is_atom(ast):
-        return eval_atom(ast, env)
-    if is_list(ast):
-        return eval_list(ast, env)
+    """Evaluate an Abstract Syntax Tree in the specified environment.
+
+    Expressions in tail position, i.e. the branches of an `if` and the body
+    of a called function, are evaluated by looping rather than by recursion.
+    Tail calls thus run in constant Python stack space."""
+    if tracer is not None:
+        tracer.enter(ast, env)
+
+    # the closure whose body is being evaluated, if tiering counts calls
+    current = None
+    while True:
+        kind = type(ast)
+        if kind is Symbol:
+            value = env.lookup(ast)
+        elif kind is int or kind is bool:
+            value = ast
+        elif kind is not list and not is_list(ast):
+            value = eval_atom(ast, env) if is_atom(ast) else None
+        elif len(ast) == 0:
+            value = []
+        else:
+            first = ast[0]
+            if is_symbol(first):
+                form = SPECIAL_FORMS.get(first)
+                if form is not None:
+                    value = form(ast, env)
+                    break
+                form = TAIL_FORMS.get(first)
+                if form is not None:
+                    ast, env = form(ast, env)
+                    continue
+            elif not is_closure(first) and not is_list(first):
+                raise LispError("not a function: %s" % unparse(first))
+
+            closure = eval_callee(first, env)
+            if type(closure) is Builtin:
+                value = eval_builtin_call(closure, ast[1:], env)
+                break
+            if tiering is not None:
+                function = tiering.call(closure, closure is current)
+                if function is not None:
+                    value = function.step(*eval_args(closure, ast[1:], env))
+                    # tail calls to other closures are handed back by the
+                    # Python function, and made here
+                    while type(value) is TailCall:
+                        closure, values = value.closure, value.values
+                        function = tiering.call(closure, False)
+                        if function is None:
+                            break
+                        value = function.step(*values)
+                    if type(value) is not TailCall:
+                        break
+                    ast, env = closure.body, bind(closure, values)
+                    current = closure
+                    continue
+                current = closure
+            ast, env = closure.body, eval_call_env(closure, ast[1:], env)
+            continue
+        break
+
+    if tracer is not None:
+        tracer.leave(value)
+    return value
 
 def eval_list(ast, env):
-    logger.debug("evaluate_list: %r in %r", ast, env)
     assert is_list(ast)
 
     if len(ast) == 0:
@@ -49,60 +156,91 @@ def eval_list(ast, env):
     first = head(ast)
     rest  = tail(ast)
 
-    if first == 'quote':
-        assert_exp_length(ast, 2)
-        return ast[1]
+    if is_symbol(first):
+        form = SPECIAL_FORMS.get(first)
+        if form is not None:
+            return form(ast, env)
+        form = TAIL_FORMS.get(first)
+        if form is not None:
+            return evaluate(*form(ast, env))
 
-    elif first == "if":
-        return eval_if(ast, env)
+    elif not is_closure(first) and not is_list(first):
+        raise LispError("not a function: %s" % unparse(first))
 
-    elif first == 'atom':
-        assert_exp_length(ast, 2)
-        return is_atom(evaluate(ast[1], env))
+    closure = eval_callee(first, env)
+    if is_builtin(closure):
+        return eval_builtin_call(closure, rest, env)
+    return eval_closure([closure] + rest, env)
 
-    elif first == 'eq':
-        return eval_eq(ast, env)
 
-    elif first == 'define':
-        return eval_define(ast, env)
+def register_special_form(name, handler, tail=False):
+    """Make `name` a special form, evaluated by calling `handler(ast, env)`
+    with the whole form and the current environment.
 
-    elif first == 'lambda':
-        return eval_lambda(ast, env)
+    The handler returns the value of the form. With `tail=True`, it instead
+    returns an AST and environment to evaluate in its place, which lets it
+    evaluate a sub-expression in tail position. All evaluation engines
+    handle registered forms, by deferring to `eval_list`."""
+    name = Symbol(name)
+    SPECIAL_FORMS.pop(name, None)
+    TAIL_FORMS.pop(name, None)
+    (TAIL_FORMS if tail else SPECIAL_FORMS)[name] = handler
 
-    elif first == 'cons':
-        return eval_cons(ast, env)
 
-    elif first == 'head':
-        return eval_head(ast, env)
+def register_builtin(name, function):
+    """Add a builtin taking two integers. It can be called by name, and is
+    available as a `Builtin` value in all environments. Add it to `FOLDED`
+    or `CHAINED` to let it take more arguments."""
+    BUILTINS[name] = function
+    register_special_form(name, eval_builtin)
+    Environment.builtins[Symbol(name)] = Builtin(Symbol(name), builtin_function(name))
 
-    elif first == 'tail':
-        return eval_tail(ast, env)
 
-    elif first == 'empty':
-        return eval_empty(ast, env)
+def register_procedure(name, function):
+    """Add a builtin procedure, called with the values of its arguments as
+    `function(*values)`. Unlike the builtins in `BUILTINS`, it is not a
+    special form, but a `Builtin` value found by looking `name` up. It takes
+    the numbers of arguments `function` does."""
+    Environment.builtins[Symbol(name)] = Builtin(Symbol(name), function)
 
-    elif is_closure(first):
-        return eval_closure(ast, env)
 
-    elif is_list(first):
-        closure = evaluate(first, env)
-        if not is_closure(closure):
-            raise LispError("Can't call: %s" % unparse(first))
+def use_natives(enabled=True):
+    """Switch between running the native implementations of functions
+    defined with the `native` form, and their lisp definitions. Natives are
+    used by default, unless the `DIYLISP_NO_NATIVES` environment variable
+    is set."""
+    global natives_enabled
+    natives_enabled = enabled
 
-        return eval_closure([closure] + rest, env)
 
-    elif is_symbol(first) and first in BUILTINS:
-        return eval_builtin(ast, env)
+def is_special_form(symbol):
+    return symbol in SPECIAL_FORMS or symbol in TAIL_FORMS
 
-    elif is_symbol(first):
-        symbol = first
-        value = env.lookup(symbol)
-        if is_closure(value):
-            return eval_closure([value] + rest, env)
 
-        raise LispError("Can't call: %s" % unparse(value))
-    else:
-        raise LispError("not a function: %s" % unparse(first))
+def eval_callee(first, env):
+    """Evaluate the first element of a function call to a closure or a
+    builtin."""
+    if is_closure(first):
+        return first
+
+    closure = evaluate(first, env)
+    if not is_procedure(closure):
+        # report the expression when it is more informative than its value
+        raise LispError("Can't call: %s" % unparse(first if is_list(first) else closure))
+    return closure
+
+def eval_quote(ast, env):
+    assert_exp_length(ast, 2)
+    return ast[1]
+
+
+def eval_is_atom(ast, env):
+    assert_exp_length(ast, 2)
+    value = evaluate(ast[1], env)
+    if tracer is not None:
+        tracer.builtin(ATOM, [value])
+    return is_atom(value)
+
 
 def eval_eq(ast, env):
     assert ast[0] == "eq"
@@ -111,17 +249,13 @@ def eval_eq(ast, env):
     a = evaluate(ast[1], env)
     b = evaluate(ast[2], env)
 
-    if not is_atom(a):
-        return False
+    if tracer is not None:
+        tracer.builtin(EQ, [a, b])
+    return apply_eq(a, b)
 
-    if not is_atom(b):
-        return False
 
-    logger.debug("evaluate_list: EQ %r == %r => %r", a, b, a == b)
-    return a == b
-
-
-def eval_if(ast, env):
+def eval_if_tail(ast, env):
+    """Evaluate the predicate of an `if`, returning the branch to evaluate."""
     assert ast[0] == "if"
     assert_exp_length(ast, 4)
 
@@ -129,9 +263,9 @@ def eval_if(ast, env):
     consequence = ast[2]
     alternative = ast[3]
     if evaluate(predicate, env):
-        return evaluate(consequence, env)
+        return consequence, env
     else:
-        return evaluate(alternative, env)
+        return alternative, env
 
 def eval_define(ast, env):
     assert ast[0] == "define"
@@ -148,21 +282,87 @@ def eval_define(ast, env):
     return value
 
 def eval_builtin(ast, env):
-    assert_exp_length(ast, 3)
-
     name = ast[0]
     assert is_symbol(name)
     assert name in BUILTINS
 
+    if len(ast) != 3:
+        if not accepts_args(name, len(ast) - 1):
+            assert_exp_length(ast, 3)
+        return eval_builtin_call(Environment.builtins[name], ast[1:], env)
+
     a = evaluate(ast[1], env)
     b = evaluate(ast[2], env)
+    if tracer is not None:
+        tracer.builtin(name, [a, b])
+    return apply_builtin(name, a, b)
+
+
+def eval_builtin_call(builtin, args, env):
+    """Call a builtin procedure with the values of `args`. The builtins in
+    `BUILTINS` all take two arguments, the usual case, which are applied
+    right away, without collecting them first. Other calls of one or two
+    arguments pass the values straight on too, unless they are traced."""
+    name = builtin.name
+    nargs = len(args)
+    if nargs == 2 and name in BUILTINS:
+        a = evaluate(args[0], env)
+        b = evaluate(args[1], env)
+        if tracer is not None:
+            tracer.builtin(name, [a, b])
+        return apply_builtin(name, a, b)
+
+    check_builtin_args(builtin, nargs)
+    function = builtin.function
+    if tracer is None:
+        if nargs == 1:
+            return function(evaluate(args[0], env))
+        if nargs == 2:
+            return function(evaluate(args[0], env), evaluate(args[1], env))
+
+    values = [evaluate(arg, env) for arg in args]
+    if tracer is not None:
+        tracer.builtin(name, values)
+    return function(*values)
+
+
+def eval_native(ast, env):
+    """(native name function) gives a function computing the same as the
+    closure `function`, using the implementation in `NATIVES[name]`.
+
+    The result is a closure like any other, whose body is a `%native-call`
+    form calling the native implementation, or evaluating the body of
+    `function` when natives are switched off."""
+    if len(ast) != 3:
+        raise LispError("native: wrong number of arguments")
 
-    if not is_integer(a):
-        raise LispError("Builtin '%s': can only use integers: %r" % (name, a))
-    if not is_integer(b):
-        raise LispError("Builtin '%s': can only use integers: %r" % (name, b))
+    name = ast[1]
+    if not is_symbol(name) or name not in NATIVES:
+        raise LispError("native: unknown native function: %s" % unparse(name))
+
+    closure = evaluate(ast[2], env)
+    if not is_closure(closure):
+        raise LispError("native: not a function: %s" % unparse(closure))
+
+    nargs = NATIVES[name].__code__.co_argcount
+    if len(closure.params) != nargs:
+        raise LispError("native: %s takes %d arguments" % (name, nargs))
+
+    return Closure(closure.env, closure.params, [NATIVE_CALL, name, closure])
+
+
+def eval_native_call(ast, env):
+    """The body of a closure made by `native`, run with its parameters bound."""
+    assert_exp_length(ast, 3)
+    name, closure = ast[1], ast[2]
+    if not natives_enabled:
+        return evaluate(closure.body, env)
+
+    values = bound_values(env, closure.params)
+    if tracer is not None:
+        tracer.builtin(name, values)
+    return NATIVES[name](*values)
 
-    return BUILTINS[name](a, b)
 
 def eval_lambda(ast, env):
     assert ast[0] == "lambda"
@@ -174,7 +374,56 @@ def eval_lambda(ast, env):
     if not is_list(params):
         raise LispError("lambda: params must be lists: %s" % unparse(params))
 
-    return Closure(env, params, body)
+    return Closure(env.capture(lambda_free_variables(ast)), params, body)
+
+
+def lambda_free_variables(ast):
+    """The free variables of a lambda expression, computed once per
+    expression."""
+    entry = FREE_VARIABLES.get(id(ast))
+    if entry is None or entry[0] is not ast:
+        if len(FREE_VARIABLES) >= MAX_FREE_VARIABLES:
+            FREE_VARIABLES.clear()
+        entry = FREE_VARIABLES[id(ast)] = (ast, free_variables(ast[1], ast[2]))
+    return entry[1]
+
+
+def free_variables(params, body):
+    """The symbols a closure taking `params` may look up in the environment
+    it was defined in, when evaluating `body`: the symbols in `body` that are
+    not parameters of the closure, nor of lambdas within it. Quoted data,
+    the names given to `native` and special forms in operator position are
+    left out.
+
+    The names given to `define` are included, as defining a name that is
+    already bound is an error, which the closure must still see. Symbols
+    only bound by a `define` in the body itself are not bound in the
+    defining environment, so the closure then keeps all of it (see
+    `Environment.capture`)."""
+    free = set()
+    expressions = [(body, frozenset(p for p in params if is_symbol(p)))]
+    while expressions:
+        ast, bound = expressions.pop()
+        if is_symbol(ast):
+            if ast not in bound:
+                free.add(Symbol(ast))
+            continue
+        if not is_list(ast) or len(ast) == 0:
+            continue
+
+        first = ast[0]
+        if not is_symbol(first) or not is_special_form(first):
+            expressions.extend((exp, bound) for exp in ast)
+        elif first == QUOTE:
+            continue
+        elif first == LAMBDA and len(ast) == 3 and is_list(ast[1]):
+            params = frozenset(p for p in ast[1] if is_symbol(p))
+            expressions.append((ast[2], bound | params))
+        elif first == NATIVE:
+            expressions.extend((exp, bound) for exp in ast[2:])
+        else:
+            expressions.extend((exp, bound) for exp in ast[1:])
+    return free
 
 def eval_cons(ast, env):
     cons    = head(ast)
@@ -185,9 +434,10 @@ def eval_cons(ast, env):
         raise LispError("cons: wrong number of arguments")
 
     values = map(lambda e: evaluate(e, env), rest)
-    logger.debug("eval_cons: param values: %r", values)
+    if tracer is not None:
+        tracer.builtin(CONS, values)
 
-    return [values[0]] + values[1]
+    return apply_cons(values[0], values[1])
 
 def eval_head(ast, env):
     hd      = head(ast)
@@ -198,15 +448,10 @@ def eval_head(ast, env):
         raise LispError("head: wrong number of arguments")
 
     value = evaluate(rest[0], env)
-    logger.debug("eval_head: param value: %r", value)
+    if tracer is not None:
+        tracer.builtin(HEAD, [value])
 
-    if not value:
-        raise LispError("head: empty list")
-
-    if not is_list(value):
-        raise LispError("head: not a list: %s" % unparse(value))
-
-    return head(value)
+    return apply_head(value)
 
 def eval_tail(ast, env):
     hd      = head(ast)
@@ -217,12 +462,10 @@ def eval_tail(ast, env):
         raise LispError("tail: wrong number of arguments")
 
     value = evaluate(rest[0], env)
-    logger.debug("eval_tail: param value: %r", value)
-
-    if not is_list(value):
-        raise LispError("tail: not a list: %s" % unparse(value))
+    if tracer is not None:
+        tracer.builtin(TAIL, [value])
 
-    return tail(value)
+    return apply_tail(value)
 
 def eval_empty(ast, env):
     hd      = head(ast)
@@ -233,29 +476,44 @@ def eval_empty(ast, env):
         raise LispError("empty: wrong number of arguments")
 
     value = evaluate(rest[0], env)
-    logger.debug("eval_empty: param value: %r", value)
+    if tracer is not None:
+        tracer.builtin(EMPTY, [value])
 
-    if not is_list(value):
-        raise LispError("empty: not a list: %s" % unparse(value))
-
-    return len(value) == 0
+    return apply_empty(value)
 
 def eval_closure(ast, env):
     closure = head(ast)
     rest    = tail(ast)
 
     assert is_closure(closure)
-    logger.debug("eval_closure: %r", closure)
-    if len(rest) != len(closure.params):
-        raise LispError("wrong number of arguments, expected %d got %d" % (len(closure.params), len(rest)))
+    return run_closure(closure, eval_args(closure, rest, env))
 
-    values = map(lambda e: evaluate(e, env), rest)
-    logger.debug("eval_closure: param values: %r", values)
 
-    bindings = dict(zip(closure.params, values))
-    new_env = closure.env.extend(bindings)
+def eval_call_env(closure, args, env):
+    """Evaluate the arguments of a call, returning the environment in which
+    to evaluate the body of the closure."""
+    return bind(closure, eval_args(closure, args, env))
 
-    return evaluate(closure.body, new_env)
+
+def eval_args(closure, args, env):
+    """Evaluate the arguments of a call to `closure`, returning their
+    values."""
+    check_arity(closure, len(args))
+
+    values = map(lambda e: evaluate(e, env), args)
+    if tracer is not None:
+        tracer.call(closure, values)
+    return values
+
+
+def run_closure(closure, values):
+    """Evaluate the body of a closure called with `values`, or run the
+    Python function it has been promoted to by the tiering policy."""
+    if tiering is not None:
+        function = tiering.call(closure, False)
+        if function is not None:
+            return function(*values)
+    return evaluate(closure.body, bind(closure, values))
 
 def eval_atom(atom, env):
     assert is_atom(atom)
@@ -265,11 +523,273 @@ def eval_atom(atom, env):
     elif is_symbol(atom):
         symbol = atom
         return env.lookup(symbol)
-    elif is_integer(atom):
+    elif is_integer(atom) or is_vector(atom):
         return atom
     else:
         raise LispError("Cannot evaluate atom: %s", unparse(atom))
 
+##
+## The operations below work on values rather than ASTs. They are shared with
+## the other evaluation engines, which thus behave just like `evaluate`.
+##
+
+
+def apply_eq(a, b):
+    if not is_atom(a) or not is_atom(b):
+        return False
+    return a is b or a == b
+
+
+def apply_builtin(name, a, b):
+    if not is_integer(a) or not is_integer(b):
+        if is_vector(a) or is_vector(b):
+            return apply_elementwise(name, a, b)
+        check_integer(a, name)
+        check_integer(b, name)
+
+    return BUILTINS[name](a, b)
+
+
+def apply_elementwise(name, a, b):
+    """Apply a builtin to each element of a vector, or each pair of elements
+    of two vectors of the same length. The other argument may instead be an
+    integer, used with every element. Comparisons give 1 or 0."""
+    function = BUILTINS[name]
+    if is_vector(a) and is_vector(b):
+        if len(a) != len(b):
+            raise LispError("Builtin '%s': vectors of different lengths: %d and %d"
+                            % (name, len(a), len(b)))
+        return make_vector(map(function, a, b))
+    if is_vector(a):
+        check_integer(b, name)
+        return make_vector([function(x, b) for x in a])
+    check_integer(a, name)
+    return make_vector([function(a, x) for x in b])
+
+
+def apply_builtins(name, values):
+    """Apply a builtin to any number of values, as allowed by `FOLDED` and
+    `CHAINED`."""
+    if name in CHAINED:
+        result = True
+        for a, b in zip(values, values[1:]):
+            if not apply_builtin(name, a, b):
+                result = False
+        return result
+
+    if len(values) == 1:
+        return apply_builtin(name, FOLDED[name], values[0])
+    result = values[0]
+    for value in values[1:]:
+        result = apply_builtin(name, result, value)
+    return result
+
+
+def builtin_function(name):
+    """The function called by the `Builtin` value of builtin `name`. Calls
+    with two arguments, the usual case, take the shortest path."""
+    def function(*values):
+        if len(values) == 2:
+            return apply_builtin(name, values[0], values[1])
+        return apply_builtins(name, values)
+    return function
+
+
+def accepts_args(name, nargs):
+    """Whether builtin `name` can be applied to `nargs` arguments."""
+    if name in FOLDED:
+        return nargs >= 1
+    if name in CHAINED:
+        return nargs >= 2
+    return nargs == 2
+
+
+def check_builtin_args(builtin, nargs):
+    name = builtin.name
+    if name in BUILTINS:
+        accepted = accepts_args(name, nargs)
+    else:
+        accepted = takes_args(builtin.function, nargs)
+    if not accepted:
+        raise LispError("%s: wrong number of arguments: %d" % (name, nargs))
+
+
+def takes_args(function, nargs):
+    """Whether the Python function `function` can be called with `nargs`
+    positional arguments. Functions whose arguments can not be inspected,
+    like the builtins of Python, are taken to accept any number, and left to
+    check them themselves."""
+    code = getattr(function, "__code__", None)
+    if code is None:
+        return True
+    argcount = code.co_argcount
+    if getattr(function, "__self__", None) is not None:
+        # a bound method, called without `self`
+        argcount -= 1
+    if nargs > argcount and not code.co_flags & VARARGS:
+        return False
+    return nargs >= argcount - len(function.__defaults__ or ())
+
+
+def apply_cons(value, lst):
+    if not is_list_value(lst):
+        raise LispError("cons: not a list: %s" % unparse(lst))
+
+    return Cons(value, lst)
+
+
+def apply_head(value):
+    if not value:
+        raise LispError("head: empty list")
+
+    if not is_list_value(value):
+        raise LispError("head: not a list: %s" % unparse(value))
+
+    if is_list(value):
+        return value[0]
+    return value.head()
+
+
+def apply_tail(value):
+    if not is_list_value(value):
+        raise LispError("tail: not a list: %s" % unparse(value))
+
+    if is_list(value):
+        return list_tail(value, 1)
+    return value.tail()
+
+
+def apply_empty(value):
+    if not is_list_value(value):
+        raise LispError("empty: not a list: %s" % unparse(value))
+
+    return not value
+
+
+def check_arity(closure, nargs):
+    if nargs != len(closure.params):
+        raise LispError("wrong number of arguments, expected %d got %d" % (len(closure.params), nargs))
+
+
+def bind(closure, values):
+    """The environment for evaluating the body of a closure called with
+    the given argument values."""
+    return closure.env.extend(dict(zip(closure.params, values)))
+
+
+def bound_values(env, params):
+    """The values of the parameters `params`, in the environment a closure
+    taking them is called in."""
+    if isinstance(env, Frame) and env.params is params:
+        return env.values
+    return [env.lookup(param) for param in params]
+
+
+def call(closure, values, name):
+    """Call a closure or builtin from a native function `name`."""
+    if is_builtin(closure):
+        check_builtin_args(closure, len(values))
+        return closure.function(*values)
+    if not is_closure(closure):
+        raise LispError("%s: not a function: %s" % (name, unparse(closure)))
+    check_arity(closure, len(values))
+    if tracer is not None:
+        tracer.call(closure, values)
+    return run_closure(closure, values)
+
+
+def check_list(value, name):
+    if not is_list_value(value):
+        raise LispError("%s: not a list: %s" % (name, unparse(value)))
+
+
+def check_integer(value, name):
+    if not is_integer(value):
+        raise LispError("Builtin '%s': can only use integers: %r" % (name, value))
+
+
+##
+## The native implementations of the list functions of the standard library.
+## They raise the same errors as the lisp definitions in `stdlib.diy`, which
+## check for lists with `empty`, and only check the elements where the lisp
+## definitions use them.
+##
+
+
+def check_procedure(function):
+    """Raise the error of calling `function` from lisp, if it is neither a
+    closure nor a builtin."""
+    if not is_procedure(function):
+        raise LispError("Can't call: %s" % unparse(function))
+
+
+def native_length(lst):
+    check_list(lst, EMPTY)
+    return len(lst)
+
+
+def native_sum(lst):
+    check_list(lst, EMPTY)
+    # added up from the end, like the recursion of the lisp definition
+    total = 0
+    for value in reversed(list(lst)):
+        total = apply_builtin("+", value, total)
+    return total
+
+
+def native_append(front, back):
+    check_list(front, EMPTY)
+    for value in reversed(list(front)):
+        back = apply_cons(value, back)
+    return back
+
+
+def native_reverse(lst):
+    check_list(lst, EMPTY)
+    return list(lst)[::-1]
+
+
+def native_map(function, lst):
+    check_list(lst, EMPTY)
+    values = list(lst)
+    if values:
+        check_procedure(function)
+    return [call(function, [value], "map") for value in values]
+
+
+def native_filter(predicate, lst):
+    check_list(lst, EMPTY)
+    values = list(lst)
+    if values:
+        check_procedure(predicate)
+    return [value for value in values if call(predicate, [value], "filter")]
+
+
+def native_range(start, end):
+    check_integer(start, ">")
+    check_integer(end, ">")
+    return list(range(start, end + 1))
+
+
+def native_sort(lst):
+    check_list(lst, EMPTY)
+    values = list(lst)
+    if all(is_integer(value) for value in values):
+        return sorted(values)
+    return quicksort(values)
+
+
+def quicksort(values):
+    """Sort `values` like the lisp definition of `sort`, comparing them to
+    each pivot with `<`, for lists the builtin `sorted` can not take."""
+    if not values:
+        return []
+    pivot, rest = values[0], values[1:]
+    smaller = [value for value in rest if apply_builtin("<", value, pivot)]
+    larger = [value for value in rest if not apply_builtin("<", value, pivot)]
+    return quicksort(smaller) + [pivot] + quicksort(larger)
+
+
 def head(l):
     return l[0]
 
@@ -278,3 +798,31 @@ def tail(l):
         return l[1:]
     else:
         return []
+
+
+for name, handler in [(QUOTE, eval_quote),
+                      (ATOM, eval_is_atom),
+                      (EQ, eval_eq),
+                      (DEFINE, eval_define),
+                      (LAMBDA, eval_lambda),
+                      (CONS, eval_cons),
+                      (HEAD, eval_head),
+                      (TAIL, eval_tail),
+                      (EMPTY, eval_empty),
+                      (NATIVE, eval_native),
+                      (NATIVE_CALL, eval_native_call)]:
+    register_special_form(name, handler)
+register_special_form(IF, eval_if_tail, tail=True)
+for name in list(BUILTINS):
+    register_builtin(name, BUILTINS[name])
+
+NATIVES.update({
+    "length": native_length,
+    "sum": native_sum,
+    "append": native_append,
+    "reverse": native_reverse,
+    "map": native_map,
+    "filter": native_filter,
+    "range": native_range,
+    "sort": native_sort,
+})
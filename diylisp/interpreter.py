@@ -1,38 +1,97 @@
 # -*- coding: utf-8 -*-
 
+from contextlib import closing
 from os.path import dirname, join
 
+from . import evaluator, compiler, vm, stackless, memo, vectors, streams, transpiler
 from .evaluator import evaluate
-from .parser import parse, unparse, parse_multiple
-from .types import Environment
+from .optimizer import optimize as optimize_ast, optimize_all
+from .profiler import profiling
+from .parser import parse, unparse, parse_stream, parse_file
+from .types import LispError, Environment
 
+# The available evaluation engines. They all take an AST and an environment.
+ENGINES = {
+    "eval": evaluate,
+    "compile": compiler.execute,
+    "vm": vm.execute,
+    "stackless": stackless.evaluate,
+}
 
-def interpret(source, env=None):
+# The engines calling the hooks of the tracer, which alone can be profiled.
+PROFILED_ENGINES = ["eval"]
+
+
+def interpret(source, env=None, engine="eval", optimize=False, profiler=None):
     """
     Interpret a lisp program statement
 
     Accepts a program statement as a string, interprets it, and then
-    returns the resulting lisp expression as string.
+    returns the resulting lisp expression as string. The `engine` is
+    the name of one of the `ENGINES` to evaluate the program with.
+    With `optimize`, the program is first passed through the `optimizer`.
+    A `profiler.Profiler` given as `profiler` times the evaluation.
     """
+    check_profiling(engine, profiler)
     if env is None:
         env = Environment()
 
-    return unparse(evaluate(parse(source), env))
+    ast = parse(source)
+    if optimize:
+        ast = optimize_ast(ast, env)
+    with profiling(profiler):
+        return unparse(ENGINES[engine](ast, env))
 
 
-def interpret_file(filename, env=None):
+def interpret_file(filename, env=None, engine="eval", optimize=False, profiler=None):
     """
     Interpret a lisp file
 
     Accepts the name of a lisp file containing a series of statements. 
-    Returns the value of the last expression of the file.
+    Returns the value of the last expression of the file. The parsed
+    file is cached on disk, see the `cache` module.
+    """
+    with closing(parse_file(filename)) as asts:
+        return interpret_all(asts, env, engine, optimize, profiler)
+
+
+def interpret_stream(stream, env=None, engine="eval", optimize=False, profiler=None):
     """
+    Interpret lisp statements read from a file object
+
+    Each statement is evaluated as soon as it has been read, so the
+    program never has to fit in memory. Returns the value of the last
+    expression in the stream.
+    """
+    return interpret_all(parse_stream(stream), env, engine, optimize, profiler)
+
+
+def interpret_all(asts, env=None, engine="eval", optimize=False, profiler=None):
+    """Evaluate a series of ASTs one by one, as they are produced.
+    Returns the value of the last one as a string. The evaluation is timed
+    by `profiler`, if given."""
+    check_profiling(engine, profiler)
     if env is None:
         env = Environment()
+    if optimize:
+        asts = optimize_all(asts, env)
+
+    execute = ENGINES[engine]
+    result = None
+    with profiling(profiler):
+        for ast in asts:
+            result = execute(ast, env)
+    return unparse(result)
 
-    with open(filename, 'r') as sourcefile:
-        source = "".join(sourcefile.readlines())
 
-    asts = parse_multiple(source)
-    results = [evaluate(ast, env) for ast in asts]
-    return unparse(results[-1])
+def check_profiling(engine, profiler):
+    """Refuse to profile what the profiler would not see, rather than give
+    an empty profile: engines other than `eval`, and the functions promoted
+    to Python code while tiering."""
+    if profiler is None:
+        return
+    if engine not in PROFILED_ENGINES:
+        raise LispError("the %s engine can not be profiled, only: %s"
+                        % (engine, ", ".join(PROFILED_ENGINES)))
+    if evaluator.tiering is not None:
+        raise LispError("programs can not be profiled while tiering")
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+
+from .types import LispError, Closure, Symbol
+from .ast import is_closure, is_integer, is_boolean, hashable
+from .asserts import assert_exp_length
+from .parser import unparse
+from .evaluator import evaluate, register_special_form, bind, bound_values
+
+"""
+Memoization of functions, with the `memoize` form:
+
+    (define fib
+        (memoize
+            (lambda (n)
+                (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))))
+
+`(memoize f)` returns a function computing the same as `f`, but remembering
+the results for the arguments it has been called with. When it is called
+again with equal arguments, the result is returned without calling `f`. This
+is only correct for pure functions, whose result depends on nothing but the
+arguments. At most `DEFAULT_MAX_SIZE` results are kept, or the number given
+as in `(memoize f 100)`; the least recently used one is dropped first.
+
+The memoized function is a `Closure` like any other, so it can be called by
+all evaluation engines. Its body is a `%memoized` form, doing the caching.
+The original function is evaluated with `evaluate`.
+"""
+
+DEFAULT_MAX_SIZE = 1024
+
+MEMOIZE = Symbol("memoize")
+MEMOIZED = Symbol("%memoized")
+
+
+class Memo:
+    """The results cache of a memoized closure, with its statistics."""
+
+    def __init__(self, closure, max_size):
+        self.closure = closure
+        self.max_size = max_size
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def call(self, values):
+        key = tuple(hashable(value) for value in values)
+        results = self.results
+        if key in results:
+            self.hits += 1
+            # move the result to the most recently used end
+            result = results[key] = results.pop(key)
+            return result
+
+        self.misses += 1
+        closure = self.closure
+        result = evaluate(closure.body, bind(closure, values))
+        results[key] = result
+        if len(results) > self.max_size:
+            results.popitem(last=False)
+        return result
+
+    def info(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.results),
+            "max_size": self.max_size,
+        }
+
+
+def eval_memoize(ast, env):
+    if len(ast) not in (2, 3):
+        raise LispError("memoize: wrong number of arguments")
+
+    closure = evaluate(ast[1], env)
+    if not is_closure(closure):
+        raise LispError("memoize: not a function: %s" % unparse(closure))
+
+    max_size = DEFAULT_MAX_SIZE
+    if len(ast) == 3:
+        max_size = evaluate(ast[2], env)
+        if not is_integer(max_size) or is_boolean(max_size) or max_size < 1:
+            raise LispError("memoize: size must be a positive integer: %s" % unparse(max_size))
+
+    memo = Memo(closure, max_size)
+    return Closure(closure.env, closure.params, [MEMOIZED, memo])
+
+
+def eval_memoized(ast, env):
+    """The body of a memoized closure, run with its parameters bound."""
+    assert_exp_length(ast, 2)
+    memo = ast[1]
+    return memo.call(bound_values(env, memo.closure.params))
+
+
+def memo_info(closure):
+    """Cache statistics of a memoized closure: the numbers of hits and
+    misses, and the current and maximum numbers of results kept."""
+    body = closure.body
+    if not isinstance(body, list) or len(body) != 2 or body[0] is not MEMOIZED:
+        raise LispError("not a memoized function: %s" % unparse(closure))
+    return body[1].info()
+
+
+register_special_form(MEMOIZE, eval_memoize)
+register_special_form(MEMOIZED, eval_memoized)
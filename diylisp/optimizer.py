@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+
+from .types import LispError, Symbol
+from .ast import is_boolean, is_integer, is_symbol, is_list, is_atom, is_closure, \
+    is_vector, hashable
+from .evaluator import SPECIAL_FORMS, TAIL_FORMS, eval_builtin, eval_quote, \
+    eval_if_tail, eval_is_atom, eval_eq, eval_define, eval_lambda, eval_cons, \
+    eval_head, eval_tail, eval_empty, apply_builtins, apply_eq, accepts_args, \
+    register_special_form
+
+"""
+An optional optimization pass over ASTs, to be run between parsing and
+evaluation. It rewrites expressions into simpler ones with the same value:
+
+  - applications of the builtins in `BUILTINS`, `eq` and `atom` to literal
+    arguments are replaced by their result, e.g. `(+ 1 2)` becomes `3`
+  - an `if` with a literal predicate is replaced by the branch that would be
+    taken, e.g. `(if #t a b)` becomes `a`
+  - equal quoted constants are made to share a single object
+  - given the environment the code will run in, calls to small functions
+    defined in it are replaced by the body of the function (see `inline`)
+
+Expressions that would raise an error, like `(+ 1 #t)` or a malformed `if`,
+are left as they are, so the error is still raised when they are evaluated.
+Forms registered from Python (see `register_special_form`) are also left as
+they are, as their arguments need not be expressions.
+"""
+
+# Limits on inlining: the number of atoms in the body of an inlined function,
+# and how deep inlined functions are inlined into each other.
+MAX_INLINE_SIZE = 24
+MAX_INLINE_DEPTH = 3
+
+INLINED = Symbol("%inlined")
+
+# The number of elements of well-formed expressions using these forms.
+# Builtins may take other numbers of arguments, see `is_well_formed`.
+FORM_LENGTHS = {
+    eval_if_tail: 4,
+    eval_builtin: 3,
+    eval_eq: 3,
+    eval_cons: 3,
+    eval_is_atom: 2,
+    eval_head: 2,
+    eval_tail: 2,
+    eval_empty: 2,
+}
+
+
+class Optimizer:
+    """Optimizes ASTs, sharing quoted constants across all of them. With an
+    environment, calls to functions defined in it are inlined."""
+
+    def __init__(self, env=None):
+        self.constants = {}
+        self.env = env
+        # the parameters of the enclosing lambdas, along with the variables
+        # defined in their bodies, and the current depth of inlining
+        self.scope = []
+        self.depth = 0
+
+    def optimize(self, ast):
+        if not is_list(ast) or len(ast) == 0:
+            return ast
+
+        first = ast[0]
+        if not is_symbol(first):
+            return [self.optimize(exp) for exp in ast]
+
+        form = form_of(first)
+        if form is None:
+            return self.inline([first] + [self.optimize(exp) for exp in ast[1:]])
+        elif form is eval_quote:
+            return self.optimize_quote(ast)
+        elif form is eval_if_tail:
+            return self.optimize_if(ast)
+        elif form is eval_define:
+            # only the last part of these is an expression
+            if len(ast) != 3:
+                return ast
+            return ast[:2] + [self.optimize(ast[2])]
+        elif form is eval_lambda:
+            if len(ast) != 3 or not is_list(ast[1]):
+                return ast
+            self.scope.append(list(ast[1]) + defined_variables(ast[2]))
+            try:
+                return ast[:2] + [self.optimize(ast[2])]
+            finally:
+                self.scope.pop()
+        elif form is eval_builtin or form is eval_eq or form is eval_is_atom:
+            return self.fold(form, [first] + [self.optimize(exp) for exp in ast[1:]])
+        elif form in (eval_cons, eval_head, eval_tail, eval_empty):
+            return [first] + [self.optimize(exp) for exp in ast[1:]]
+        else:
+            return ast
+
+    def optimize_quote(self, ast):
+        if len(ast) != 2:
+            return ast
+        key = hashable(ast[1])
+        quoted = self.constants.get(key)
+        if quoted is None:
+            quoted = self.constants[key] = ast
+        return quoted
+
+    def optimize_if(self, ast):
+        if len(ast) != 4:
+            return ast
+        ast = [ast[0]] + [self.optimize(exp) for exp in ast[1:]]
+        is_literal, value = literal(ast[1])
+        if not is_literal:
+            return ast
+        return ast[2] if value else ast[3]
+
+    def fold(self, form, ast):
+        """Replace a builtin, `eq` or `atom` by its value, if its arguments
+        are literals and it can be applied to them without error."""
+        if not is_well_formed(form, ast):
+            return ast
+
+        values = []
+        for arg in ast[1:]:
+            is_literal, value = literal(arg)
+            if not is_literal:
+                return ast
+            values.append(value)
+
+        try:
+            if form is eval_is_atom:
+                return is_atom(values[0])
+            elif form is eval_eq:
+                return apply_eq(values[0], values[1])
+            else:
+                result = apply_builtins(ast[0], values)
+        except (LispError, ArithmeticError):
+            return ast
+
+        if not is_integer(result):
+            # e.g. a `long` from an overflowing multiplication
+            return ast
+        return result
+
+    def inline(self, ast):
+        """Replace a call to a function by its body, with the arguments
+        substituted for the parameters.
+
+        This is only done for small functions defined in the environment,
+        which do not create closures or define variables, and when the
+        arguments are evaluated the same way as when calling the function.
+        This is the case for arguments that are literals or variables known
+        to be defined, which may thus be evaluated any number of times. At
+        most one other argument is allowed, if its parameter is the first
+        thing evaluated in the body, and used only there.
+
+        The result is an `%inlined` form, which checks that the function
+        still is the one that was inlined before evaluating the body, and
+        makes the original call otherwise."""
+        name, args = ast[0], ast[1:]
+        if self.env is None or self.depth >= MAX_INLINE_DEPTH or self.is_bound(name):
+            return ast
+        try:
+            closure = self.env.lookup(name)
+        except LispError:
+            return ast
+        if not is_closure(closure) or closure.env is not self.env \
+                or len(closure.params) != len(args) \
+                or not can_inline(name, closure):
+            return ast
+
+        body = closure.body
+        if any(self.is_bound(symbol) for symbol in free_variables(body, closure.params)):
+            # these would be captured by the variables at the call site
+            return ast
+
+        unknown = [param for param, arg in zip(closure.params, args)
+                   if not self.is_known(arg)]
+        if len(unknown) > 1:
+            return ast
+        if unknown and (count_uses(body, unknown[0]) != 1
+                        or first_evaluated(body) != unknown[0]):
+            return ast
+
+        self.depth += 1
+        try:
+            body = self.optimize(substitute(body, dict(zip(closure.params, args))))
+        finally:
+            self.depth -= 1
+        return [INLINED, name, closure, body, ast]
+
+    def is_bound(self, symbol):
+        """Whether `symbol` is a parameter of an enclosing lambda, or defined
+        in its body."""
+        return any(symbol in params for params in self.scope)
+
+    def is_known(self, ast):
+        """Whether `ast` is evaluated without errors or side effects. This
+        holds for literals, defined variables, and the forms which can not
+        fail themselves (`if`, `eq` and `atom`) applied to such expressions."""
+        if literal(ast)[0]:
+            return True
+        if is_symbol(ast):
+            if form_of(ast) is not None:
+                return False
+            if self.is_bound(ast):
+                return True
+            try:
+                self.env.lookup(ast)
+                return True
+            except LispError:
+                return False
+        if not is_list(ast) or len(ast) == 0:
+            return False
+
+        form = form_of(ast[0])
+        if form is eval_inlined:
+            return self.is_known(ast[3])
+        if form in (eval_if_tail, eval_eq, eval_is_atom) and FORM_LENGTHS[form] == len(ast):
+            return all(self.is_known(exp) for exp in ast[1:])
+        return False
+
+
+def eval_inlined(ast, env):
+    """Continue with the inlined body, if the function has not changed."""
+    _, name, closure, body, call = ast
+    try:
+        unchanged = env.lookup(name) is closure
+    except LispError:
+        unchanged = False
+    return (body if unchanged else call), env
+
+register_special_form(INLINED, eval_inlined, tail=True)
+
+
+def can_inline(name, closure):
+    """Whether the body of `closure` can be inlined into other code. It must
+    be small, well-formed, and not refer to `name`, to avoid inlining
+    recursive functions forever."""
+    params = closure.params
+    if not all(is_symbol(param) for param in params) or len(set(params)) != len(params):
+        return False
+
+    size = 0
+    expressions = [closure.body]
+    while expressions:
+        ast = expressions.pop()
+        size += 1
+        if size > MAX_INLINE_SIZE or ast == name:
+            return False
+        if not is_list(ast) or len(ast) == 0:
+            continue
+
+        first = ast[0]
+        form = form_of(first)
+        if form is eval_quote:
+            if len(ast) != 2:
+                return False
+        elif form is not None:
+            if not is_well_formed(form, ast):
+                return False
+            expressions.extend(ast[1:])
+        elif first in params:
+            # calling a parameter, which would be replaced by its argument
+            return False
+        else:
+            expressions.extend(ast)
+    return True
+
+
+def is_well_formed(form, ast):
+    """Whether `ast` has the right number of elements for `form`, one of
+    those in `FORM_LENGTHS`."""
+    if form is eval_builtin:
+        return accepts_args(ast[0], len(ast) - 1)
+    return FORM_LENGTHS.get(form) == len(ast)
+
+
+def expressions_of(ast):
+    """The symbols and other atoms evaluated in a body that `can_inline`."""
+    if not is_list(ast):
+        yield ast
+        return
+    if len(ast) == 0:
+        return
+    first = ast[0]
+    form = form_of(first)
+    if form is eval_quote:
+        return
+    for exp in (ast[1:] if form is not None else ast):
+        for atom in expressions_of(exp):
+            yield atom
+
+
+def free_variables(body, params):
+    return set(atom for atom in expressions_of(body)
+               if is_symbol(atom) and atom not in params)
+
+
+def defined_variables(body):
+    """The variables defined with `define` in `body`, which shadow those of
+    the same name outside of it."""
+    names = []
+    expressions = [body]
+    while expressions:
+        ast = expressions.pop()
+        if not is_list(ast) or len(ast) == 0:
+            continue
+        form = form_of(ast[0])
+        if form is eval_quote:
+            continue
+        if form is eval_define and len(ast) == 3 and is_symbol(ast[1]):
+            names.append(ast[1])
+        expressions.extend(ast)
+    return names
+
+
+def count_uses(body, param):
+    return sum(1 for atom in expressions_of(body) if atom == param)
+
+
+def first_evaluated(body):
+    """The expression evaluated first when evaluating `body`, if it is an
+    atom. For a call, this is the function."""
+    while is_list(body) and len(body) > 0:
+        first = body[0]
+        form = form_of(first)
+        if form is eval_quote:
+            return None
+        body = body[1] if form is not None else first
+    return body
+
+
+def substitute(body, bindings):
+    """Replace the parameters in a body that `can_inline` by their values."""
+    if is_symbol(body):
+        return bindings.get(body, body)
+    if not is_list(body) or len(body) == 0:
+        return body
+    first = body[0]
+    form = form_of(first)
+    if form is eval_quote:
+        return body
+    if form is not None:
+        return [first] + [substitute(exp, bindings) for exp in body[1:]]
+    return [substitute(exp, bindings) for exp in body]
+
+
+def optimize(ast, env=None):
+    """Optimize a single AST, to be evaluated in `env` if given."""
+    return Optimizer(env).optimize(ast)
+
+
+def optimize_all(asts, env=None):
+    """Lazily optimize a series of ASTs, sharing quoted constants between
+    all of them. When evaluating each AST before the next is optimized,
+    the functions it defines in `env` can be inlined into the next ones."""
+    optimizer = Optimizer(env)
+    for ast in asts:
+        yield optimizer.optimize(ast)
+
+
+def form_of(symbol):
+    """The handler of the special form named `symbol`, if any."""
+    if not is_symbol(symbol):
+        return None
+    return SPECIAL_FORMS.get(symbol) or TAIL_FORMS.get(symbol)
+
+
+def literal(ast):
+    """Whether `ast` is a literal, and if so, its value."""
+    if is_boolean(ast) or is_integer(ast) or is_vector(ast):
+        return True, ast
+    if is_list(ast) and len(ast) == 2 and form_of(ast[0]) is eval_quote:
+        return True, ast[1]
+    return False, None
+
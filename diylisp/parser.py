@@ -1,10 +1,10 @@
 # -*- coding: utf-8 -*-
 
 import re
-import logging
 
-from .ast import is_boolean, is_list
-from .types import LispError
+from . import cache
+from .ast import is_boolean, is_integer, is_list, is_symbol, is_vector
+from .types import LispError, Symbol, LispList, Stream, Cons, make_vector
 
 """
 This is the parser module, with the `parse` function which you'll implement as part 1 of
@@ -12,263 +12,171 @@ the workshop. Its job is to convert strings into data structures that the evalua
 understand.
 """
 
-logger = logging.getLogger(__name__)
+# The installed tracer, see the `trace` module.
+tracer = None
 
-WHITESPACE    = " \t\n\r"
 TOK_PAR_OPEN  = '('
 TOK_PAR_CLOSE = ')'
+TOK_VEC_OPEN  = '['
+TOK_VEC_CLOSE = ']'
 TOK_QUOTE     = '\''
+TOK_COMMENT   = ';'
+
+# The closing token of each kind of brackets.
+CLOSING = {TOK_PAR_OPEN: TOK_PAR_CLOSE, TOK_VEC_OPEN: TOK_VEC_CLOSE}
+
+# One alternative per token kind. Whitespace is never matched, and is thus
+# skipped by `finditer`. Comments run from a `;` to the end of the line.
+TOKEN_RE = re.compile(r";[^\n]*|[()'\[\]]|[^\s()'\[\];]+")
+
 
 def parse(source):
     """Parse string representation of one *single* expression
     into the corresponding Abstract Syntax Tree."""
-    logger.debug("parse: source=%s", source)
-    source = source.strip()
-    source = remove_comments(source)
-
+    if tracer is not None:
+        tracer.parse(source)
 
-    expr, pend = do_parse(source, 0)
-
-    logger.debug("parse: %r, %d (%d)", expr, pend, len(source))
+    tokens = tokenize(source)
+    forms = read(tokens, source)
+    try:
+        expr = next(forms)
+    except StopIteration:
+        raise incomplete_expression(source, 0)
 
-    if pend != len(source):
+    for _ in tokens:
         raise LispError("Expected EOF")
 
     return expr
 
-def do_parse(source, pos, level=0):
-    def log(msg, *args):
-        logger.debug("%s do_parse: " + msg, level*"    ", *args)
-
-    log("source[%d:]: %s", pos, source[pos:])
-
-
-    pos = skip_whitespace(source, pos)
 
-    c = source[pos]
-    if c == TOK_PAR_OPEN:
-        log("TOK_PAR_OPEN")
-        expr, pend = parse_expr(source, pos, level + 1)
+def tokenize(source):
+    """tokenize(source) -> iterator of (token, pos)
 
-    elif c == TOK_PAR_CLOSE:
-        log("TOK_PAR_CLOSE")
+    Split the source into tokens in a single pass, dropping whitespace
+    and comments::
 
-    elif c == TOK_QUOTE:
-        log("TOK_QUOTE")
-        expr, pend = parse_quote(source, pos, level + 1)
-
-    elif c == '#':
-        log("BOOL")
-        expr, pend = parse_boolean(source, pos)
-
-    elif parse_int(source, pos):
-        log("INT")
-        expr, pend = parse_int(source, pos)
-
-    else:
-        log("SYMBOL")
-        expr, pend = parse_symbol(source, pos)
-
-    log("=> %r, %d %d", expr, pend, len(source))
-    return expr, pend
-
-def parse_expr(source, pos, level=0):
-    """parse_expr() -> ()
-
-    >> parse_expr("()", 0)
-    ([], 2)
-
-    >>> parse_expr("foo", 0)
-    Traceback (most recent call last):
-    ...
-    AssertionError
+    >>> list(tokenize("(foo 'bar) ; baz"))
+    [('(', 0), ('foo', 1), ("'", 5), ('bar', 6), (')', 9)]
     """
-    def log(msg, *args):
-        logger.debug("%s parse_expr: " + msg, level*"    ", *args)
-    assert source[pos] == TOK_PAR_OPEN
-
+    for match in TOKEN_RE.finditer(source):
+        tok = match.group()
+        if tok[0] != TOK_COMMENT:
+            yield tok, match.start()
 
-    pclose = find_matching_paren(source, pos)
-    pos += 1 # skip (
-    log("source[%d:%d]: %s", pos, pclose, source[pos:pclose])
 
+def tokenize_stream(stream):
+    """tokenize_stream(stream) -> iterator of (token, pos)
 
-    expr = []
-
-    while pos < pclose:
-        log("expr: %r pos: %d", expr, pos)
-        pos = skip_whitespace(source, pos)
-
-        sub_expr, pos = do_parse(source[:pclose], pos, level + 1)
-        log("sub_expr: %r pos: %d rest: %s", sub_expr, pos, source[pos:pclose])
-
-        expr.append(sub_expr)
-
-        pos += 1
-
-    pos = pclose + 1  # skip )
-    log("=> %r, %d", expr, pos)
-    return expr, pos
-
-def parse_quote(source, pos, level=0):
-    """parse_quote() -> ()
-
-    >>> parse_quote("'foo", 0)
-    (['quote', 'foo'], 4)
-
-    >>> parse_quote("'()", 0)
-    (['quote', []], 3)
-
+    Like `tokenize`, but reads the source line by line from a file object.
+    No token spans a line break, so only one line is held in memory at a time.
     """
-    def log(msg, *args):
-        logger.debug("%s parse_quote: " + msg, level*"    ", *args)
-    assert source[pos] == TOK_QUOTE
+    offset = 0
+    for line in iter(stream.readline, ""):
+        for match in TOKEN_RE.finditer(line):
+            tok = match.group()
+            if tok[0] != TOK_COMMENT:
+                yield tok, offset + match.start()
+        offset += len(line)
 
-    pos = pos + 1  # skip '
 
-    sub_expr, pos = do_parse(source, pos, level + 1)
+def read(tokens, source=""):
+    """read(tokens, source) -> iterator of ASTs
 
-    expr = ["quote", sub_expr]
+    Build the ASTs of all top level expressions from a stream of tokens.
 
-    log("=> %r, %d", expr, pos)
-    return expr, pos
+    Unclosed lists are kept on an explicit stack rather than the Python call
+    stack, so nesting depth is only limited by memory. A top level expression
+    is yielded as soon as its last token has been read, so any tokens after it
+    are left untouched in `tokens`. Integers in square brackets are read as a
+    vector::
 
-def parse_int(source, pos):
-    """parse_int(source, pos) -> (expr, pos)
-
-    Parse integer::
-
-    >>> parse_int("111", 0)
-    (111, 3)
-
-    >> parse_int("", 0)
-    None
+    >>> list(read(tokenize("foo '(1 #t) [1 2]")))
+    ['foo', ['quote', [1, True]], array('l', [1, 2])]
     """
-    tok, pend = next_token(source, pos)
-    if not tok:
-        return None
-
-    try:
-        return int(tok), pend
-    except ValueError, e:
-        pass
-
-    return None
-
-def parse_boolean(source, pos):
-    """parse_boolean(source, pos) -> (expr, pos)
-
-    Parse a boolean, retunr expression / pos tuple.
-
-    >>> parse_boolean("#f", 0)
-    (False, 2)
-
-    >>> parse_boolean("#f ", 0)
-    (False, 2)
-    """
-    assert source[pos] == "#"
-
-    tok, pend = next_token(source, pos)
-    if tok == "#t":
-        return True, pend
-    elif tok == "#f":
-        return False, pend
-
-    raise LispError("Parse error: " + tok)
-
-def parse_symbol(source, pos):
-    """parse_symbol(source, pos) -> (expr, pos)
-
-    Parse a symbol, retunr expression / pos tuple.
-
-    >>> parse_symbol("foo bar baz", 0)
-    ('foo', 3)
-
-    >>> parse_symbol("foo bar baz", 4)
-    ('bar', 7)
-
-    >>> parse_symbol("foo bar baz", 8)
-    ('baz', 11)
-    """
-    tok, pend = next_token(source, pos)
-    expr = source[pos:pend]
-    return expr, pend
+    stack = []    # (list, pos, quotes, opening token) for every unclosed bracket
+    quotes = 0    # number of quotes waiting for the next expression
+
+    for tok, pos in tokens:
+        if tok == TOK_QUOTE:
+            quotes += 1
+            continue
+
+        if tok == TOK_PAR_OPEN or tok == TOK_VEC_OPEN:
+            stack.append(([], pos, quotes, tok))
+            quotes = 0
+            continue
+
+        if tok == TOK_PAR_CLOSE or tok == TOK_VEC_CLOSE:
+            if not stack or CLOSING[stack[-1][3]] != tok:
+                raise LispError("Unexpected '%s' at position %d" % (tok, pos))
+            if quotes:
+                raise incomplete_expression(source, stack[-1][1], pos + 1)
+            expr, _, quotes, opening = stack.pop()
+            if opening == TOK_VEC_OPEN:
+                expr = parse_vector(expr)
+        else:
+            expr = parse_atom(tok)
 
-def next_token(source, pos):
-    """next_token(source, start) -> (token, pos)
+        while quotes:
+            expr = ["quote", expr]
+            quotes -= 1
 
-    Get next token from start::
+        if stack:
+            stack[-1][0].append(expr)
+        else:
+            yield expr
 
-    >>> next_token("foo", 0)
-    ('foo', 3)
+    if stack:
+        raise incomplete_expression(source, stack[0][1])
+    if quotes:
+        raise incomplete_expression(source, 0)
 
-    >>> next_token("foo bar baz", 0)
-    ('foo', 3)
 
-    >>> next_token("foo bar baz", 4)
-    ('bar', 7)
+def parse_vector(items):
+    for item in items:
+        if not is_integer(item) or is_boolean(item):
+            raise LispError("Parse error: vector elements must be integers: %s" % unparse(item))
+    return make_vector(items)
 
-    >>> next_token("foo()", 0)
-    ('foo', 3)
 
-    >>> next_token("foo bar baz", 8)
-    ('baz', 11)
+def incomplete_expression(source, start, end=None):
+    """Error for an expression starting at `start` that was never finished.
 
-    """
-    pend = skip_symbol(source, pos)
-    if pend <= len(source):
-        tok = source[pos:pend]
-        return tok, pend
+    When reading from a stream the source is not kept around, and we can only
+    point at the position in the input."""
+    if source:
+        return LispError("Incomplete expression: %s" % source[start:end].strip())
+    return LispError("Incomplete expression at position %d" % start)
 
-    return None, pend
 
-def skip_whitespace(source, start):
-    """
-    Skip whitespace in source form start::
+def parse_atom(tok):
+    """parse_atom(tok) -> expr
 
-    >>> skip_whitespace("   foo", 0)
-    3
+    Turn a single token into a boolean, an integer or an interned symbol::
 
-    >>> skip_whitespace("   foo", 2)
-    3
+    >>> parse_atom("#t")
+    True
 
-    >>> skip_whitespace("foo", 0)
-    0
+    >>> parse_atom("-42")
+    -42
 
-    >>> skip_whitespace("   ", 0)
-    3
+    >>> parse_atom("foo")
+    'foo'
     """
-    return skip_until(source, start, WHITESPACE)
-
-def skip_symbol(source, start):
-    """skip_symbol(source, start) -> int
+    if tok[0] == "#":
+        if tok == "#t":
+            return True
+        elif tok == "#f":
+            return False
+        raise LispError("Parse error: " + tok)
 
-    Skip symbol starting at start::
+    if tok[0] in "0123456789+-":
+        try:
+            return int(tok)
+        except ValueError:
+            pass
 
-    >>> skip_symbol("foo", 0)
-    3
-
-    >>> skip_symbol("foo(", 0)
-    3
-    """
-    return find_chars(source, start, WHITESPACE + TOK_PAR_OPEN + TOK_PAR_CLOSE + TOK_QUOTE)
-
-def find_whitespace(source, start):
-    return find_chars(source, start, WHITESPACE)
-
-def skip_until(source, start, chars):
-    for n, c in enumerate(source[start:]):
-        if c not in chars:
-            return start + n
-    else:
-        return len(source)
-
-def find_chars(source, start, chars):
-    for n, c in enumerate(source[start:]):
-        if c in chars:
-            return start + n
-    else:
-        return len(source)
+    return Symbol(tok)
 
 ##
 ## Below are a few useful utility functions. These should come in handy when
@@ -350,10 +258,50 @@ def parse_multiple(source):
         >>> parse_multiple("(foo bar) (baz 1 2 3)")
         [['foo', 'bar'], ['baz', 1, 2, 3]]
 
+    The ASTs are cached on disk when a cache directory is configured,
+    see the `cache` module.
+    """
+    if tracer is not None:
+        tracer.parse(source)
+
+    if not cache.enabled or cache.cache_dir is None:
+        return list(read(tokenize(source), source))
+
+    key = cache.source_key(source)
+    path = cache.path_for(key)
+    asts = cache.load(path, key)
+    if asts is None:
+        asts = cache.store(read(tokenize(source), source), path, key)
+    return list(asts)
+
+
+def parse_file(filename):
+    """Lazily parse the expressions of a lisp file.
+
+    Like `parse_stream`, but the ASTs are loaded from the on-disk cache
+    when the file has been parsed before, see the `cache` module.
     """
+    with open(filename, 'r') as sourcefile:
+        if not cache.enabled or not cache.can_seek(sourcefile):
+            asts = parse_stream(sourcefile)
+        else:
+            key = cache.file_key(sourcefile)
+            path = cache.path_for(key, filename)
+            asts = cache.load(path, key)
+            if asts is None:
+                asts = cache.store(parse_stream(sourcefile), path, key)
+
+        for ast in asts:
+            yield ast
+
 
-    source = remove_comments(source)
-    return [parse(exp) for exp in split_exps(source)]
+def parse_stream(stream):
+    """Lazily parse the expressions read from a file object.
+
+    The ASTs are yielded one at a time, as soon as each top level expression
+    is complete. This lets programs be evaluated while they are being read.
+    """
+    return read(tokenize_stream(stream))
 
 
 def unparse(ast):
@@ -366,6 +314,34 @@ def unparse(ast):
             return "'%s" % unparse(ast[1])
         else:
             return "(%s)" % " ".join([unparse(x) for x in ast])
+    elif isinstance(ast, LispList):
+        return unparse_list_value(ast)
+    elif is_vector(ast):
+        return "[%s]" % " ".join(str(x) for x in ast)
+    elif is_symbol(ast):
+        # plain strings or interned Symbols
+        return str(ast)
     else:
-        # integers or symbols (or lambdas)
+        # integers (or lambdas)
         return str(ast)
+
+
+def unparse_list_value(lst):
+    """Unparse a list made by `cons`, `tail` or a stream. Only the elements
+    of streams that have already been computed are shown, followed by `...`
+    if there may be more."""
+    items = []
+    while True:
+        if isinstance(lst, Stream):
+            if lst.producer is not None:
+                return "(%s)" % " ".join([unparse(x) for x in items] + ["..."])
+            if not lst.cell:
+                break
+            item, lst = lst.cell
+        elif isinstance(lst, Cons):
+            item, lst = lst.first, lst.rest
+        else:
+            items.extend(lst)
+            break
+        items.append(item)
+    return unparse(items)
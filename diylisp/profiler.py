@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+from contextlib import contextmanager
+from timeit import default_timer
+
+from . import trace
+from .trace import Tracer
+
+"""
+A profiler for lisp programs, telling which lisp functions the time is spent
+in, where a Python profiler only shows the evaluator calling itself.
+
+The profiler is a tracer (see the `trace` module), timing each call of a
+closure, and each builtin. Closures are known by the name they were first
+defined with, or as `lambda`, and builtins by their name. For each name it
+counts the calls, the inclusive time, spent until the call returned, and the
+self time, not spent in the calls it made in turn. Recursive calls are only
+counted once in the inclusive time.
+
+    profiler = Profiler()
+    interpret_file("program.diy", profiler=profiler)
+    print(profiler.report())
+
+`collapsed` gives the time spent in each stack of calls, in the format read
+by flame graph tools like `flamegraph.pl`. Tail calls replace the calling
+function on the stack, as they do in the evaluator.
+
+Only the tree walking `evaluate` is profiled, like it is traced, and the
+interpreter raises a LispError when asked to profile another engine, or while
+tiering, rather than give an empty profile. Time spent tracing is included in
+the timings, making programs run about twice as slow.
+"""
+
+ANONYMOUS = "lambda"
+
+
+class Profile:
+    """The calls and times of one function, in seconds."""
+
+    __slots__ = ("name", "calls", "inclusive", "self_time")
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.inclusive = 0.0
+        self.self_time = 0.0
+
+    def __repr__(self):
+        return "<profile %s: %d calls, %.6fs, %.6fs self>" % (
+            self.name, self.calls, self.inclusive, self.self_time)
+
+
+class Profiler(Tracer):
+    """Tracer timing the functions called while it is installed.
+
+    The functions being run are kept on a stack of frames, each a list of
+    its profile, stack path, start time, and time spent in the frames above
+    it. Each level of evaluation that has been entered and not left keeps
+    the height of the stack when it was entered, so leaving it ends the calls
+    made in it."""
+
+    def __init__(self, clock=default_timer):
+        self.clock = clock
+        self.profiles = {}
+        self.stacks = {}
+        self.frames = []
+        self.levels = []
+        # the number of frames of each name on the stack
+        self.active = {}
+        # a closure just called, with the time of the call, until it is
+        # known at which level its body is evaluated
+        self.pending = None
+
+    def enter(self, ast, env):
+        pending = self.pending
+        if pending is not None:
+            self.pending = None
+            if ast is pending[0].body:
+                # the body is evaluated by a new call of `evaluate`
+                self.levels.append(len(self.frames))
+                self.start(closure_name(pending[0]), pending[1])
+                return
+            self.tail_call(pending)
+        self.levels.append(len(self.frames))
+
+    def leave(self, value):
+        if self.pending is not None:
+            self.tail_call(self.pending)
+            self.pending = None
+        if not self.levels:
+            return
+        height = self.levels.pop()
+        if len(self.frames) > height:
+            now = self.clock()
+            while len(self.frames) > height:
+                self.end(now)
+
+    def call(self, closure, values):
+        if self.pending is not None:
+            self.tail_call(self.pending)
+        self.pending = closure, self.clock()
+
+    def builtin(self, name, values):
+        if self.pending is not None:
+            self.tail_call(self.pending)
+            self.pending = None
+        if not self.levels:
+            return
+        frames = self.frames
+        if len(frames) > self.levels[-1] and frames[-1][0].name == name:
+            # the native implementation of the function just called
+            return
+        # ended with the level it is applied in
+        self.start(name, self.clock())
+
+    def tail_call(self, pending):
+        """Start a call whose body is evaluated in the current level, ending
+        the call made before it in the same level, if any."""
+        if not self.levels:
+            return
+        closure, now = pending
+        height = self.levels[-1]
+        while len(self.frames) > height:
+            self.end(now)
+        self.start(closure_name(closure), now)
+
+    def start(self, name, now):
+        profile = self.profiles.get(name)
+        if profile is None:
+            profile = self.profiles[name] = Profile(name)
+        profile.calls += 1
+        self.active[name] = self.active.get(name, 0) + 1
+        path = self.frames[-1][1] + ";" + name if self.frames else name
+        self.frames.append([profile, path, now, 0.0])
+
+    def end(self, now):
+        profile, path, started, nested = self.frames.pop()
+        elapsed = now - started
+        own = elapsed - nested
+        profile.self_time += own
+        self.stacks[path] = self.stacks.get(path, 0.0) + own
+
+        name = profile.name
+        self.active[name] -= 1
+        if not self.active[name]:
+            profile.inclusive += elapsed
+        if self.frames:
+            self.frames[-1][3] += elapsed
+
+    def finish(self):
+        """End all calls still running, as when evaluation fails with an
+        error, which leaves no levels."""
+        if self.pending is not None:
+            self.tail_call(self.pending)
+            self.pending = None
+        now = self.clock()
+        while self.frames:
+            self.end(now)
+        del self.levels[:]
+
+    def stats(self):
+        """The profiles of all functions called, by decreasing self time."""
+        return sorted(self.profiles.values(), key=lambda p: (-p.self_time, p.name))
+
+    def report(self, limit=None):
+        """A table of the profiles of the functions taking the most time."""
+        lines = ["%10s %12s %12s  %s" % ("calls", "inclusive", "self", "function")]
+        for profile in self.stats()[:limit]:
+            lines.append("%10d %12.6f %12.6f  %s" % (
+                profile.calls, profile.inclusive, profile.self_time, profile.name))
+        return "\n".join(lines)
+
+    def collapsed(self):
+        """The stacks of calls, as lines of the names of the functions from
+        the outermost one, separated by semicolons, followed by the self
+        time spent in the innermost one, in microseconds."""
+        return "".join("%s %d\n" % (path, round(own * 1e6))
+                       for path, own in sorted(self.stacks.items()))
+
+
+def closure_name(closure):
+    return closure.name or ANONYMOUS
+
+
+@contextmanager
+def profiling(profiler):
+    """Install `profiler` as the tracer while running the body of the `with`
+    statement. Does nothing if `profiler` is None."""
+    if profiler is None:
+        yield
+        return
+    previous = trace.install(profiler)
+    try:
+        yield
+    finally:
+        profiler.finish()
+        trace.install(previous)
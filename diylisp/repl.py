@@ -13,8 +13,9 @@ from .interpreter import interpret, interpret_file
 import readline
 
 
-def repl():
-    """Start the interactive Read-Eval-Print-Loop"""
+def repl(engine="eval", optimize=False, profiler=None):
+    """Start the interactive Read-Eval-Print-Loop. The expressions entered
+    are timed by `profiler`, if given."""
     print()
     print("                 " + faded("                             \`.    T       "))
     print("    Welcome to   " + faded("   .--------------.___________) \   |    T  "))
@@ -25,11 +26,11 @@ def repl():
     print()
 
     env = Environment()
-    interpret_file(join(dirname(relpath(__file__)), '..', 'stdlib.diy'), env)
+    interpret_file(join(dirname(relpath(__file__)), '..', 'stdlib.diy'), env, engine, optimize)
     while True:
         try:
             source = read_expression()
-            print(interpret(source, env))
+            print(interpret(source, env, engine, optimize, profiler))
         except LispError as e:
             print(colored("!", "red"))
             print(faded(str(e.__class__.__name__) + ":"))
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+from itertools import count, islice, takewhile
+
+from .types import LispError, Symbol, Cons, Promise, Stream, stream
+from .ast import is_integer, is_boolean, is_list_value
+from .parser import unparse
+from .evaluator import evaluate, register_special_form, register_procedure, \
+    apply_head, apply_tail, call
+
+"""
+Delayed evaluation, and lazy lists.
+
+`(delay exp)` returns a promise to evaluate `exp` later, and `(force p)`
+evaluates it, the first time it is forced. Later calls give the same value.
+
+Streams are lists whose elements are only computed when they are needed.
+`head`, `tail` and `empty` work on them like on any list, computing one
+more element at a time, so a pipeline like
+
+    (stream-take 10 (stream-filter prime (stream-range 1)))
+
+only ever computes the 10 elements it needs, and elements that have been
+walked past can be garbage collected. Streams are made by:
+
+    (cons-stream a b)           the list of `a` followed by the list `b`,
+                                which is only evaluated when it is needed
+    (stream-range start)        the integers from `start` on, without end
+    (stream-range start end)    ... up to and including `end`
+    (stream-map f lst)          `f` applied to each element of `lst`
+    (stream-filter p lst)       the elements of `lst` for which `p` is true
+
+`(stream-take n lst)` gives a plain list of the first `n` elements of a list,
+computing no others. Streams can be given to any other function taking lists,
+but those walking the whole list, like `length` or `reverse`, must not be
+given infinite streams.
+"""
+
+DELAY = Symbol("delay")
+CONS_STREAM = Symbol("cons-stream")
+
+
+def eval_delay(ast, env):
+    if len(ast) != 2:
+        raise LispError("delay: wrong number of arguments")
+    return Promise(ast[1], env)
+
+
+def eval_cons_stream(ast, env):
+    if len(ast) != 3:
+        raise LispError("cons-stream: wrong number of arguments")
+    first = evaluate(ast[1], env)
+    promise = Promise(ast[2], env)
+
+    def produce():
+        rest = force(promise)
+        if not is_list_value(rest):
+            raise LispError("cons-stream: not a list: %s" % unparse(rest))
+        if not rest:
+            return ()
+        return apply_head(rest), apply_tail(rest)
+    return Cons(first, Stream(produce))
+
+
+def force(value):
+    """The value of a promise, evaluating it the first time. Values other
+    than promises are returned as they are."""
+    if not isinstance(value, Promise):
+        return value
+    if not value.forced:
+        result = evaluate(value.ast, value.env)
+        # forcing the promise again while evaluating it may have set it
+        if not value.forced:
+            value.value = result
+            value.forced = True
+            value.ast = value.env = None
+    return value.value
+
+
+def check_list(value, name):
+    if not is_list_value(value):
+        raise LispError("%s: not a list: %s" % (name, unparse(value)))
+
+
+def check_integer(value, name):
+    if not is_integer(value) or is_boolean(value):
+        raise LispError("%s: not an integer: %s" % (name, unparse(value)))
+
+
+def stream_range(start, end=None):
+    check_integer(start, "stream-range")
+    if end is None:
+        return stream(count(start))
+    check_integer(end, "stream-range")
+    return stream(takewhile(lambda n: n <= end, count(start)))
+
+
+def stream_map(function, lst):
+    check_list(lst, "stream-map")
+    return stream(call(function, [value], "stream-map") for value in lst)
+
+
+def stream_filter(predicate, lst):
+    check_list(lst, "stream-filter")
+    return stream(value for value in lst if call(predicate, [value], "stream-filter"))
+
+
+def stream_take(n, lst):
+    check_integer(n, "stream-take")
+    check_list(lst, "stream-take")
+    return list(islice(lst, max(n, 0)))
+
+
+register_special_form(DELAY, eval_delay)
+register_special_form(CONS_STREAM, eval_cons_stream)
+for name, function in [("force", force),
+                       ("stream-range", stream_range),
+                       ("stream-map", stream_map),
+                       ("stream-filter", stream_filter),
+                       ("stream-take", stream_take)]:
+    register_procedure(name, function)
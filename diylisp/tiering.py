@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from collections import deque, namedtuple
+
+from . import evaluator
+from .transpiler import python_function
+
+"""
+Tiered execution: running the functions called most often as Python code.
+
+While a `Tiering` policy is installed, `evaluate` counts the calls of each
+closure, in `Closure.calls`, and the tail calls its body makes to itself,
+like the iterations of a loop, in `Closure.loops`. Closures start out
+evaluated as usual. Once a closure has been called `call_threshold` times,
+or has looped `loop_threshold` times, it is promoted: its body is translated
+into a Python function by the `transpiler`, and its later calls run that
+function instead. Closures whose body can not be translated keep being
+evaluated.
+
+    >>> tiering.install(Tiering(call_threshold=100))
+
+Each promotion is logged, at info level, to the logger of this module, and
+kept in `Tiering.promotions`. See `Tiering.info` for counts.
+
+Promoted functions hand the tail calls they make to other closures back to
+`evaluate`, so tail calls still run in constant stack space. Their calls are
+not seen by the tracer, though, so no policy is installed by default. When
+none is, the calls are not counted, at no more cost than a check of a module
+global. The other evaluation engines do not tier.
+"""
+
+DEFAULT_CALL_THRESHOLD = 1000
+DEFAULT_LOOP_THRESHOLD = 100
+
+# The number of recent promotions kept by a policy.
+MAX_PROMOTIONS = 1000
+
+log = logging.getLogger(__name__)
+
+# A closure reaching a threshold, with its counts at that point, and
+# whether it could be promoted.
+Promotion = namedtuple("Promotion", "closure calls loops promoted")
+
+
+class Tiering:
+    """The policy deciding when closures are promoted to Python code."""
+
+    def __init__(self, call_threshold=DEFAULT_CALL_THRESHOLD,
+                 loop_threshold=DEFAULT_LOOP_THRESHOLD):
+        self.call_threshold = call_threshold
+        self.loop_threshold = loop_threshold
+        self.promotions = deque(maxlen=MAX_PROMOTIONS)
+        self.promoted = 0
+        self.failed = 0
+
+    def call(self, closure, loop):
+        """Count a call of `closure`, which is a tail call from its own body
+        if `loop` is true. Returns the Python function to run the call with,
+        or None to evaluate the body."""
+        closure.calls += 1
+        if loop:
+            closure.loops += 1
+        function = closure.python
+        if function is None and (closure.calls >= self.call_threshold
+                                 or closure.loops >= self.loop_threshold):
+            function = self.promote(closure)
+        return function or None
+
+    def promote(self, closure):
+        """Translate the body of `closure`, and keep the function on it.
+        Closures which can not be translated are marked with False, so they
+        are not tried again."""
+        function = python_function(closure, closure)
+        closure.python = function if function is not None else False
+
+        promotion = Promotion(closure, closure.calls, closure.loops, function is not None)
+        self.promotions.append(promotion)
+        if function is not None:
+            self.promoted += 1
+            log.info("promoted %r after %d calls and %d loops",
+                     closure, closure.calls, closure.loops)
+        else:
+            self.failed += 1
+            log.info("could not promote %r after %d calls and %d loops",
+                     closure, closure.calls, closure.loops)
+        return function
+
+    def info(self):
+        """The thresholds, and the numbers of closures promoted, and of those
+        which could not be."""
+        return {
+            "call_threshold": self.call_threshold,
+            "loop_threshold": self.loop_threshold,
+            "promoted": self.promoted,
+            "failed": self.failed,
+        }
+
+
+def install(policy):
+    """Start tiering with `policy`, or stop if it is None. Returns the policy
+    installed before."""
+    previous = evaluator.tiering
+    evaluator.tiering = policy
+    return previous
+
+
+def uninstall():
+    """Stop tiering, returning the policy that was installed. Closures
+    already promoted keep their Python function, but it is only used by
+    transpiled code."""
+    return install(None)
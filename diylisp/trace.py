@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from . import evaluator, parser
+
+"""
+Hooks for following what the parser and the evaluator are doing.
+
+The tree walking `evaluate` and the parser report each step to the installed
+tracer, an object with the methods of `Tracer` below. When no tracer is
+installed, which is the default, each hook costs no more than a check of a
+module global, so tracing support does not slow down normal evaluation.
+
+The other evaluation engines are not traced.
+"""
+
+
+class Tracer:
+    """Base class of tracers, ignoring all events. Subclasses override the
+    methods of the events they are interested in."""
+
+    def parse(self, source):
+        """Parsing of `source` is about to start."""
+
+    def enter(self, ast, env):
+        """Evaluation of `ast` in `env` is about to start."""
+
+    def leave(self, value):
+        """The evaluation last entered has returned `value`. Evaluation
+        ending with an error does not leave."""
+
+    def call(self, closure, values):
+        """The body of `closure` is about to be evaluated, with the
+        parameters bound to `values`."""
+
+    def builtin(self, name, values):
+        """The builtin or special form `name` is about to be applied to
+        the evaluated arguments `values`."""
+
+
+class LoggingTracer(Tracer):
+    """Tracer logging every event, at debug level, to the loggers of the
+    evaluator and parser modules."""
+
+    def __init__(self):
+        self.evaluator_log = logging.getLogger(evaluator.__name__)
+        self.parser_log = logging.getLogger(parser.__name__)
+        self.evaluator_log.setLevel(logging.DEBUG)
+        self.parser_log.setLevel(logging.DEBUG)
+
+    def parse(self, source):
+        self.parser_log.debug("parse: source=%s", source)
+
+    def enter(self, ast, env):
+        self.evaluator_log.debug("evaluate: %r in %r", ast, env)
+
+    def leave(self, value):
+        self.evaluator_log.debug("evaluate: value %r", value)
+
+    def call(self, closure, values):
+        self.evaluator_log.debug("eval_closure: %r", closure)
+        self.evaluator_log.debug("eval_closure: param values: %r", values)
+
+    def builtin(self, name, values):
+        self.evaluator_log.debug("eval_%s: param values: %r", name, values)
+
+
+def install(tracer):
+    """Start reporting to `tracer`, or stop tracing if it is None.
+    Returns the tracer installed before."""
+    previous = evaluator.tracer
+    evaluator.tracer = tracer
+    parser.tracer = tracer
+    return previous
+
+
+def uninstall():
+    """Stop tracing, returning the tracer that was installed."""
+    return install(None)
@@ -0,0 +1,380 @@
+# -*- coding: utf-8 -*-
+
+from .types import LispError, Closure, Builtin, Symbol, TailCall
+from .ast import is_boolean, is_integer, is_symbol, is_list, is_closure, is_atom
+from .asserts import assert_exp_length
+from .parser import unparse
+from .evaluator import BUILTINS, FOLDED, QUOTE, IF, ATOM, EQ, DEFINE, CONS, HEAD, \
+    TAIL, EMPTY, evaluate, register_special_form, register_procedure, is_special_form, \
+    accepts_args, apply_eq, apply_builtin, apply_builtins, apply_cons, apply_head, \
+    apply_tail, apply_empty, check_arity, check_builtin_args, run_closure, bind, \
+    bound_values
+
+"""
+Translation of functions into Python source code, with `transpile`:
+
+    (define fact
+        (transpile
+            (lambda (n)
+                (if (eq n 0) 1 (* n (fact (- n 1)))))))
+
+`(transpile f)` returns a function computing the same as `f`, whose body has
+been translated into a Python function, compiled with `compile` and run by
+the Python interpreter without walking the AST. An `if` becomes a conditional
+expression, or an `if` statement in tail position, builtins on integers
+become Python operators, and calls to other transpiled functions call their
+Python function directly. A function calling itself in tail position loops
+instead, in constant stack space. Other tail calls to functions are handed
+back to the caller, which makes them in turn, so functions calling each other
+in tail position run in constant stack space too. Other calls are made by
+`evaluate`.
+
+Expressions which are not translated, like `lambda` or the forms registered
+by other modules, are evaluated with `evaluate` when they are reached, so any
+function can be transpiled. Functions using `define` in their body are not
+translated at all, and are returned as they are. Calls made by translated
+code are not seen by the tracer.
+
+The transpiled function is a `Closure` like any other, so it can be called by
+all evaluation engines. Its body is a `%transpiled` form, calling the Python
+function. The Python code of a lambda expression is only compiled once, for
+all closures made from it.
+"""
+
+TRANSPILE = Symbol("transpile")
+TRANSPILED = Symbol("%transpiled")
+
+# The builtins translated into Python operators, when given integers.
+OPERATORS = {"+": "+", "-": "-", "*": "*", "/": "//", "mod": "%", ">": ">", "<": "<"}
+
+# The longest Python source of the arguments of a call repeated by
+# `Translator.call`.
+MAX_REPEATED = 200
+
+# The factories of the Python functions of the bodies of lambda expressions,
+# by the `id` of the body, along with the body and parameters themselves to
+# keep the `id` from being reused.
+FACTORIES = {}
+MAX_FACTORIES = 256
+
+
+class Translator:
+    """Translates the body of a closure into the source of a Python function.
+
+    Parameters become local variables `p0`, `p1`, ..., and other values the
+    code refers to, like symbols and quoted data, are kept in the list of
+    constants `K`."""
+
+    def __init__(self, params):
+        self.params = params
+        self.locals = dict((Symbol(p), "p%d" % i) for i, p in enumerate(params))
+        self.constants = []
+        self.lines = []
+        # whether the body makes tail calls, which may be to other functions
+        self.tail_calls = False
+
+    def translate(self, body):
+        """The source of a function making the Python function for `body`,
+        given the environment of the closure, the constants, and the closure
+        the function is the body of."""
+        args = ", ".join("p%d" % i for i in range(len(self.params)))
+        self.emit(0, "def make(env, K, SELF):")
+        self.emit(1, "lookup = env.lookup")
+        self.emit(1, "def step(%s):" % args)
+        self.emit(2, "while 1:")
+        self.tail(body, 3)
+        if self.tail_calls:
+            self.emit(1, "def transpiled(%s):" % args)
+            self.emit(2, "return resolve(step(%s))" % args)
+        else:
+            self.emit(1, "transpiled = step")
+        self.emit(1, "transpiled.step = step")
+        self.emit(1, "return transpiled")
+        return "\n".join(self.lines) + "\n"
+
+    def emit(self, indent, line):
+        self.lines.append("    " * indent + line)
+
+    def const(self, value):
+        self.constants.append(value)
+        return "K[%d]" % (len(self.constants) - 1)
+
+    def tail(self, ast, indent):
+        """Emit statements returning the value of `ast`, which is in tail
+        position."""
+        if is_list(ast) and len(ast) == 4 and ast[0] == IF:
+            self.emit(indent, "if %s:" % self.exp(ast[1]))
+            self.tail(ast[2], indent + 1)
+            self.tail(ast[3], indent)
+        elif self.is_call(ast):
+            self.tail_calls = True
+            callee = self.exp(ast[0])
+            args = ", ".join(self.exp(arg) for arg in ast[1:])
+            if len(ast) - 1 != len(self.params):
+                self.emit(indent, "return tail_call(%s, [%s], %s)" % (
+                    callee, args, self.const(ast[0])))
+                return
+            self.emit(indent, "fn = %s" % callee)
+            self.emit(indent, "values = [%s]" % args)
+            self.emit(indent, "if fn is SELF:")
+            if self.params:
+                self.emit(indent + 1, "%s, = values" % ", ".join(
+                    "p%d" % i for i in range(len(self.params))))
+            self.emit(indent + 1, "continue")
+            self.emit(indent, "return tail_call(fn, values, %s)" % self.const(ast[0]))
+        else:
+            self.emit(indent, "return %s" % self.exp(ast))
+
+    def is_call(self, ast):
+        """Whether `ast` is a function call, rather than a special form."""
+        if not is_list(ast) or len(ast) == 0:
+            return False
+        first = ast[0]
+        if is_symbol(first):
+            return not is_special_form(first)
+        return is_list(first) or is_closure(first)
+
+    def exp(self, ast):
+        """A Python expression for the value of `ast`."""
+        if is_boolean(ast) or is_integer(ast):
+            return repr(ast)
+        if is_symbol(ast):
+            name = self.locals.get(ast)
+            return name if name is not None else "lookup(%s)" % self.const(Symbol(ast))
+        if not is_list(ast) or len(ast) == 0:
+            return self.fallback(ast)
+
+        first = ast[0]
+        if self.is_call(ast):
+            return self.call(ast)
+        if not is_symbol(first):
+            return self.fallback(ast)
+        if first == QUOTE and len(ast) == 2:
+            return self.const(ast[1])
+        if first == IF and len(ast) == 4:
+            return "(%s if %s else %s)" % (self.exp(ast[2]), self.exp(ast[1]), self.exp(ast[3]))
+        if first in UNARY and len(ast) == 2:
+            return "%s(%s)" % (UNARY[first], self.exp(ast[1]))
+        if first == EQ and len(ast) == 3:
+            return self.eq(self.exp(ast[1]), self.exp(ast[2]))
+        if first in BINARY and len(ast) == 3:
+            return "%s(%s, %s)" % (BINARY[first], self.exp(ast[1]), self.exp(ast[2]))
+        if first in BUILTINS and (len(ast) == 3 or accepts_args(first, len(ast) - 1)):
+            return self.builtin(first, ast[1:])
+        return self.fallback(ast)
+
+    def call(self, ast):
+        """A Python expression for a function call. A call to a variable
+        with as many arguments as the function takes calls the Python
+        function itself if the variable holds the transpiled function, as
+        in recursive calls. The arguments are only repeated for that if
+        they are short."""
+        callee = self.exp(ast[0])
+        args = ", ".join(self.exp(arg) for arg in ast[1:])
+        invoke = "invoke(%s, [%s], %s)" % (callee, args, self.const(ast[0]))
+        if not is_symbol(ast[0]) or len(ast) - 1 != len(self.params) \
+                or len(args) > MAX_REPEATED:
+            return invoke
+        return "(transpiled(%s) if %s is SELF else %s)" % (args, callee, invoke)
+
+    def builtin(self, name, args):
+        if name in FOLDED:
+            if len(args) == 1:
+                args = [FOLDED[name]] + args
+            result = self.exp(args[0])
+            for arg in args[1:]:
+                result = self.operator(name, result, self.exp(arg))
+            return result
+        if len(args) == 2:
+            return self.operator(name, self.exp(args[0]), self.exp(args[1]))
+        return "builtins(%s, [%s])" % (self.const(name), ", ".join(self.exp(arg) for arg in args))
+
+    def operator(self, name, a, b):
+        """A Python expression applying the builtin `name` to the values of
+        the Python expressions `a` and `b`. Parameters are used with the
+        Python operator after checking they are integers, and other values
+        with `apply_builtin`."""
+        apply = "builtin(%s, %s, %s)" % (self.const(name), a, b)
+        checks = ["type(%s) is int" % operand for operand in (a, b)
+                  if not is_int_literal(operand)]
+        if not checks or not all(self.is_simple(operand) for operand in (a, b)):
+            return apply
+        return "(%s %s %s if %s else %s)" % (a, OPERATORS[name], b, " and ".join(checks), apply)
+
+    def eq(self, a, b):
+        """A Python expression comparing the values of `a` and `b` with `eq`,
+        using `==` for a parameter holding an integer and an integer."""
+        apply = "apply_eq(%s, %s)" % (a, b)
+        if is_int_literal(a):
+            a, b = b, a
+        if not is_int_literal(b) or a not in self.locals.values():
+            return apply
+        return "(%s == %s if type(%s) is int else %s)" % (a, b, a, apply)
+
+    def is_simple(self, source):
+        """Whether the Python expression `source` is a parameter or an integer,
+        which can be repeated at no cost."""
+        return source in self.locals.values() or is_int_literal(source)
+
+    def fallback(self, ast):
+        return "fallback(%s, env, %s, [%s])" % (
+            self.const(ast), self.const(self.params),
+            ", ".join("p%d" % i for i in range(len(self.params))))
+
+
+def is_int_literal(source):
+    return source.lstrip("-").isdigit()
+
+
+UNARY = {ATOM: "is_atom", HEAD: "apply_head", TAIL: "apply_tail", EMPTY: "apply_empty"}
+BINARY = {CONS: "apply_cons"}
+
+
+def invoke(function, values, callee):
+    """Call a closure or builtin from transpiled code. Transpiled closures
+    are called directly, and others are evaluated."""
+    if type(function) is Closure:
+        check_arity(function, len(values))
+        if function.python:
+            return function.python(*values)
+        return run_closure(function, values)
+    if type(function) is Builtin:
+        check_builtin_args(function, len(values))
+        return function.function(*values)
+    raise LispError("Can't call: %s" % unparse(callee if is_list(callee) else function))
+
+
+def tail_call(function, values, callee):
+    """Make a tail call from transpiled code. Calls to closures are returned
+    as a `TailCall`, for the caller to make."""
+    if type(function) is Closure:
+        check_arity(function, len(values))
+        return TailCall(function, values)
+    return invoke(function, values, callee)
+
+
+def run_tail_calls(value):
+    """Make the tail calls returned by transpiled code to other transpiled
+    closures, in a loop. Returns the value they end with, or the first tail
+    call to a closure which is not transpiled."""
+    while type(value) is TailCall and value.closure.python:
+        value = value.closure.python.step(*value.values)
+    return value
+
+
+def resolve(value):
+    """The value of a call to a transpiled function, making the tail calls it
+    returns."""
+    value = run_tail_calls(value)
+    if type(value) is TailCall:
+        return run_closure(value.closure, value.values)
+    return value
+
+
+def fallback(ast, env, params, values):
+    """Evaluate an expression transpiled code does not handle itself."""
+    return evaluate(ast, env.extend(dict(zip(params, values))))
+
+
+RUNTIME = {
+    "invoke": invoke,
+    "tail_call": tail_call,
+    "resolve": resolve,
+    "fallback": fallback,
+    "builtin": apply_builtin,
+    "builtins": apply_builtins,
+    "is_atom": is_atom,
+    "apply_eq": apply_eq,
+    "apply_cons": apply_cons,
+    "apply_head": apply_head,
+    "apply_tail": apply_tail,
+    "apply_empty": apply_empty,
+}
+
+
+def can_transpile(closure):
+    """Whether the body of `closure` can be translated: its parameters are
+    distinct symbols, and it defines no variables outside of quoted data."""
+    params = closure.params
+    if not all(is_symbol(param) for param in params) or len(set(params)) != len(params):
+        return False
+
+    expressions = [closure.body]
+    while expressions:
+        ast = expressions.pop()
+        if is_list(ast) and len(ast) > 0 and ast[0] != QUOTE:
+            if ast[0] == DEFINE:
+                return False
+            expressions.extend(ast)
+    return True
+
+
+def factory(closure):
+    """The function making the Python function for the body of `closure`,
+    with its constants, compiling it the first time around. None if the
+    body can not be translated."""
+    body, params = closure.body, closure.params
+    entry = FACTORIES.get(id(body))
+    if entry is None or entry[0] is not body or entry[1] is not params:
+        result = None
+        if can_transpile(closure):
+            translator = Translator(params)
+            try:
+                source = translator.translate(body)
+                namespace = dict(RUNTIME)
+                exec(compile(source, "<transpiled>", "exec", 0, True), namespace)
+                result = namespace["make"], translator.constants
+            except (RuntimeError, SyntaxError, MemoryError):
+                # too deeply nested to be translated, or compiled
+                pass
+        if len(FACTORIES) >= MAX_FACTORIES:
+            FACTORIES.clear()
+        entry = FACTORIES[id(body)] = (body, params, result)
+    return entry[2]
+
+
+def python_function(closure, target):
+    """A Python function running the body of `closure`, as the body of the
+    closure `target`: calls to `target` from the body call the function
+    itself. None if the body can not be translated."""
+    made = factory(closure)
+    if made is None:
+        return None
+    make, constants = made
+    return make(closure.env, constants, target)
+
+
+def transpile(closure):
+    if not is_closure(closure):
+        raise LispError("transpile: not a function: %s" % unparse(closure))
+    if is_transpiled(closure):
+        return closure
+
+    transpiled = Closure(closure.env, closure.params, None)
+    function = python_function(closure, transpiled)
+    if function is None:
+        return closure
+    transpiled.body = [TRANSPILED, function, closure]
+    transpiled.python = function
+    return transpiled
+
+
+def is_transpiled(closure):
+    body = closure.body
+    return is_list(body) and len(body) == 3 and body[0] is TRANSPILED
+
+
+def eval_transpiled(ast, env):
+    """The body of a transpiled closure, run with its parameters bound. A
+    tail call it ends with to a closure which is not transpiled is evaluated
+    next."""
+    assert_exp_length(ast, 3)
+    function, closure = ast[1], ast[2]
+    value = run_tail_calls(function.step(*bound_values(env, closure.params)))
+    if type(value) is TailCall:
+        return value.closure.body, bind(value.closure, value.values)
+    return [QUOTE, value], env
+
+
+register_special_form(TRANSPILED, eval_transpiled, tail=True)
+register_procedure(TRANSPILE, transpile)
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+from array import array
+from itertools import islice
+
 """
 This module holds some types we'll have use for along the way.
 
@@ -13,35 +16,426 @@ class LispError(Exception):
     pass
 
 
-class Closure:
+class Symbol(str):
+    """Symbols are interned, so there is only ever one Symbol object for each
+    name. Symbols can therefore be compared by identity, and ASTs with many
+    references to the same name share a single object for it.
+
+    Being strings, Symbols compare equal to (and hash like) plain strings with
+    the same name. Hand-written ASTs using plain strings thus keep working."""
+
+    __slots__ = ()
+    table = {}
+
+    def __new__(cls, name):
+        symbol = cls.table.get(name)
+        if symbol is None:
+            symbol = cls.table[name] = str.__new__(cls, name)
+        return symbol
+
+    def __reduce__(self):
+        return (Symbol, (str(self),))
+
+
+class LispList(object):
+    """Base of the immutable list values made by `cons` and `tail`.
+
+    Lists read from the source of a program are plain Python lists. `cons`
+    makes a `Cons` cell pointing to the list it extends, and `tail` of a
+    Python list is a `ListSlice` viewing the rest of it. Both take constant
+    time, and share structure with the lists they are made from. A `Stream`
+    is a list whose elements are only computed when needed.
+
+    These compare equal to Python lists with equal elements, so lists of
+    either kind can be used interchangeably."""
+
+    __slots__ = ()
+    __hash__ = None
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, LispList)):
+            return NotImplemented
+        others = iter(other)
+        for item in self:
+            if item != next(others, END):
+                return False
+        return next(others, END) is END
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+# marks the end of iteration in `LispList.__eq__`
+END = object()
+
+
+class Cons(LispList):
+    """A list made of a first element, and the rest of the list."""
+
+    __slots__ = ("first", "rest")
+
+    def __init__(self, first, rest):
+        self.first = first
+        self.rest = rest
+
+    def __iter__(self):
+        return iterate([self])
+
+    def __nonzero__(self):
+        return True
+    __bool__ = __nonzero__
+
+    def head(self):
+        return self.first
+
+    def tail(self):
+        return self.rest
+
+
+class ListSlice(LispList):
+    """The elements of a Python list from position `start` on."""
+
+    __slots__ = ("items", "start")
+
+    def __init__(self, items, start):
+        self.items = items
+        self.start = start
+
+    def __iter__(self):
+        return islice(self.items, self.start, None)
+
+    def __len__(self):
+        return max(len(self.items) - self.start, 0)
+
+    def __nonzero__(self):
+        return self.start < len(self.items)
+    __bool__ = __nonzero__
+
+    def head(self):
+        return self.items[self.start]
+
+    def tail(self):
+        return list_tail(self.items, self.start + 1)
+
+
+class Stream(LispList):
+    """A lazy list. Its first element and the rest of the list are computed
+    by calling `producer` the first time either is needed, which returns
+    them as a pair, or an empty tuple if the stream is empty. The rest is
+    usually another stream.
+
+    Elements are thus computed one at a time, as the stream is walked with
+    `head` and `tail`, and those that have been walked past can be garbage
+    collected. Streams may be infinite, and then must not be compared,
+    measured or iterated over to the end."""
+
+    __slots__ = ("producer", "cell")
+
+    def __init__(self, producer):
+        self.producer = producer
+        self.cell = None
+
+    def realize(self):
+        """The pair of the first element and the rest, or `()` if empty."""
+        if self.producer is not None:
+            self.cell = self.producer()
+            self.producer = None
+        return self.cell
+
+    def __iter__(self):
+        return iterate([self])
+
+    def __nonzero__(self):
+        return bool(self.realize())
+    __bool__ = __nonzero__
+
+    def __repr__(self):
+        return "<stream>"
+
+    def head(self):
+        return self.realize()[0]
+
+    def tail(self):
+        cell = self.realize()
+        return cell[1] if cell else []
+
+
+def stream(iterable):
+    """A stream of the items of `iterable`, taken from it one at a time."""
+    iterator = iter(iterable)
+
+    def produce():
+        for item in iterator:
+            return item, stream(iterator)
+        return ()
+    return Stream(produce)
+
+
+def iterate(box):
+    """Iterate over the elements of the `Cons` or `Stream` in the list `box`.
+    It is taken out of the box, so the iterator does not keep the elements
+    it has passed alive, which matters for long streams."""
+    lst = box.pop()
+    while True:
+        kind = type(lst)
+        if kind is Cons:
+            yield lst.first
+            lst = lst.rest
+        elif kind is Stream:
+            cell = lst.realize()
+            if not cell:
+                return
+            item, lst = cell
+            yield item
+        else:
+            break
+    for item in lst:
+        yield item
+
+
+def list_tail(items, start):
+    """The elements of the Python list `items` from `start` on."""
+    if start >= len(items):
+        return []
+    return ListSlice(items, start)
+
+
+def make_vector(values):
+    """A vector holding the integers `values`. Vectors are `array`s of C
+    longs, so their elements take no more room than in C, and operations
+    on whole vectors run in C rather than evaluating lisp code per element."""
+    try:
+        return array('l', values)
+    except (TypeError, OverflowError) as e:
+        raise LispError("vector elements must be integers in range: %s" % e)
+
+
+class Promise(object):
+    """An expression to be evaluated later, made by `delay`. The value is
+    remembered once it has been computed by `force`."""
+
+    __slots__ = ("ast", "env", "forced", "value")
+
+    def __init__(self, ast, env):
+        self.ast = ast
+        self.env = env
+        self.forced = False
+        self.value = None
+
+    def __repr__(self):
+        return "<promise>"
+
+
+class Closure(object):
+    __slots__ = ("env", "params", "body", "compiled", "code", "python", "calls", "loops",
+                 "name")
+
     def __init__(self, env, params, body):
         self.env = env
         self.params = params
         self.body = body
+        # the body compiled by `diylisp.compiler` and `diylisp.bytecode`,
+        # once needed
+        self.compiled = None
+        self.code = None
+        # the body as a Python function, made by `diylisp.transpiler`
+        self.python = None
+        # the numbers of calls and of tail calls from the body to itself,
+        # counted while a tiering policy is installed
+        self.calls = 0
+        self.loops = 0
+        # the name it was first defined with, if any
+        self.name = None
 
     def __repr__(self):
         return "<closure/%d>" % len(self.params)
 
 
-class Environment:
-    def __init__(self, variables=None):
+class TailCall(object):
+    """A call of `closure` with `values`, made in tail position by a function
+    transpiled into Python, and returned for its caller to make. See the
+    `transpiler` module."""
+
+    __slots__ = ("closure", "values")
+
+    def __init__(self, closure, values):
+        self.closure = closure
+        self.values = values
+
+    def __repr__(self):
+        return "<tail call %r>" % self.closure
+
+
+class Builtin(object):
+    """A builtin procedure, like `+`, as a value. Builtins can be passed to
+    and called by lisp functions just like closures. `function` is called
+    with the argument values as positional arguments."""
+
+    __slots__ = ("name", "function")
+
+    def __init__(self, name, function):
+        self.name = name
+        self.function = function
+
+    def __repr__(self):
+        return "<builtin %s>" % self.name
+
+
+# The value of variables not bound in a frame, see `Environment.local`.
+MISSING = object()
+
+
+class Environment(object):
+    """A frame of variable bindings, chained to the environment it extends.
+
+    Each frame only holds its own bindings, so extending an environment (as
+    done on every function call) does not depend on the number of bindings
+    already visible. Lookups walk the chain of frames, which is only as long
+    as the lexical nesting of the code.
+
+    `Environment.version` is increased whenever a variable is defined in any
+    environment. A value looked up while the version is unchanged is still
+    what a new lookup would give, so it may be cached.
+
+    Names not bound in any frame are looked up in `Environment.builtins`,
+    which holds the builtin procedures shared by all environments."""
+
+    __slots__ = ("variables", "parent")
+    version = 0
+    builtins = {}
+
+    def __init__(self, variables=None, parent=None):
         self.variables = variables if variables else {}
+        self.parent = parent
 
     def __repr__(self):
         return "<env %x /%d>" % (id(self), len(self.variables))
 
     def lookup(self, symbol):
-        if symbol not in self.variables:
+        env = self
+        while type(env) is Environment:
+            variables = env.variables
+            if symbol in variables:
+                return variables[symbol]
+            env = env.parent
+        if env is not None:
+            # a `Frame`, which looks up its own bindings
+            return env.lookup(symbol)
+        value = Environment.builtins.get(symbol)
+        if value is None:
             raise LispError("symbol not defined: %s" % symbol)
-        return self.variables[symbol]
+        return value
+
+    def local(self, symbol):
+        """The value of `symbol` in this frame alone, or `MISSING`."""
+        return self.variables.get(symbol, MISSING)
 
     def extend(self, variables):
-        var = {}
-        var.update(self.variables)
-        var.update(variables)
-        return Environment(var)
+        return Environment(variables, self)
 
     def set(self, symbol, value):
-        if symbol in self.variables:
-            raise LispError("already defined: %s" % symbol)
+        self.check_undefined(symbol)
         self.variables[symbol] = value
+        Environment.version += 1
+        name_closure(value, symbol)
+
+    def check_undefined(self, symbol):
+        env = self
+        while env is not None:
+            if env.local(symbol) is not MISSING:
+                raise LispError("already defined: %s" % symbol)
+            env = env.parent
+
+    def capture(self, symbols):
+        """An environment for a closure defined in this one, which only refers
+        to the variables `symbols`: a single frame holding their current
+        values, extending the outermost environment.
+
+        Copying the values is safe, as variables can not be redefined. The
+        outermost environment is kept itself, so later definitions in it are
+        seen. If some symbol is not bound yet, it may still be defined in any
+        of the frames, and this environment is returned as it is. This holds
+        for the names of builtins too, which a frame may define as well."""
+        variables = {}
+        env = self
+        while env.parent is not None:
+            for symbol in symbols:
+                if symbol not in variables:
+                    value = env.local(symbol)
+                    if value is not MISSING:
+                        variables[symbol] = value
+            env = env.parent
+
+        for symbol in symbols:
+            if symbol not in variables and env.local(symbol) is MISSING:
+                return self
+        return Environment(variables, env) if variables else env
+
+
+class Frame(Environment):
+    """The environment of a function call made by compiled code.
+
+    The arguments are kept in a list, in the order of the parameters, and
+    compiled code accesses them by position (see `diylisp.compiler`). The
+    parameter names are only used when a frame is accessed by name, like
+    any other `Environment`. Variables defined in the body of the function
+    are kept in `defined`, a dict created on the first definition."""
+
+    __slots__ = ("params", "values", "defined")
+
+    def __init__(self, params, values, parent):
+        self.params = params
+        self.values = values
+        self.parent = parent
+        self.defined = None
+
+    @property
+    def variables(self):
+        """The bindings of the frame, as a new dict. Lookups do without."""
+        variables = dict(zip(self.params, self.values))
+        if self.defined:
+            variables.update(self.defined)
+        return variables
+
+    def lookup(self, symbol):
+        env = self
+        while type(env) is Frame:
+            defined = env.defined
+            if defined and symbol in defined:
+                return defined[symbol]
+            params = env.params
+            if symbol in params:
+                return env.values[params.index(symbol)]
+            env = env.parent
+        return env.lookup(symbol)
+
+    def local(self, symbol):
+        defined = self.defined
+        if defined and symbol in defined:
+            return defined[symbol]
+        params = self.params
+        if symbol in params:
+            return self.values[params.index(symbol)]
+        return MISSING
+
+    def set(self, symbol, value):
+        self.check_undefined(symbol)
+        if self.defined is None:
+            self.defined = {}
+        self.defined[symbol] = value
+        Environment.version += 1
+        name_closure(value, symbol)
+
+
+def name_closure(value, symbol):
+    """Name a closure after the variable it is defined as, unless it has
+    been named before."""
+    if type(value) is Closure and value.name is None:
+        value.name = symbol
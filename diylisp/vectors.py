@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+from .types import LispError, make_vector
+from .ast import is_integer, is_boolean, is_vector, is_list_value, is_builtin
+from .parser import unparse
+from .evaluator import register_procedure, check_builtin_args, call
+
+"""
+Vectors of integers, for bulk numeric work.
+
+A vector is written like `[1 2 3]`, and evaluates to itself. The arithmetic
+builtins and comparisons work on each element when given vectors, so
+`(* [1 2 3] [4 5 6])` is `[4 10 18]`, `(+ [1 2 3] 1)` is `[2 3 4]`, and
+`(< [1 2 3] 2)` is `[1 0 0]`.
+
+The procedures below are builtin values, like `+`:
+
+    (vector 1 2 3)          a vector of the arguments
+    (list->vector lst)      a vector of the elements of a list of integers
+    (vector->list v)        a list of the elements of a vector
+    (vlength v)             the number of elements
+    (vref v i)              the element at index `i`, counting from 0
+    (vslice v start end)    the elements from index `start` up to `end`
+    (vsum v)                the sum of the elements
+    (vmap f v)              a vector of `(f x)` for each element `x` of `v`
+    (vmap f v w)            a vector of `(f x y)` for each pair of elements
+
+The elements of vectors are kept in an `array` of C longs (see
+`make_vector`), and these operations run in C or Python per element, never
+evaluating lisp code per element, unless `vmap` is given a lisp function.
+"""
+
+
+def check_vector(value, name):
+    if not is_vector(value):
+        raise LispError("%s: not a vector: %s" % (name, unparse(value)))
+
+
+def check_index(value, name):
+    if not is_integer(value) or is_boolean(value):
+        raise LispError("%s: index must be an integer: %s" % (name, unparse(value)))
+
+
+def vector(*values):
+    return make_vector(values)
+
+
+def list_to_vector(lst):
+    if not is_list_value(lst):
+        raise LispError("list->vector: not a list: %s" % unparse(lst))
+    return make_vector(lst)
+
+
+def vector_to_list(v):
+    check_vector(v, "vector->list")
+    return v.tolist()
+
+
+def vlength(v):
+    check_vector(v, "vlength")
+    return len(v)
+
+
+def vref(v, index):
+    check_vector(v, "vref")
+    check_index(index, "vref")
+    if not 0 <= index < len(v):
+        raise LispError("vref: index out of range: %d" % index)
+    return v[index]
+
+
+def vslice(v, start, end):
+    check_vector(v, "vslice")
+    check_index(start, "vslice")
+    check_index(end, "vslice")
+    if not 0 <= start <= end <= len(v):
+        raise LispError("vslice: indices out of range: %d %d" % (start, end))
+    return v[start:end]
+
+
+def vsum(v):
+    check_vector(v, "vsum")
+    return sum(v)
+
+
+def vmap(function, v, other=None):
+    check_vector(v, "vmap")
+    vectors = [v]
+    if other is not None:
+        check_vector(other, "vmap")
+        if len(other) != len(v):
+            raise LispError("vmap: vectors of different lengths: %d and %d"
+                            % (len(v), len(other)))
+        vectors.append(other)
+
+    if is_builtin(function):
+        check_builtin_args(function, len(vectors))
+        return make_vector(map(function.function, *vectors))
+    return make_vector(map(lambda *values: call(function, list(values), "vmap"), *vectors))
+
+
+for name, function in [("vector", vector),
+                       ("list->vector", list_to_vector),
+                       ("vector->list", vector_to_list),
+                       ("vlength", vlength),
+                       ("vref", vref),
+                       ("vslice", vslice),
+                       ("vsum", vsum),
+                       ("vmap", vmap)]:
+    register_procedure(name, function)
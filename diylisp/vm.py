@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+from .types import LispError, Closure, Builtin
+from .ast import is_atom, is_closure
+from .parser import unparse
+from .bytecode import compile_ast, compile_body, CONST, LOOKUP, CALL, \
+    TAIL_CALL, CHECK_CALL, BUILTIN, JUMP_IF_FALSE, JUMP, RETURN, ATOM_P, EQ_P, \
+    CONS_P, HEAD_P, TAIL_P, EMPTY_P, DEFINE_SYM, MAKE_CLOSURE, FAIL, EVAL_LIST, \
+    BUILTIN_N, UNCHANGED
+from .evaluator import eval_list, apply_eq, apply_builtin, apply_builtins, apply_cons, \
+    apply_head, apply_tail, apply_empty, check_arity, check_builtin_args, bind
+
+"""
+A stack based virtual machine running the bytecode from `bytecode.py`.
+
+Intermediate values are kept on an explicit value stack, and function calls
+push a frame (the code, instruction index and environment to return to) on an
+explicit frame stack. Running a program thus never recurses in Python, and
+calls in tail position reuse the frame of the caller.
+
+The bytecode for the body of a function is stored on its `Closure` the first
+time the function is called by the VM.
+"""
+
+
+def execute(ast, env):
+    """Evaluate an AST by compiling it to bytecode, and running it."""
+    return run(compile_ast(ast), env)
+
+
+def closure_code(closure):
+    code = closure.code
+    if code is None:
+        code = closure.code = compile_body(closure.body)
+    return code
+
+
+def run(code, env):
+    """Run a code object in the given environment, returning the result."""
+    stack = []
+    frames = []
+    ops = code.ops
+    consts = code.consts
+    pc = 0
+
+    while True:
+        op = ops[pc]
+        arg = ops[pc + 1]
+        pc += 2
+
+        if op == LOOKUP:
+            stack.append(env.lookup(consts[arg]))
+
+        elif op == CONST:
+            stack.append(consts[arg])
+
+        elif op == BUILTIN:
+            b = stack.pop()
+            stack[-1] = apply_builtin(consts[arg], stack[-1], b)
+
+        elif op == JUMP_IF_FALSE:
+            if not stack.pop():
+                pc = arg
+
+        elif op == JUMP:
+            pc = arg
+
+        elif op == CHECK_CALL:
+            closure = stack[-1]
+            nargs, callee = consts[arg]
+            if type(closure) is Builtin:
+                check_builtin_args(closure, nargs)
+            elif not is_closure(closure):
+                raise LispError("Can't call: %s" % unparse(closure if callee is None else callee))
+            else:
+                check_arity(closure, nargs)
+
+        elif op == CALL or op == TAIL_CALL:
+            if arg:
+                values = stack[-arg:]
+                del stack[-arg:]
+            else:
+                values = []
+            closure = stack.pop()
+            if type(closure) is Builtin:
+                stack.append(closure.function(*values))
+                if op == CALL:
+                    continue
+                # the caller returns the value right away
+                if not frames:
+                    return stack.pop()
+                code, pc, env = frames.pop()
+                ops = code.ops
+                consts = code.consts
+                continue
+            if op == CALL:
+                frames.append((code, pc, env))
+            code = closure.code or closure_code(closure)
+            ops = code.ops
+            consts = code.consts
+            pc = 0
+            env = bind(closure, values)
+
+        elif op == RETURN:
+            if not frames:
+                return stack.pop()
+            code, pc, env = frames.pop()
+            ops = code.ops
+            consts = code.consts
+
+        elif op == HEAD_P:
+            stack[-1] = apply_head(stack[-1])
+
+        elif op == TAIL_P:
+            stack[-1] = apply_tail(stack[-1])
+
+        elif op == EMPTY_P:
+            stack[-1] = apply_empty(stack[-1])
+
+        elif op == CONS_P:
+            lst = stack.pop()
+            stack[-1] = apply_cons(stack[-1], lst)
+
+        elif op == EQ_P:
+            b = stack.pop()
+            stack[-1] = apply_eq(stack[-1], b)
+
+        elif op == ATOM_P:
+            stack[-1] = is_atom(stack[-1])
+
+        elif op == DEFINE_SYM:
+            env.set(consts[arg], stack[-1])
+
+        elif op == MAKE_CLOSURE:
+            function = consts[arg]
+            closure = Closure(env.capture(function.free), function.params, function.body)
+            closure.code = function.code
+            stack.append(closure)
+
+        elif op == FAIL:
+            raise consts[arg]
+
+        elif op == BUILTIN_N:
+            name, nargs = consts[arg]
+            values = stack[-nargs:]
+            del stack[-nargs:]
+            stack.append(apply_builtins(name, values))
+
+        elif op == EVAL_LIST:
+            stack.append(eval_list(consts[arg], env))
+
+        elif op == UNCHANGED:
+            name, closure = consts[arg]
+            try:
+                stack.append(env.lookup(name) is closure)
+            except LispError:
+                stack.append(False)
+
+        else:
+            raise LispError("Unknown opcode: %d" % op)
@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
 
-from nose.tools import assert_equals, assert_raises_regexp
+from nose.tools import assert_equals, assert_raises_regexp, assert_true, \
+    assert_is_instance
 
 from diylisp.parser import parse, unparse
-from diylisp.types import LispError
+from diylisp.types import LispError, Symbol
 
 
 def test_parse_single_symbol():
@@ -15,6 +16,17 @@ def test_parse_single_symbol():
     assert_equals('foo', parse('foo'))
 
 
+def test_parse_symbols_are_interned():
+    """Symbols are parsed to interned `Symbol` objects.
+
+    There is only one object for each name, no matter where it was parsed."""
+
+    ast = parse('(foo (foo bar))')
+    assert_is_instance(ast[0], Symbol)
+    assert_true(ast[0] is ast[1][0])
+    assert_true(parse('bar') is ast[1][1])
+
+
 def test_parse_boolean():
     """Parsing single booleans.
 
@@ -160,3 +172,13 @@ def test_expand_crazy_quote_combo():
 
     source = "'(this ''''(makes ''no) 'sense)"
     assert_equals(source, unparse(parse(source)))
+
+
+def test_parse_deeply_nested_list():
+    """Nesting depth should not be limited by Python's recursion limit."""
+
+    depth = 10000
+    ast = parse("(" * depth + "foo" + ")" * depth)
+    for _ in range(depth):
+        ast = ast[0]
+    assert_equals("foo", ast)
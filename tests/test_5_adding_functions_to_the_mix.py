@@ -255,3 +255,22 @@ def test_calling_function_recursively():
 
     assert_equals(42, evaluate(parse("(my-fn 0)"), env))
     assert_equals(42, evaluate(parse("(my-fn 10)"), env))
+
+
+def test_tail_calls_run_in_constant_stack_space():
+    """Calls in tail position should not grow the Python stack.
+
+    Both the branches of an `if` and the body of a function are in tail
+    position, so this loop should be able to run for many more iterations
+    than Python's recursion limit."""
+
+    env = Environment()
+    evaluate(parse("""
+        (define count-down
+            (lambda (n acc)
+                (if (eq n 0)
+                    acc
+                    (count-down (- n 1) (+ acc 1)))))
+    """), env)
+
+    assert_equals(3000, evaluate(parse("(count-down 3000 0)"), env))
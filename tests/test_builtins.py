@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import assert_equals, assert_raises_regexp, assert_true
+from os.path import dirname, relpath, join
+
+from diylisp.interpreter import interpret_file, ENGINES
+from diylisp.parser import parse, unparse
+from diylisp.types import LispError, Environment, Builtin
+
+"""
+Tests for builtins taking any number of arguments, and for builtins used as
+values, in each of the evaluation engines.
+"""
+
+path = join(dirname(relpath(__file__)), '..', 'stdlib.diy')
+
+
+def run(engine, source, env=None):
+    return unparse(engine(parse(source), env if env is not None else Environment()))
+
+
+def test_variadic_builtins():
+    for name, engine in ENGINES.items():
+        assert_equals("10", run(engine, "(+ 1 2 3 4)"))
+        assert_equals("24", run(engine, "(* 1 2 3 4)"))
+        assert_equals("4", run(engine, "(- 10 1 2 3)"))
+        assert_equals("2", run(engine, "(/ 100 5 10)"))
+        assert_equals("5", run(engine, "(+ 5)"))
+        assert_equals("-5", run(engine, "(- 5)"))
+        assert_equals("#t", run(engine, "(< 1 2 3)"))
+        assert_equals("#f", run(engine, "(< 1 3 2)"))
+        assert_equals("#t", run(engine, "(> 3 2 1)"))
+
+
+def test_variadic_builtin_errors():
+    for name, engine in ENGINES.items():
+        with assert_raises_regexp(LispError, "too few arguments"):
+            run(engine, "(+)")
+        with assert_raises_regexp(LispError, "too few arguments"):
+            run(engine, "(< 1)")
+        with assert_raises_regexp(LispError, "too many arguments"):
+            run(engine, "(mod 7 2 1)")
+        with assert_raises_regexp(LispError, "can only use integers"):
+            run(engine, "(< 1 2 #t 'x)")
+
+
+def test_builtins_are_values():
+    for name, engine in ENGINES.items():
+        value = engine(parse("+"), Environment())
+        assert_true(isinstance(value, Builtin))
+        assert_equals("<builtin +>", unparse(value))
+        assert_equals("#t", run(engine, "(atom <)"))
+        assert_equals("#t", run(engine, "(eq * *)"))
+
+
+def test_calling_builtin_values():
+    for name, engine in ENGINES.items():
+        env = Environment()
+        engine(parse("(define apply-to (lambda (f a b c) (f a b c)))"), env)
+        engine(parse("(define twice (lambda (f x) (f x x)))"), env)
+        assert_equals("6", run(engine, "(apply-to + 1 2 3)", env))
+        assert_equals("#f", run(engine, "(apply-to < 1 3 2)", env))
+        assert_equals("9", run(engine, "(twice * 3)", env))
+        assert_equals("6", run(engine, "((if #t + -) 1 2 3)", env))
+        assert_equals("-5", run(engine, "((lambda (f) (f 5)) -)", env))
+        assert_equals("#t", run(engine, "((lambda (f) (f (+ 1 1) 3)) <)", env))
+
+
+def test_calling_builtin_values_with_wrong_arguments():
+    for name, engine in ENGINES.items():
+        env = Environment()
+        engine(parse("(define call (lambda (f) (f 1 2 3)))"), env)
+        with assert_raises_regexp(LispError, "mod: wrong number of arguments: 3"):
+            run(engine, "(call mod)", env)
+        with assert_raises_regexp(LispError, "<: wrong number of arguments: 1"):
+            run(engine, "((lambda (f) (f 1)) <)", env)
+        with assert_raises_regexp(LispError, "can only use integers"):
+            run(engine, "((lambda (f) (f 1 #t '())) +)", env)
+
+
+def test_builtins_with_stdlib():
+    env = Environment()
+    interpret_file(path, env)
+    for name, engine in ENGINES.items():
+        assert_equals("(-1 -2 -3)", run(engine, "(map - '(1 2 3))", env))
+        assert_equals("(9 3 18 2)", run(engine, "(map (lambda (f) (f 6 3)) (cons + (cons - (cons * (cons / '())))))", env))
+
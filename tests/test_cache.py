@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import threading
+from os.path import join, exists
+
+from nose.tools import assert_equals, assert_true, assert_raises_regexp
+
+from diylisp import cache
+from diylisp.interpreter import interpret_file
+from diylisp.parser import parse_file
+from diylisp.types import LispError, Environment, Symbol
+
+"""
+Tests for the on-disk cache of parsed lisp files.
+"""
+
+
+def with_tmpdir(test):
+    def wrapper():
+        tmp = tempfile.mkdtemp()
+        try:
+            test(tmp)
+        finally:
+            shutil.rmtree(tmp)
+    wrapper.__name__ = test.__name__
+    return wrapper
+
+
+def write(filename, source):
+    with open(filename, "w") as f:
+        f.write(source)
+
+
+@with_tmpdir
+def test_parsed_file_is_cached(tmp):
+    filename = join(tmp, "program.diy")
+    write(filename, "(define x 42)\n'(a b)")
+
+    assert_equals([["define", "x", 42], ["quote", ["a", "b"]]], list(parse_file(filename)))
+    assert_true(exists(join(tmp, "__diycache__", "program.diyc")))
+    assert_equals([["define", "x", 42], ["quote", ["a", "b"]]], list(parse_file(filename)))
+
+
+@with_tmpdir
+def test_cached_symbols_are_interned(tmp):
+    filename = join(tmp, "program.diy")
+    write(filename, "(foo (bar foo))")
+    list(parse_file(filename))
+
+    ast, = parse_file(filename)
+    assert_true(ast[0] is Symbol("foo"))
+    assert_true(ast[1][1] is Symbol("foo"))
+
+
+@with_tmpdir
+def test_cached_vectors(tmp):
+    filename = join(tmp, "program.diy")
+    write(filename, "[1 2]\n(vsum [3 4])\n'(a [])")
+    expected = list(parse_file(filename))
+    assert_true(exists(join(tmp, "__diycache__", "program.diyc")))
+
+    cached = list(parse_file(filename))
+    assert_equals(expected, cached)
+    assert_equals("array", type(cached[1][1]).__name__)
+
+
+@with_tmpdir
+def test_nested_vectors_are_cached(tmp):
+    filename = join(tmp, "program.diy")
+    depth = 1500
+    write(filename, "'" + "(" * depth + "[1 2]" + ")" * depth)
+    ast, = parse_file(filename)
+    assert_true(exists(join(tmp, "__diycache__", "program.diyc")))
+
+    cached, = parse_file(filename)
+    for _ in range(depth + 1):
+        ast, cached = ast[-1], cached[-1]
+    assert_equals("array", type(cached).__name__)
+    assert_equals(list(ast), list(cached))
+
+
+@with_tmpdir
+def test_deeply_nested_file_is_parsed_uncached(tmp):
+    filename = join(tmp, "program.diy")
+    depth = 3000
+    write(filename, "'" + "(" * depth + "x" + ")" * depth + "\n(define x 1)")
+
+    asts = list(parse_file(filename))
+    assert_equals(2, len(asts))
+    assert_equals([], os.listdir(join(tmp, "__diycache__")))
+    assert_equals(2, len(list(parse_file(filename))))
+    env = Environment()
+    interpret_file(filename, env)
+    assert_equals(1, env.lookup("x"))
+
+
+@with_tmpdir
+def test_pipe_is_parsed_uncached(tmp):
+    filename = join(tmp, "pipe")
+    os.mkfifo(filename)
+    writer = threading.Thread(target=write, args=(filename, "(define x 1)\n(+ x 2)"))
+    writer.start()
+    try:
+        assert_equals("3", interpret_file(filename, Environment()))
+    finally:
+        writer.join()
+    assert_true(not exists(join(tmp, "__diycache__")))
+
+
+@with_tmpdir
+def test_stale_cache_entry_is_not_used(tmp):
+    filename = join(tmp, "program.diy")
+    write(filename, "(+ 1 2)")
+    assert_equals("3", interpret_file(filename))
+
+    write(filename, "(+ 2 2)")
+    assert_equals("4", interpret_file(filename))
+
+
+@with_tmpdir
+def test_truncated_cache_entry_is_not_used(tmp):
+    filename = join(tmp, "program.diy")
+    write(filename, "(define x 1)\n(define y 2)\n(+ x y)")
+    expected = list(parse_file(filename))
+    entry = join(tmp, "__diycache__", "program.diyc")
+
+    for cut in [4, 20]:
+        with open(entry, "rb") as f:
+            data = f.read()
+        with open(entry, "wb") as f:
+            f.write(data[:-cut])
+        assert_equals(expected, list(parse_file(filename)))
+        with open(entry, "rb") as f:
+            assert_equals(data, f.read())
+        assert_equals(expected, list(parse_file(filename)))
+
+
+@with_tmpdir
+def test_incompletely_read_file_is_not_cached(tmp):
+    filename = join(tmp, "program.diy")
+    write(filename, "(define x 1) (undefined-fn) (define y 2)")
+
+    with assert_raises_regexp(LispError, "undefined-fn"):
+        interpret_file(filename, Environment())
+    assert_equals([], os.listdir(join(tmp, "__diycache__")))
+
+
+@with_tmpdir
+def test_cache_directory(tmp):
+    filename = join(tmp, "program.diy")
+    write(filename, "(+ 1 2)")
+
+    cache.cache_dir = join(tmp, "cache")
+    try:
+        assert_equals("3", interpret_file(filename))
+        assert_equals("3", interpret_file(filename))
+    finally:
+        cache.cache_dir = None
+    assert_equals(1, len(os.listdir(join(tmp, "cache"))))
+    assert_true(not exists(join(tmp, "__diycache__")))
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import assert_equals, assert_is, assert_raises_regexp
+
+from diylisp.evaluator import free_variables
+from diylisp.interpreter import ENGINES
+from diylisp.parser import parse, unparse
+from diylisp.types import LispError, Environment
+
+"""
+Tests for closures capturing only the variables they use from the
+environment they are defined in.
+"""
+
+CAPTURING_ENGINES = ["eval", "compile", "vm", "stackless"]
+
+
+def test_free_variables():
+    assert_equals(set(["y"]), free_variables(parse("(x)"), parse("(+ x y)")))
+    assert_equals(set(["f", "+"]), free_variables([], parse("(f +)")))
+    assert_equals(set(["f"]), free_variables([], parse("(if (f 'a) (quote b) 1)")))
+    assert_equals(set(["z"]), free_variables([], parse("(lambda (x) (lambda (y) (cons x z)))")))
+    assert_equals(set(["a", "x"]), free_variables([], parse("(define x (cons a x))")))
+    assert_equals(set(["y"]), free_variables([], parse("(define y 1)")))
+    assert_equals(set(), free_variables(parse("(x)"), parse("(lambda (x) x)")))
+
+
+def test_closures_capture_free_variables():
+    for name in CAPTURING_ENGINES:
+        env = Environment()
+        engine = ENGINES[name]
+        engine(parse("(define a 1)"), env)
+        engine(parse("(define make (lambda (x y) (lambda (z) (+ a x z))))"), env)
+        closure = engine(parse("(make 2 3)"), env)
+        assert_equals({"x": 2}, closure.env.variables, name)
+        assert_is(env, closure.env.parent, name)
+
+
+def test_closures_without_free_variables_keep_the_outermost_environment():
+    for name in CAPTURING_ENGINES:
+        env = Environment()
+        engine = ENGINES[name]
+        engine(parse("(define make (lambda (x) (lambda (y) (+ y 1))))"), env)
+        assert_is(env, engine(parse("(make 1)"), env).env, name)
+
+
+def test_closures_see_later_definitions():
+    for name, engine in ENGINES.items():
+        env = Environment()
+        engine(parse("(define make (lambda (x) (lambda () (later x))))"), env)
+        engine(parse("(define f (make 41))"), env)
+        engine(parse("(define later (lambda (n) (+ n 1)))"), env)
+        assert_equals(42, engine(parse("(f)"), env), name)
+
+
+def test_builtins_defined_later_in_an_enclosing_frame():
+    for name, engine in ENGINES.items():
+        env = Environment()
+        engine(parse("""
+            (define f
+                (lambda ()
+                    (cons (define g (lambda (v) (vsum v)))
+                          (cons (define vsum (lambda (v) 'local))
+                                (cons (g [1 2]) '())))))
+        """), env)
+        assert_equals("local", unparse(engine(parse("(head (tail (tail (f))))"), env)), name)
+
+
+def test_recursive_local_functions():
+    for name, engine in ENGINES.items():
+        env = Environment()
+        engine(parse("""
+            (define count-down
+                (lambda (n)
+                    ((lambda (loop) (loop n))
+                     (define loop (lambda (i) (if (eq i 0) 'done (loop (- i 1))))))))
+        """), env)
+        assert_equals("done", unparse(engine(parse("(count-down 5)"), env)), name)
+
+
+def test_captured_values():
+    for name, engine in ENGINES.items():
+        env = Environment()
+        engine(parse("(define compose (lambda (f g) (lambda (x) (f (g x)))))"), env)
+        engine(parse("(define add (lambda (n) (lambda (x) (+ x n))))"), env)
+        assert_equals(13, engine(parse("((compose (add 1) (add 2)) 10)"), env), name)
+        with assert_raises_regexp(LispError, "not defined: nowhere"):
+            engine(parse("(((lambda (x) (lambda () nowhere)) 1))"), env)
+
+
+def test_captured_variables_can_not_be_redefined():
+    for name, engine in ENGINES.items():
+        env = Environment()
+        engine(parse("(define f (lambda (x) (lambda () (define x 2))))"), env)
+        with assert_raises_regexp(LispError, "already defined: x"):
+            engine(parse("((f 1))"), env)
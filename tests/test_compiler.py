@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import assert_equals, assert_raises_regexp, assert_true
+
+from diylisp.compiler import execute, analyze, lookup_cache_info, reset_lookup_cache_info
+from diylisp.evaluator import evaluate, register_special_form, SPECIAL_FORMS
+from diylisp.parser import parse
+from diylisp.types import LispError, Environment, Frame
+
+"""
+Tests for the compiling evaluation engine. Compiled programs should give the
+same results, and raise the same errors, as when using `evaluate`.
+"""
+
+PROGRAM = """
+    (define fact
+        (lambda (n)
+            (if (eq n 0)
+                1
+                (* n (fact (- n 1))))))
+"""
+
+
+def test_recursive_function():
+    env = Environment()
+    execute(parse(PROGRAM), env)
+    assert_equals(120, execute(parse("(fact 5)"), env))
+
+
+def test_closure_body_is_compiled_once():
+    env = Environment()
+    execute(parse(PROGRAM), env)
+    fact = env.lookup("fact")
+    compiled = fact.compiled
+
+    execute(parse("(fact 10)"), env)
+    assert_true(compiled is not None)
+    assert_true(fact.compiled is compiled)
+
+
+def test_closures_from_evaluate_are_compiled_on_call():
+    env = Environment()
+    evaluate(parse(PROGRAM), env)
+    assert_equals(24, execute(parse("(fact 4)"), env))
+    assert_true(env.lookup("fact").compiled is not None)
+
+
+def test_errors_are_raised_when_run():
+    proc = analyze(parse("(if #t 42 (define x))"))
+    assert_equals(42, proc(Environment()))
+
+    with assert_raises_regexp(LispError, "Wrong number of arguments"):
+        execute(parse("(define x)"), Environment())
+    with assert_raises_regexp(LispError, "not a function"):
+        execute(parse("(#t 'foo 'bar)"), Environment())
+    with assert_raises_regexp(LispError, "Can't call"):
+        execute(parse("(x 1)"), Environment({"x": 1}))
+    with assert_raises_regexp(LispError, "wrong number of arguments, expected 2 got 3"):
+        execute(parse("((lambda (a b) a) 1 2 3)"), Environment())
+    with assert_raises_regexp(LispError, "can only use integers"):
+        execute(parse("(+ 1 'foo)"), Environment())
+
+
+def test_parameters_are_resolved_to_frame_positions():
+    env = Environment({"z": 100})
+    execute(parse("""
+        (define adder
+            (lambda (x y)
+                (lambda (a)
+                    (lambda (b) (+ (+ x y) (+ (+ a b) z))))))"""), env)
+    assert_equals(111, execute(parse("(((adder 1 2) 3) 5)"), env))
+    assert_equals(4, execute(parse("(((lambda (x) (lambda (x) (+ x x))) 1) 2)"), Environment()))
+
+
+def test_call_frames_hold_arguments_by_position():
+    frames = []
+
+    def capture(ast, env):
+        frames.append(env)
+        return True
+    register_special_form("capture", capture)
+    try:
+        execute(parse("((lambda (x y) (capture)) 1 2)"), Environment())
+    finally:
+        SPECIAL_FORMS.pop("capture")
+
+    frame, = frames
+    assert_true(isinstance(frame, Frame))
+    assert_equals([1, 2], frame.values)
+    assert_equals(2, frame.lookup("y"))
+
+
+def test_definitions_in_function_bodies():
+    env = Environment({"y": 1})
+    execute(parse("(define f (lambda (x) (if (define y2 (+ x y)) (+ y2 1) 0)))"), env)
+    assert_equals(4, execute(parse("(f 2)"), env))
+    with assert_raises_regexp(LispError, "already defined: x"):
+        execute(parse("((lambda (x) (define x 1)) 2)"), env)
+    with assert_raises_regexp(LispError, "already defined: y"):
+        execute(parse("((lambda (x) (define y 1)) 2)"), env)
+
+
+def test_global_lookups_are_cached():
+    env = Environment()
+    execute(parse(PROGRAM), env)
+    reset_lookup_cache_info()
+    execute(parse("(fact 10)"), env)
+
+    # `fact` is looked up once at the top, and 10 times in the body,
+    # where only the first of them misses
+    info = lookup_cache_info()
+    assert_equals(2, info["misses"])
+    assert_equals(9, info["hits"])
+    assert_equals(9 / 11.0, info["hit_rate"])
+
+
+def test_definitions_invalidate_cached_lookups():
+    env = Environment()
+    execute(parse("(define f (lambda () (g)))"), env)
+    with assert_raises_regexp(LispError, "symbol not defined: g"):
+        execute(parse("(f)"), env)
+
+    version = lookup_cache_info()["version"]
+    execute(parse("(define g (lambda () 42))"), env)
+    assert_true(lookup_cache_info()["version"] > version)
+    assert_equals(42, execute(parse("(f)"), env))
+
+    other = Environment()
+    execute(parse("(define g (lambda () 43))"), other)
+    assert_equals(43, execute(parse("((lambda () (g)))"), other))
+
+
+def test_tail_calls_run_in_constant_stack_space():
+    env = Environment()
+    execute(parse("""
+        (define count-down
+            (lambda (n acc)
+                (if (eq n 0) acc (count-down (- n 1) (+ acc 1)))))"""), env)
+    assert_equals(10000, execute(parse("(count-down 10000 0)"), env))
+
+    execute(parse("(define even? (lambda (n) (if (eq n 0) #t (odd? (- n 1)))))"), env)
+    execute(parse("(define odd? (lambda (n) (if (eq n 0) #f (even? (- n 1)))))"), env)
+    assert_equals(True, execute(parse("(even? 10000)"), env))
+    assert_equals(False, execute(parse("((lambda (n) (odd? n)) 10000)"), env))
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import assert_equals
+
+from diylisp.evaluator import evaluate
+from diylisp.interpreter import ENGINES
+from diylisp.parser import parse
+from diylisp.types import Environment
+
+"""
+Tests for the evaluation engines giving the same results as `evaluate`. The
+tests specific to each engine are in their own modules.
+"""
+
+PROGRAMS = [
+    ("(eq #f (> (- (+ 1 3) (* 2 (mod 7 4))) 4))", None),
+    ("(if (> 1 2) (- 1000 1) (+ 40 (- 3 1)))", None),
+    ("(if #f (this should not be evaluated) 42)", None),
+    ("'(1 2 (foo #t))", None),
+    ("(atom 'foo)", None),
+    ("(atom '(1 2))", None),
+    ("(eq 'foo 'foo)", None),
+    ("(eq '(1) '(1))", None),
+    ("(cons 3 (cons (- 4 2) (cons 1 '())))", None),
+    ("(head (tail '(1 2 3)))", None),
+    ("(empty (tail '(1)))", None),
+    ("((lambda () 42))", None),
+    ("((lambda (x) (+ x y)) 2)", {"y": 3}),
+    ("((if #f nope (lambda (x) (+ x y))) 2)", {"y": 3}),
+    ("(((lambda (x) (lambda (x) (+ x x))) 1) 2)", None),
+]
+
+
+def test_simple_expressions():
+    for source, env_vars in PROGRAMS:
+        expected = evaluate(parse(source), Environment(env_vars))
+        for name, engine in ENGINES.items():
+            assert_equals(expected, engine(parse(source), Environment(env_vars)),
+                          "%s: %s" % (name, source))
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import assert_equals, assert_raises_regexp, assert_is
+
+from diylisp.types import LispError, Environment, Frame
+
+"""
+Environments are chains of frames, each holding only its own bindings.
+"""
+
+
+def test_extend_does_not_copy_bindings():
+    env = Environment({"a": 1, "b": 2})
+    extended = env.extend({"c": 3})
+    assert_equals({"c": 3}, extended.variables)
+    assert_is(env, extended.parent)
+
+
+def test_lookup_through_frames():
+    env = Environment({"a": 1}).extend({"b": 2}).extend({"a": 3})
+    assert_equals(3, env.lookup("a"))
+    assert_equals(2, env.lookup("b"))
+    with assert_raises_regexp(LispError, "symbol not defined: c"):
+        env.lookup("c")
+
+
+def test_later_definitions_in_parent_are_visible():
+    env = Environment()
+    extended = env.extend({"x": 1})
+    env.set("y", 2)
+    assert_equals(2, extended.lookup("y"))
+
+
+def test_set_rejects_names_defined_in_any_frame():
+    env = Environment({"a": 1}).extend({"b": 2})
+    with assert_raises_regexp(LispError, "already defined: a"):
+        env.set("a", 3)
+    env.set("c", 3)
+    assert_equals(3, env.lookup("c"))
+
+
+def test_frames_mixed_with_environments():
+    outer = Environment({"a": 1})
+    frame = Frame(["b", "c"], [2, 3], outer)
+    env = Frame(["d"], [4], frame.extend({"e": 5}))
+    env.set("f", 6)
+    assert_equals([1, 2, 3, 4, 5, 6], [env.lookup(name) for name in "abcdef"])
+    with assert_raises_regexp(LispError, "symbol not defined: g"):
+        env.lookup("g")
+    with assert_raises_regexp(LispError, "already defined: c"):
+        env.set("c", 7)
+
+    captured = env.capture(["a", "c", "f"])
+    assert_equals({"c": 3, "f": 6}, captured.variables)
+    assert_is(outer, captured.parent)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import assert_equals, assert_true, assert_false, assert_raises_regexp
+
+from diylisp.evaluator import evaluate
+from diylisp.interpreter import interpret
+from diylisp.parser import parse, unparse
+from diylisp.types import LispError, Environment, Cons, ListSlice
+
+"""
+Tests for the list values made by `cons` and `tail`, which share structure
+with the lists they are made from instead of copying them.
+"""
+
+
+def test_cons_shares_the_list():
+    env = Environment()
+    evaluate(parse("(define a '(1 2 3))"), env)
+    b = evaluate(parse("(cons 0 a)"), env)
+    assert_true(isinstance(b, Cons))
+    assert_true(b.rest is env.lookup("a"))
+
+
+def test_tail_shares_the_list():
+    env = Environment()
+    evaluate(parse("(define a '(1 2 3))"), env)
+    b = evaluate(parse("(tail a)"), env)
+    assert_true(isinstance(b, ListSlice))
+    assert_true(b.items is env.lookup("a"))
+    assert_equals([], evaluate(parse("(tail (tail (tail a)))"), env))
+    assert_equals([], evaluate(parse("(tail '())"), env))
+
+
+def test_list_values_compare_like_python_lists():
+    value = evaluate(parse("(cons 1 (tail '(1 2 (3 4))))"), Environment())
+    assert_equals([1, 2, [3, 4]], value)
+    assert_equals(value, [1, 2, [3, 4]])
+    assert_false(value != [1, 2, [3, 4]])
+    assert_true(value != [1, 2, [3, 5]])
+    assert_true(value != [1, 2])
+    assert_true(value != [1, 2, [3, 4], 5])
+    assert_equals(3, len(value))
+
+
+def test_printing_list_values():
+    assert_equals("(1 2 (3 4))", interpret("(cons 1 (tail '(1 2 (3 4))))"))
+    assert_equals("(#t (a b))", interpret("(cons #t (cons (tail '(x a b)) '()))"))
+    assert_equals("'foo", interpret("(cons 'quote (cons 'foo '()))"))
+    assert_equals("(1 2)", unparse(Cons(1, Cons(2, []))))
+
+
+def test_list_operations():
+    assert_equals("3", interpret("(head (tail (tail (cons 1 '(2 3)))))"))
+    assert_equals("#t", interpret("(empty (tail (cons 1 '())))"))
+    assert_equals("#f", interpret("(empty (cons 1 '()))"))
+    assert_equals("#f", interpret("(atom (cons 1 '()))"))
+    with assert_raises_regexp(LispError, "head: empty list"):
+        interpret("(head (tail (tail '(1 2))))")
+    with assert_raises_regexp(LispError, "cons: not a list: 2"):
+        interpret("(cons 1 2)")
+
+
+def test_long_lists():
+    env = Environment()
+    interpret("""
+        (define build
+            (lambda (n acc)
+                (if (eq n 0) acc (build (- n 1) (cons n acc)))))""", env)
+    interpret("""
+        (define length
+            (lambda (lst acc)
+                (if (empty lst) acc (length (tail lst) (+ acc 1)))))""", env)
+    interpret("(define numbers (build 20000 '()))", env)
+    assert_equals("20000", interpret("(length numbers 0)", env))
+    assert_equals("20000", interpret("(length (tail (cons 0 numbers)) 0)", env))
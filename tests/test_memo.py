@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import assert_equals, assert_raises_regexp
+
+from diylisp.interpreter import interpret, ENGINES
+from diylisp.memo import memo_info
+from diylisp.parser import parse
+from diylisp.types import LispError, Environment
+
+"""
+Tests for memoized functions.
+"""
+
+FIB = """
+    (define fib
+        (memoize
+            (lambda (n)
+                (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))))
+"""
+
+
+def test_memoized_recursion():
+    for name, engine in ENGINES.items():
+        env = Environment()
+        engine(parse(FIB), env)
+        assert_equals(832040, engine(parse("(fib 30)"), env))
+
+        info = memo_info(env.lookup("fib"))
+        assert_equals(31, info["misses"])
+        assert_equals(28, info["hits"])
+        assert_equals(31, info["size"])
+
+
+def test_least_recently_used_results_are_dropped():
+    env = Environment()
+    interpret("(define sq (memoize (lambda (x) (* x x)) 2))", env)
+    sq = env.lookup("sq")
+    for x in [1, 2, 1, 3, 1, 2]:
+        interpret("(sq %d)" % x, env)
+
+    # 2 was dropped when 3 came in, as 1 was used more recently
+    info = memo_info(sq)
+    assert_equals(2, info["size"])
+    assert_equals(2, info["max_size"])
+    assert_equals(2, info["hits"])
+    assert_equals(4, info["misses"])
+
+
+def test_list_arguments():
+    env = Environment()
+    interpret("""
+        (define len
+            (memoize
+                (lambda (lst)
+                    (if (empty lst) 0 (+ 1 (len (tail lst)))))))""", env)
+    assert_equals("3", interpret("(len '(1 (2 3) #t))", env))
+    assert_equals("3", interpret("(len '(7 (2 3) #t))", env))
+    assert_equals("3", interpret("(len '(1 (2 3) 1))", env))
+
+    # the tails '((2 3) #t) and '() were seen before
+    info = memo_info(env.lookup("len"))
+    assert_equals(2, info["hits"])
+    assert_equals(8, info["misses"])
+
+
+def test_memoized_functions_are_closures():
+    env = Environment()
+    interpret("(define add (memoize (lambda (a b) (+ a b))))", env)
+    assert_equals("<closure/2>", interpret("add", env))
+    with assert_raises_regexp(LispError, "wrong number of arguments"):
+        interpret("(add 1)", env)
+
+
+def test_errors():
+    with assert_raises_regexp(LispError, "memoize: not a function: 1"):
+        interpret("(memoize 1)")
+    with assert_raises_regexp(LispError, "memoize: size must be a positive integer: 0"):
+        interpret("(memoize (lambda (x) x) 0)")
+    with assert_raises_regexp(LispError, "memoize: wrong number of arguments"):
+        interpret("(memoize)")
+    with assert_raises_regexp(LispError, "not a memoized function"):
+        memo_info(interpret_closure("(lambda (x) x)"))
+
+
+def interpret_closure(source):
+    env = Environment()
+    interpret("(define f %s)" % source, env)
+    return env.lookup("f")
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import assert_equals, assert_raises_regexp
+from os.path import dirname, relpath, join
+
+from diylisp.evaluator import use_natives
+from diylisp.interpreter import interpret, interpret_file, ENGINES
+from diylisp.parser import parse, unparse
+from diylisp.types import LispError, Environment
+
+"""
+Tests for the native implementations of the list functions in `stdlib.diy`,
+which must give the same results as their lisp definitions.
+"""
+
+path = join(dirname(relpath(__file__)), '..', 'stdlib.diy')
+
+PROGRAMS = [
+    "(length '())",
+    "(length '(1 #t (2 3)))",
+    "(sum '(1 2 3 4))",
+    "(append '(1 2) '(3 (4)))",
+    "(append '() '())",
+    "(reverse '(1 (2 3) 4))",
+    "(map (lambda (x) (* x x)) '(1 2 3))",
+    "(filter (lambda (x) (> x 2)) '(1 5 2 3))",
+    "(range 1 5)",
+    "(range 3 2)",
+    "(sort '(4 1 3 1 2))",
+    "(length (map length '((1) (1 2) ())))",
+    "(head (tail (reverse (cons 1 (range 2 4)))))",
+]
+
+
+# Programs failing with the same error in both implementations, and edge
+# cases where the lisp definitions do not look at the elements.
+ERRORS = [
+    "(sort '(a))",
+    "(sort '(2 a 1))",
+    "(sort '(#t 1))",
+    "(length 5)",
+    "(sum 5)",
+    "(sum '(1 x y))",
+    "(append 5 '())",
+    "(append '(1) 5)",
+    "(reverse 5)",
+    "(map 5 '(1))",
+    "(map 5 '())",
+    "(map (lambda (x y) x) '(1 2))",
+    "(map < '(1))",
+    "(filter 5 '(1))",
+    "(filter 5 '())",
+    "(range 1 'x)",
+]
+
+
+def outcome(program, env):
+    try:
+        return interpret(program, env)
+    except LispError as e:
+        return "error: %s" % e
+
+
+def stdlib():
+    env = Environment()
+    interpret_file(path, env)
+    return env
+
+
+def test_natives_agree_with_stdlib():
+    env = stdlib()
+    for program in PROGRAMS:
+        use_natives(False)
+        try:
+            expected = interpret(program, env)
+        finally:
+            use_natives(True)
+        assert_equals(expected, interpret(program, env), program)
+
+
+def test_natives_fail_like_stdlib():
+    env = stdlib()
+    for program in ERRORS:
+        use_natives(False)
+        try:
+            expected = outcome(program, env)
+        finally:
+            use_natives(True)
+        assert_equals(expected, outcome(program, env), program)
+
+
+def test_natives_in_all_engines():
+    for name, engine in ENGINES.items():
+        env = stdlib()
+        assert_equals("(1 2 3 4)", unparse(engine(parse("(sort (append '(3 4) '(2 1)))"), env)))
+        assert_equals(15, engine(parse("(sum (map (lambda (x) (+ x 1)) (range 0 4)))"), env))
+
+
+def test_user_definitions_are_not_shadowed():
+    env = Environment()
+    interpret("(define length (lambda (lst n) (if (empty lst) n (length (tail lst) (+ n 1)))))", env)
+    assert_equals("3", interpret("(length '(1 2 3) 0)", env))
+
+
+def test_errors():
+    env = stdlib()
+    with assert_raises_regexp(LispError, "empty: not a list"):
+        interpret("(length 1)", env)
+    with assert_raises_regexp(LispError, "Can't call: 1"):
+        interpret("(map 1 '(1 2))", env)
+    with assert_raises_regexp(LispError, "wrong number of arguments"):
+        interpret("(map (lambda (x y) x) '(1 2))", env)
+    with assert_raises_regexp(LispError, "integers"):
+        interpret("(sum '(1 (2)))", env)
+
+
+def test_native_form_errors():
+    env = Environment()
+    with assert_raises_regexp(LispError, "unknown native function"):
+        interpret("(native frobnicate (lambda (x) x))", env)
+    with assert_raises_regexp(LispError, "not a function"):
+        interpret("(native length 42)", env)
+    with assert_raises_regexp(LispError, "length takes 1 arguments"):
+        interpret("(native length (lambda (x y) x))", env)
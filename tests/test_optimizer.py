@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import assert_equals, assert_raises_regexp, assert_true
+
+from diylisp.bytecode import compile_ast, EVAL_LIST
+from diylisp.evaluator import evaluate
+from diylisp.interpreter import interpret, ENGINES
+from diylisp.optimizer import optimize, optimize_all, INLINED
+from diylisp.parser import parse, parse_multiple
+from diylisp.types import LispError, Environment
+
+"""
+Tests for the optimization pass over ASTs.
+"""
+
+
+def assert_optimized(expected, source):
+    assert_equals(parse(expected), optimize(parse(source)))
+
+
+def test_constant_folding():
+    assert_optimized("3", "(+ 1 2)")
+    assert_optimized("#t", "(> (* 2 (+ 1 2)) (- 10 5))")
+    assert_optimized("#t", "(eq 'x 'x)")
+    assert_optimized("#f", "(eq '(1) '(1))")
+    assert_optimized("#f", "(atom '(1 2))")
+    assert_optimized("(+ x 3)", "(+ x (+ 1 2))")
+    assert_optimized("(cons 3 '())", "(cons (+ 1 2) '())")
+    assert_optimized("(f 3 (g 4))", "(f (+ 1 2) (g (* 2 2)))")
+    assert_optimized("10", "(+ 1 2 3 4)")
+    assert_optimized("-5", "(- 5)")
+    assert_optimized("#f", "(< 1 3 2)")
+
+
+def test_dead_branch_elimination():
+    assert_optimized("a", "(if #t a b)")
+    assert_optimized("b", "(if (> 1 2) a b)")
+    assert_optimized("b", "(if '() a b)")
+    assert_optimized("(if x 1 2)", "(if x (+ 0 1) (+ 1 1))")
+    assert_optimized("(lambda (x) (* x 2))", "(lambda (x) (if (eq 1 1) (* x 2) (fail)))")
+    assert_optimized("(define y 1)", "(define y (if #f 0 1))")
+
+
+def test_quoted_constants_are_shared():
+    first, second = optimize(parse("(cons '(1 2) '(1 2))"))[1:]
+    assert_true(first is second)
+    different = optimize(parse("(cons '(1 2) '(#t 2))"))
+    assert_true(different[1] is not different[2])
+
+    asts = list(optimize_all(parse_multiple("(define a '(foo)) (define b '(foo))")))
+    assert_true(asts[0][2] is asts[1][2])
+
+
+def test_errors_are_kept():
+    for source in ["(+ 1 'x)", "(/ 1 0)", "(mod 1 2 3)", "(- 1 2 'x)", "(< 1)",
+                   "(if #t 1)", "(quote)", "(define x)", "(lambda (x))", "(atom 1 2)"]:
+        assert_equals(parse(source), optimize(parse(source)))
+
+    with assert_raises_regexp(LispError, "can only use integers"):
+        interpret("(if #t (+ 1 'x) 2)", optimize=True)
+
+
+def test_interpret_with_optimizer():
+    env = Environment()
+    interpret("(define f (lambda (x) (if (eq 1 1) (+ x (* 2 3)) (boom))))", env, optimize=True)
+    assert_equals("7", interpret("(f 1)", env, optimize=True))
+    assert_equals("(1 2)", interpret("'(1 2)", env, optimize=True))
+
+
+STDLIB = """
+    (define not (lambda (b) (if b #f #t)))
+    (define and (lambda (a b) (if a b #f)))
+    (define nand (lambda (a b) (not (and a b))))
+    (define fact (lambda (n) (if (eq n 0) 1 (* n (fact (- n 1))))))
+"""
+
+
+def optimized_in(env, source):
+    for ast in parse_multiple(STDLIB):
+        evaluate(ast, env)
+    return optimize(parse(source), env)
+
+
+def test_small_functions_are_inlined():
+    env = Environment({"x": 1})
+    ast = optimized_in(env, "(not (eq x 1))")
+    assert_equals([INLINED, "not", env.lookup("not")], ast[:3])
+    assert_equals(parse("(if (eq x 1) #f #t)"), ast[3])
+    assert_equals(parse("(not (eq x 1))"), ast[4])
+    assert_equals(False, evaluate(ast, env))
+
+
+def test_inlining_nested_functions():
+    env = Environment()
+    ast = optimized_in(env, "(nand #t #t)")
+    inlined_not = ast[3]
+    assert_equals([INLINED, "not"], inlined_not[:2])
+    inlined_and = inlined_not[3][1]
+    assert_equals([INLINED, "and"], inlined_and[:2])
+    assert_equals(True, inlined_and[3])
+    assert_equals(False, evaluate(ast, env))
+
+
+def test_arguments_evaluated_as_in_calls_are_not_inlined():
+    # the second argument would only be evaluated when the first is true
+    ast = optimized_in(Environment(), "(and (eq 1 x) (fail))")
+    assert_equals(parse("(and (eq 1 x) (fail))"), ast)
+    ast = optimized_in(Environment(), "((lambda (y) (and (eq 1 y) y)) 2)")
+    assert_equals(INLINED, ast[0][2][0])
+    assert_equals(parse("(if (eq 1 y) y #f)"), ast[0][2][3])
+
+    # arguments which can not fail may be evaluated conditionally
+    env = Environment()
+    ast = optimized_in(env, "((lambda (x y) (and x (not y))) #t #f)")
+    inlined_and = ast[0][2]
+    assert_equals([INLINED, "and"], inlined_and[:2])
+    assert_equals(["if", "x"], inlined_and[3][:2])
+    assert_equals([INLINED, "not"], inlined_and[3][2][:2])
+    assert_equals(True, evaluate(ast, env))
+
+
+def test_recursive_functions_are_not_inlined():
+    env = Environment()
+    assert_equals(parse("(fact 5)"), optimized_in(env, "(fact 5)"))
+
+
+def test_parameters_shadowing_functions_are_respected():
+    env = Environment()
+    ast = optimized_in(env, "(lambda (not) (not #t))")
+    assert_equals(parse("(lambda (not) (not #t))"), ast)
+
+
+def test_variables_defined_in_the_caller_are_respected():
+    env = Environment()
+    evaluate(parse("(define f (lambda () q))"), env)
+    source = "(lambda (x) (cons (define q 99) (cons (f) '())))"
+    assert_equals(parse(source), optimized_in(env, source))
+    ast = optimize(parse("(lambda (x) (cons (define f 1) (not x)))"), env)
+    assert_equals(INLINED, ast[2][2][0])
+
+    env = Environment()
+    interpret("(define f (lambda () q))", env, optimize=True)
+    interpret("(define g (lambda (x) (cons (define q 99) (cons (f) '()))))", env, optimize=True)
+    with assert_raises_regexp(LispError, "symbol not defined: q"):
+        interpret("(g 1)", env, optimize=True)
+
+
+def test_inlined_calls_check_the_function():
+    env = Environment()
+    ast = optimized_in(env, "(not #t)")
+    assert_equals(False, evaluate(ast, env))
+
+    other = Environment()
+    evaluate(parse("(define not (lambda (b) b))"), other)
+    assert_equals(True, evaluate(ast, other))
+
+    with assert_raises_regexp(LispError, "symbol not defined: not"):
+        evaluate(ast, Environment())
+
+
+def test_inlined_calls_in_all_engines():
+    env = Environment()
+    ast = optimized_in(env, "(nand #t (not #f))")
+    assert_true(EVAL_LIST not in compile_ast(ast).ops[::2])
+    other = Environment()
+    evaluate(parse("(define not (lambda (b) b))"), other)
+    evaluate(parse("(define nand (lambda (a b) (cons a (cons b '()))))"), other)
+
+    for name, engine in ENGINES.items():
+        assert_equals(False, engine(ast, env), name)
+        assert_equals([True, False], engine(ast, other), name)
+        with assert_raises_regexp(LispError, "symbol not defined: nand"):
+            engine(ast, Environment())
+
+
+def test_interpret_with_inlining():
+    env = Environment()
+    for source in STDLIB.strip().split("\n"):
+        interpret(source, env, optimize=True)
+    assert_equals("#t", interpret("(not (and (eq 1 2) #t))", env, optimize=True))
+    assert_equals("120", interpret("(fact 5)", env, optimize=True))
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import assert_equals, assert_true, assert_false, assert_is_none, \
+    assert_raises_regexp
+from os.path import dirname, relpath, join
+
+from diylisp import evaluator, tiering
+from diylisp.interpreter import interpret, interpret_file, interpret_all, ENGINES, \
+    PROFILED_ENGINES
+from diylisp.parser import parse_multiple
+from diylisp.profiler import Profiler, profiling
+from diylisp.types import LispError, Environment
+
+"""
+Tests for the profiler, timing the lisp functions a program calls.
+"""
+
+path = join(dirname(relpath(__file__)), '..', 'stdlib.diy')
+
+
+class Clock:
+    """A clock advancing by one second each time it is read."""
+
+    def __init__(self):
+        self.time = 0
+
+    def __call__(self):
+        self.time += 1
+        return self.time
+
+
+def profile(programs, env=None):
+    env = env if env is not None else Environment()
+    profiler = Profiler(Clock())
+    for program in programs:
+        interpret(program, env, profiler=profiler)
+    return profiler, dict((p.name, p) for p in profiler.stats())
+
+
+def stacks(profiler):
+    return [line.rsplit(" ", 1)[0] for line in profiler.collapsed().splitlines()]
+
+
+def test_calls_are_counted():
+    profiler, profiles = profile([
+        "(define fact (lambda (n) (if (eq n 0) 1 (* n (fact (- n 1))))))",
+        "(fact 5)"])
+    assert_equals(6, profiles["fact"].calls)
+    assert_equals(6, profiles["eq"].calls)
+    assert_equals(5, profiles["*"].calls)
+    assert_equals(5, profiles["-"].calls)
+
+
+def test_times_add_up():
+    profiler, profiles = profile([
+        "(define fact (lambda (n) (if (eq n 0) 1 (* n (fact (- n 1))))))",
+        "(define go (lambda (n) (cons (fact n) (cons (fact n) '()))))",
+        "(go 4)"])
+    total = profiles["go"].inclusive
+    assert_equals(total, sum(p.self_time for p in profiles.values()))
+    assert_true(0 < profiles["fact"].self_time < profiles["fact"].inclusive < total)
+    assert_equals(total * 1e6, sum(int(line.split()[-1])
+                                   for line in profiler.collapsed().splitlines()))
+
+
+def test_stacks():
+    profiler, profiles = profile([
+        "(define fact (lambda (n) (if (eq n 0) 1 (* n (fact (- n 1))))))",
+        "(define loop (lambda (n) (if (eq n 0) (cons (fact 2) '()) (loop (- n 1)))))",
+        "(define outer (lambda () (fact 1)))",
+        "(loop 3)",
+        "(outer)"])
+    assert_equals(4, profiles["loop"].calls)
+    assert_true("loop;fact;fact" in stacks(profiler))
+    assert_true("loop;cons" in stacks(profiler))
+    assert_false(any("loop;loop" in stack for stack in stacks(profiler)))
+    # tail calls replace the caller
+    assert_true("fact;fact" in stacks(profiler))
+    assert_false(any(stack.startswith("outer;") for stack in stacks(profiler)))
+
+
+def test_names():
+    env = Environment()
+    interpret_file(path, env)
+    profiler, profiles = profile([
+        "(define f (lambda (x) (+ x 1)))",
+        "(define g f)",
+        "(g ((lambda (y) y) 1))",
+        "(map (lambda (x) x) '(1 2 3))"], env)
+    assert_equals(1, profiles["f"].calls)
+    assert_false("g" in profiles)
+    assert_equals(4, profiles["lambda"].calls)
+    assert_equals(1, profiles["map"].calls)
+    assert_true("map;lambda" in stacks(profiler))
+
+
+def test_errors_end_the_profile():
+    profiler = Profiler(Clock())
+    env = Environment()
+    interpret("(define f (lambda (x) (head x)))", env)
+    with assert_raises_regexp(LispError, "head: empty list"):
+        interpret("(f '())", env, profiler=profiler)
+    assert_equals([], profiler.frames)
+    assert_is_none(evaluator.tracer)
+    assert_equals(1, dict((p.name, p) for p in profiler.stats())["f"].calls)
+
+
+def test_profiling_nothing():
+    with profiling(None):
+        assert_is_none(evaluator.tracer)
+    assert_equals("3", interpret("(+ 1 2)", profiler=None))
+
+
+def test_engines_without_hooks_are_not_profiled():
+    for engine in set(ENGINES) - set(PROFILED_ENGINES):
+        profiler = Profiler(Clock())
+        with assert_raises_regexp(LispError, "%s engine can not be profiled" % engine):
+            interpret("(+ 1 2)", engine=engine, profiler=profiler)
+        with assert_raises_regexp(LispError, "%s engine can not be profiled" % engine):
+            interpret_all(parse_multiple("(+ 1 2)"), engine=engine, profiler=profiler)
+        assert_equals([], profiler.stats())
+        assert_equals("3", interpret("(+ 1 2)", engine=engine))
+
+
+def test_tiered_programs_are_not_profiled():
+    previous = tiering.install(tiering.Tiering())
+    try:
+        with assert_raises_regexp(LispError, "while tiering"):
+            interpret("(+ 1 2)", profiler=Profiler(Clock()))
+    finally:
+        tiering.install(previous)
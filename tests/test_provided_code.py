@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 
+from StringIO import StringIO
+
 from nose.tools import assert_equals, assert_raises_regexp, assert_raises
 
-from diylisp.parser import unparse, find_matching_paren
-from diylisp.types import LispError
+from diylisp.parser import unparse, find_matching_paren, parse_multiple
+from diylisp.interpreter import interpret_stream
+from diylisp.types import LispError, Environment
 
 """
 This module contains a few tests for the code provided for part 1.
@@ -38,6 +41,37 @@ def test_find_matching_paren_throws_exception_on_no_closing_paren():
     with assert_raises_regexp(LispError, "Incomplete expression"):
         find_matching_paren("string (without closing paren", 7)
 
+## Tests for parse_multiple in parser.py
+
+
+def test_parse_multiple():
+    source = """
+        (define x 1) ; first
+        'x
+        42"""
+    assert_equals([["define", "x", 1], ["quote", "x"], 42], parse_multiple(source))
+
+
+def test_parse_multiple_incomplete_expression():
+    with assert_raises_regexp(LispError, "Incomplete expression"):
+        parse_multiple("(foo) (bar")
+
+## Tests for interpret_stream in interpreter.py
+
+
+def test_interpret_stream():
+    stream = StringIO("(define x 40)\n(define y\n 2)\n(+ x y)\n")
+    assert_equals("42", interpret_stream(stream))
+
+
+def test_interpret_stream_evaluates_while_reading():
+    """Each statement is evaluated before the rest of the stream is parsed."""
+
+    env = Environment()
+    with assert_raises_regexp(LispError, "Incomplete expression"):
+        interpret_stream(StringIO("(define x 42) (define y"), env)
+    assert_equals(42, env.lookup("x"))
+
 ## Tests for unparse in parser.py
 
 
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import operator
+
+from nose.tools import assert_equals, assert_raises_regexp
+
+from diylisp import evaluator
+from diylisp.evaluator import evaluate, register_special_form, register_builtin, \
+    register_procedure
+from diylisp.interpreter import ENGINES
+from diylisp.parser import parse
+from diylisp.types import LispError, Environment
+
+"""
+Special forms can be added from Python, and are then understood by each of
+the evaluation engines.
+"""
+
+
+def eval_unless(ast, env):
+    """(unless predicate alternative), evaluating alternative in tail position"""
+    if evaluate(ast[1], env):
+        return False, env
+    return ast[2], env
+
+
+def eval_count_args(ast, env):
+    return len(ast) - 1
+
+
+def unregister(name):
+    evaluator.SPECIAL_FORMS.pop(name, None)
+    evaluator.TAIL_FORMS.pop(name, None)
+    evaluator.BUILTINS.pop(name, None)
+    Environment.builtins.pop(name, None)
+
+
+def test_registered_forms_in_all_engines():
+    register_special_form("unless", eval_unless, tail=True)
+    register_special_form("count-args", eval_count_args)
+    try:
+        for name, engine in ENGINES.items():
+            env = Environment()
+            assert_equals(3, engine(parse("(count-args a (b c) d)"), env))
+            assert_equals(False, engine(parse("(unless #t (fail))"), env))
+            assert_equals(42, engine(parse("(unless (> 1 2) (+ 40 2))"), env))
+            assert_equals(5, engine(parse("((lambda (x) (unless #f (count-args x x x x x))) 1)"), env))
+    finally:
+        unregister("unless")
+        unregister("count-args")
+
+
+def test_tail_forms_run_in_constant_stack_space():
+    register_special_form("unless", eval_unless, tail=True)
+    try:
+        env = Environment()
+        evaluate(parse("""
+            (define count-down
+                (lambda (n)
+                    (unless (eq n 0) (count-down (- n 1)))))"""), env)
+        assert_equals(False, evaluate(parse("(count-down 3000)"), env))
+    finally:
+        unregister("unless")
+
+
+def test_registered_builtin():
+    register_builtin("max", max)
+    try:
+        for name, engine in ENGINES.items():
+            assert_equals(7, engine(parse("(max 3 (+ 3 4))"), Environment()))
+            assert_equals(7, engine(parse("((lambda (f) (f 3 7)) max)"), Environment()))
+            with assert_raises_regexp(LispError, "too many arguments"):
+                engine(parse("(max 1 2 3)"), Environment())
+    finally:
+        unregister("max")
+
+
+def test_registered_python_builtins():
+    register_procedure("add", operator.add)
+    register_procedure("py-len", len)
+    try:
+        for name, engine in ENGINES.items():
+            assert_equals(7, engine(parse("(add 3 (+ 2 2))"), Environment()), name)
+            assert_equals(2, engine(parse("((lambda (f) (f '(1 2))) py-len)"), Environment()), name)
+    finally:
+        unregister("add")
+        unregister("py-len")
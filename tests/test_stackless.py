@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import sys
+
+from nose.tools import assert_equals, assert_raises_regexp
+
+from diylisp.parser import parse
+from diylisp.stackless import evaluate
+from diylisp.types import LispError, Environment
+
+"""
+Tests for the evaluator keeping its control stack on the heap. It should give
+the same results, and raise the same errors, as the recursive `evaluate`.
+"""
+
+
+def test_define():
+    env = Environment()
+    assert_equals(4, evaluate(parse("(define foo (+ 2 2))"), env))
+    assert_equals(4, env.lookup("foo"))
+
+
+def test_deep_recursion():
+    """Non-tail recursion far deeper than the Python recursion limit."""
+
+    env = Environment()
+    evaluate(parse("""
+        (define build
+            (lambda (n)
+                (if (eq n 0)
+                    '()
+                    (cons n (build (- n 1))))))
+    """), env)
+
+    depth = sys.getrecursionlimit() * 5
+    assert_equals(depth, evaluate(parse("(head (build %d))" % depth), env))
+
+
+def test_errors():
+    with assert_raises_regexp(LispError, "Wrong number of arguments"):
+        evaluate(parse("(define x 1 2)"), Environment())
+    with assert_raises_regexp(LispError, "non-symbol"):
+        evaluate(parse("(define #t 42)"), Environment())
+    with assert_raises_regexp(LispError, "not a function"):
+        evaluate(parse("(#t 'foo 'bar)"), Environment())
+    with assert_raises_regexp(LispError, "Can't call"):
+        evaluate(parse("((if #t 1 2) 3)"), Environment())
+    with assert_raises_regexp(LispError, "wrong number of arguments, expected 2 got 3"):
+        evaluate(parse("((lambda (a b) a) 1 2 3)"), Environment())
+    with assert_raises_regexp(LispError, "too many arguments"):
+        evaluate(parse("(mod 1 2 3)"), Environment())
+    with assert_raises_regexp(LispError, "my-var"):
+        evaluate(parse("my-var"), Environment())
+
+
+def test_hand_written_asts():
+    """ASTs built from plain strings, rather than parsed into Symbols."""
+    env = Environment({"x": 2})
+    assert_equals(5, evaluate(["+", "x", ["if", True, 3, 4]], env))
+    assert_equals(2, evaluate([["lambda", ["y"], "y"], "x"], env))
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import assert_equals, assert_raises_regexp, assert_true
+
+from diylisp.evaluator import register_procedure
+from diylisp.interpreter import interpret, ENGINES
+from diylisp.parser import parse, unparse
+from diylisp.types import LispError, Environment, Promise, stream
+
+"""
+Tests for promises made by `delay`, and for lazy lists.
+"""
+
+
+class Counter:
+    """A procedure `tick` returning its argument, counting its calls."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __enter__(self):
+        register_procedure("tick", self.tick)
+        return self
+
+    def __exit__(self, *exc_info):
+        del Environment.builtins["tick"]
+
+    def tick(self, value):
+        self.calls += 1
+        return value
+
+
+def run(engine, source, env):
+    return unparse(engine(parse(source), env))
+
+
+def test_delay_and_force():
+    for name, engine in ENGINES.items():
+        with Counter() as counter:
+            env = Environment()
+            engine(parse("(define p (delay (tick (+ 1 2))))"), env)
+            assert_equals(0, counter.calls)
+            assert_true(isinstance(env.lookup("p"), Promise))
+            assert_equals("3", run(engine, "(force p)", env))
+            assert_equals("3", run(engine, "(force p)", env))
+            assert_equals(1, counter.calls)
+            assert_equals("5", run(engine, "(force 5)", env))
+
+
+def test_delay_captures_environment():
+    env = Environment()
+    interpret("(define later (lambda (x) (delay (* x 2))))", env)
+    assert_equals("42", interpret("(force (later 21))", env))
+
+
+def test_stream_elements_are_computed_on_demand():
+    for name, engine in ENGINES.items():
+        with Counter() as counter:
+            env = Environment()
+            engine(parse("(define s (stream-map tick (stream-range 1)))"), env)
+            assert_equals(0, counter.calls)
+            assert_equals("(...)", run(engine, "s", env))
+            assert_equals("2", run(engine, "(head (tail s))", env))
+            assert_equals(2, counter.calls)
+            assert_equals("(1 2 ...)", run(engine, "s", env))
+            assert_equals("(1 2 3)", run(engine, "(stream-take 3 s)", env))
+            assert_equals(3, counter.calls)
+
+
+def test_stream_pipeline():
+    for name, engine in ENGINES.items():
+        env = Environment()
+        assert_equals("(7 14 21)", run(engine, """
+            (stream-take 3
+                (stream-filter (lambda (x) (eq 0 (mod x 7)))
+                    (stream-range 1 1000000000)))""", env))
+        assert_equals("(4 5)", run(engine, "(stream-take 5 (stream-range 4 5))", env))
+        assert_equals("#t", run(engine, "(empty (stream-range 3 2))", env))
+        assert_equals("(2 4)", run(engine, "(stream-take 5 (stream-map (lambda (x) (* x 2)) '(1 2)))", env))
+
+
+def test_cons_stream():
+    for name, engine in ENGINES.items():
+        env = Environment()
+        engine(parse("(define ints (lambda (n) (cons-stream n (ints (+ n 1)))))"), env)
+        engine(parse("(define nat (ints 0))"), env)
+        assert_equals("(0 ...)", run(engine, "nat", env))
+        assert_equals("3", run(engine, "(head (tail (tail (tail nat))))", env))
+        assert_equals("(0 1 2 3 ...)", run(engine, "nat", env))
+        assert_equals("(1 2)", run(engine, "(stream-take 2 (cons-stream 1 (cons 2 '())))", env))
+
+
+def test_streams_are_lists():
+    env = Environment()
+    assert_equals("#t", interpret("(empty (tail (cons-stream 1 '())))", env))
+    assert_equals("(0 ...)", interpret("(cons 0 (stream-range 1 2))", env))
+    assert_equals("(0 1 2)", interpret("(stream-take 5 (cons 0 (stream-range 1 2)))", env))
+    assert_equals([1, 2, 3], stream(iter([1, 2, 3])))
+
+
+def test_errors():
+    env = Environment()
+    with assert_raises_regexp(LispError, "delay: wrong number of arguments"):
+        interpret("(delay 1 2)", env)
+    with assert_raises_regexp(LispError, "cons-stream: not a list: 2"):
+        interpret("(empty (tail (cons-stream 1 2)))", env)
+    with assert_raises_regexp(LispError, "head: empty list"):
+        interpret("(head (stream-range 2 1))", env)
+    with assert_raises_regexp(LispError, "stream-range: not an integer"):
+        interpret("(stream-range 'a)", env)
+    with assert_raises_regexp(LispError, "stream-map: not a list"):
+        interpret("(stream-map - 1)", env)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import assert_equals, assert_true, assert_false, assert_is_none
+from os.path import dirname, relpath, join
+
+from diylisp import tiering
+from diylisp.interpreter import interpret, interpret_file
+from diylisp.tiering import Tiering
+from diylisp.types import Environment
+
+"""
+Tests for tiered execution, promoting the closures called most often to
+Python functions.
+"""
+
+path = join(dirname(relpath(__file__)), '..', 'stdlib.diy')
+
+
+def run(policy, programs, env=None):
+    """Interpret the programs with `policy` installed, returning the value
+    of the last one."""
+    env = env if env is not None else Environment()
+    previous = tiering.install(policy)
+    try:
+        for program in programs:
+            result = interpret(program, env)
+    finally:
+        tiering.install(previous)
+    return result
+
+
+def test_calls_are_counted():
+    env = Environment()
+    run(Tiering(), ["(define id (lambda (x) x))", "(id (id 1))", "(id 2)"], env)
+    closure = env.lookup("id")
+    assert_equals(3, closure.calls)
+    assert_equals(0, closure.loops)
+    assert_is_none(closure.python)
+
+
+def test_hot_closures_are_promoted():
+    env = Environment()
+    policy = Tiering(call_threshold=5)
+    run(policy, ["(define fact (lambda (n) (if (eq n 0) 1 (* n (fact (- n 1))))))",
+                 "(fact 3)"], env)
+    assert_equals(0, policy.promoted)
+    assert_equals("3628800", run(policy, ["(fact 10)"], env))
+    assert_equals(1, policy.promoted)
+
+    closure = env.lookup("fact")
+    assert_true(closure.python)
+    promotion = policy.promotions[0]
+    assert_true(promotion.closure is closure and promotion.promoted)
+    assert_equals(5, promotion.calls)
+
+
+def test_loops_are_promoted():
+    env = Environment()
+    policy = Tiering(call_threshold=10 ** 6, loop_threshold=10)
+    result = run(policy, ["(define loop (lambda (n) (if (eq n 0) 'done (loop (- n 1)))))",
+                          "(loop 100000)"], env)
+    assert_equals("done", result)
+    promotion = policy.promotions[0]
+    assert_equals((11, 10), (promotion.calls, promotion.loops))
+
+
+def test_promoted_closures_give_the_same_results():
+    programs = ["(sort (map (lambda (x) (mod (* x 7) 11)) (range 1 20)))",
+                "(length (filter (lambda (x) (> x 3)) (reverse (range 1 30))))"]
+    for program in programs:
+        env = Environment()
+        interpret_file(path, env)
+        expected = interpret(program, env)
+        assert_equals(expected, run(Tiering(call_threshold=2, loop_threshold=2), [program], env))
+
+
+def test_closures_which_can_not_be_translated():
+    env = Environment()
+    policy = Tiering(call_threshold=2)
+    run(policy, ["(define f (lambda (x) (define y x)))", "(f 1)", "(f 2)", "(f 3)"], env)
+    assert_false(env.lookup("f").python)
+    assert_equals({"call_threshold": 2, "loop_threshold": tiering.DEFAULT_LOOP_THRESHOLD,
+                   "promoted": 0, "failed": 1}, policy.info())
+
+
+def test_not_counted_without_policy():
+    env = Environment()
+    interpret("(define id (lambda (x) x))", env)
+    interpret("(id 1)", env)
+    assert_equals(0, env.lookup("id").calls)
+
+
+def test_mutual_tail_calls_of_promoted_closures():
+    env = Environment()
+    policy = Tiering(call_threshold=100)
+    run(policy, ["(define even? (lambda (n) (if (eq n 0) #t (odd? (- n 1)))))",
+                 "(define odd? (lambda (n) (if (eq n 0) #f (even? (- n 1)))))"], env)
+    assert_equals("#t", run(policy, ["(even? 100000)"], env))
+    assert_equals("#t", run(policy, ["(odd? 100001)"], env))
+    assert_equals(2, policy.promoted)
+
+    run(policy, ["(define loop (lambda (n acc) (if (eq n 0) acc (step n acc))))",
+                 "(define step (lambda (n acc) (loop (- n 1) (+ acc 1))))"], env)
+    assert_equals("50000", run(policy, ["(loop 50000 0)"], env))
+    assert_equals(4, policy.promoted)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from nose.tools import assert_equals, assert_true
+
+from diylisp import trace
+from diylisp.interpreter import interpret
+from diylisp.types import Environment
+
+"""
+Tests for the tracer hooks of the parser and evaluator.
+"""
+
+
+class RecordingTracer(trace.Tracer):
+
+    def __init__(self):
+        self.events = []
+
+    def parse(self, source):
+        self.events.append(("parse", source))
+
+    def enter(self, ast, env):
+        self.events.append(("enter", ast))
+
+    def leave(self, value):
+        self.events.append(("leave", value))
+
+    def call(self, closure, values):
+        self.events.append(("call", values))
+
+    def builtin(self, name, values):
+        self.events.append(("builtin", name, values))
+
+
+def traced(source):
+    tracer = RecordingTracer()
+    env = Environment()
+    trace.install(tracer)
+    try:
+        result = interpret(source, env)
+    finally:
+        trace.uninstall()
+    return result, tracer.events
+
+
+def test_events():
+    result, events = traced("((lambda (x) (+ x 1)) 41)")
+    assert_equals("42", result)
+    assert_equals([("parse", "((lambda (x) (+ x 1)) 41)"),
+                   ("enter", [["lambda", ["x"], ["+", "x", 1]], 41]),
+                   ("enter", ["lambda", ["x"], ["+", "x", 1]]),
+                   ("leave", events[3][1]),
+                   ("enter", 41),
+                   ("leave", 41),
+                   ("call", [41]),
+                   ("enter", "x"),
+                   ("leave", 41),
+                   ("enter", 1),
+                   ("leave", 1),
+                   ("builtin", "+", [41, 1]),
+                   ("leave", 42)], events)
+
+
+def test_enter_and_leave_balance():
+    _, events = traced("(if (eq (head '(1 2)) 1) (cons 1 '()) #f)")
+    kinds = [event[0] for event in events]
+    assert_equals(kinds.count("enter"), kinds.count("leave"))
+    assert_true(("builtin", "head", [[1, 2]]) in events)
+    assert_true(("builtin", "eq", [1, 1]) in events)
+    assert_true(("builtin", "cons", [1, []]) in events)
+
+
+def test_no_tracer_installed():
+    assert_equals(None, trace.uninstall())
+    assert_equals("3", interpret("(+ 1 2)", Environment()))
+
+
+def test_logging_tracer():
+    records = []
+
+    class Handler(logging.Handler):
+        def emit(self, record):
+            records.append(record.getMessage())
+
+    handler = Handler()
+    logger = logging.getLogger("diylisp.evaluator")
+    logger.addHandler(handler)
+    trace.install(trace.LoggingTracer())
+    try:
+        interpret("(+ 1 2)", Environment())
+    finally:
+        trace.uninstall()
+        logger.removeHandler(handler)
+
+    assert_true("evaluate: ['+', 1, 2] in " in records[0])
+    assert_true("eval_+: param values: [1, 2]" in records)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import assert_equals, assert_is, assert_true, assert_false, \
+    assert_raises_regexp
+from os.path import dirname, relpath, join
+
+from diylisp.interpreter import interpret, interpret_file, ENGINES
+from diylisp.parser import parse, unparse
+from diylisp.transpiler import Translator, transpile, is_transpiled
+from diylisp.types import LispError, Environment
+
+"""
+Tests for translating functions into Python code with `transpile`. The
+transpiled functions must give the same results, and raise the same errors,
+as the functions they were made from.
+"""
+
+path = join(dirname(relpath(__file__)), '..', 'stdlib.diy')
+
+FUNCTIONS = [
+    ("(lambda (n) (if (eq n 0) 1 (* n (f (- n 1)))))", ["0", "5", "20"]),
+    ("(lambda (n) (if (< n 2) n (+ (f (- n 1)) (f (- n 2)))))", ["10"]),
+    ("(lambda (a b) (if (> a b) (cons a '(x)) (- a b 1)))", ["3 2", "2 3", "5 5"]),
+    ("(lambda (lst) (if (empty lst) '() (cons (head lst) (f (tail lst)))))", ["'(1 (2) #t)"]),
+    ("(lambda (x) (if (atom x) (eq x 'a) (mod (head x) 3)))", ["'a", "'b", "'(7)"]),
+    ("(lambda (f) ((lambda (g) (g 2 3)) f))", ["+", "<", "(lambda (a b) b)"]),
+    ("(lambda (n) (map (lambda (x) (* x n)) (range 1 n)))", ["3"]),
+    ("(lambda (x) (if x (+ 1 2 x) (< 1 2 3)))", ["#f", "4"]),
+    ("(lambda () (stream-take 3 (cons-stream 1 (stream-range 5))))", [""]),
+]
+
+ERRORS = [
+    ("(lambda (x) (+ x 1))", "'a", "can only use integers"),
+    ("(lambda (x) (x 1))", "2", "Can't call: 2"),
+    ("(lambda (x) (head x))", "'()", "head: empty list"),
+    ("(lambda (x) (nowhere x))", "1", "symbol not defined: nowhere"),
+    ("(lambda (x) (if x 1))", "1", "Malformed if"),
+    ("(lambda (f) (f 1 2))", "(lambda (a) a)", "wrong number of arguments"),
+]
+
+
+def stdlib():
+    env = Environment()
+    interpret_file(path, env)
+    return env
+
+
+def test_transpiled_functions_agree():
+    for function, calls in FUNCTIONS:
+        for transpiled in (False, True):
+            env = stdlib()
+            interpret("(define f %s)" % (("(transpile %s)" if transpiled else "%s") % function), env)
+            results = [interpret("(f %s)" % args, env) for args in calls]
+            if not transpiled:
+                expected = results
+        assert_equals(expected, results, function)
+
+
+def test_transpiled_errors():
+    for function, args, message in ERRORS:
+        env = Environment()
+        interpret("(define f (transpile %s))" % function, env)
+        with assert_raises_regexp(LispError, message):
+            interpret("(f %s)" % args, env)
+
+
+def test_transpiled_functions_in_all_engines():
+    for name, engine in ENGINES.items():
+        env = Environment()
+        engine(parse("(define fact (transpile (lambda (n) (if (eq n 0) 1 (* n (fact (- n 1)))))))"), env)
+        assert_equals(120, engine(parse("(fact 5)"), env), name)
+        assert_equals("#t", unparse(engine(parse("(eq (transpile fact) fact)"), env)), name)
+
+
+def test_tail_calls_to_self_loop():
+    env = Environment()
+    interpret("(define loop (transpile (lambda (n) (if (eq n 0) 'done (loop (- n 1))))))", env)
+    assert_equals("done", interpret("(loop 100000)", env))
+
+
+def test_if_and_builtins_are_translated():
+    source = Translator(parse("(n)")).translate(parse("(if (< n 1) (+ (if n 2 3) 1) (* n 2))"))
+    assert_true("(p0 < 1 if type(p0) is int" in source, source)
+    assert_true("(2 if p0 else 3)" in source, source)
+    assert_true("p0 * 2" in source, source)
+    assert_false("fallback" in source, source)
+
+
+def test_functions_with_define_are_not_transpiled():
+    env = Environment()
+    closure = interpret_closure("(lambda (x) (define y x))", env)
+    assert_is(closure, transpile(closure))
+    closure = interpret_closure("(lambda (x) '(define y x))", env)
+    assert_true(is_transpiled(transpile(closure)))
+
+
+def test_transpile_errors():
+    with assert_raises_regexp(LispError, "transpile: not a function: 1"):
+        interpret("(transpile 1)")
+
+
+def interpret_closure(source, env):
+    return ENGINES["eval"](parse(source), env)
+
+
+def test_tail_calls_to_other_functions_run_in_constant_stack_space():
+    for odd in ["(transpile (lambda (n) (if (eq n 0) #f (even? (- n 1)))))",
+                       "(lambda (n) (if (eq n 0) #f (even? (- n 1))))"]:
+        env = Environment()
+        interpret("(define even? (transpile (lambda (n) (if (eq n 0) #t (odd? (- n 1))))))", env)
+        interpret("(define odd? %s)" % odd, env)
+        assert_equals("#t", interpret("(even? 100000)", env))
+        assert_equals("#f", interpret("(odd? 100000)", env))
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import assert_equals, assert_raises_regexp
+
+from diylisp.interpreter import interpret, ENGINES
+from diylisp.optimizer import optimize
+from diylisp.parser import parse, unparse
+from diylisp.types import LispError, Environment, make_vector
+
+"""
+Tests for vectors, and the builtins working on them.
+"""
+
+
+def run(engine, source):
+    return unparse(engine(parse(source), Environment()))
+
+
+def test_parse_vectors():
+    assert_equals(make_vector([1, -2, 3]), parse("[1 -2 3]"))
+    assert_equals(["f", make_vector([]), ["quote", make_vector([4])]], parse("(f [] '[4])"))
+    assert_equals("(f [1 2] '[])", unparse(parse("(f [1 2] '[])")))
+
+
+def test_parse_errors():
+    with assert_raises_regexp(LispError, "vector elements must be integers"):
+        parse("[1 x]")
+    with assert_raises_regexp(LispError, "vector elements must be integers"):
+        parse("[[1] 2]")
+    with assert_raises_regexp(LispError, "Unexpected '\\)'"):
+        parse("[1 2)")
+    with assert_raises_regexp(LispError, "Unexpected '\\]'"):
+        parse("(1 2]")
+    with assert_raises_regexp(LispError, "Incomplete expression"):
+        parse("[1 2")
+
+
+def test_elementwise_builtins():
+    for name, engine in ENGINES.items():
+        assert_equals("[1 2 3]", run(engine, "[1 2 3]"))
+        assert_equals("[4 10 18]", run(engine, "(* [1 2 3] [4 5 6])"))
+        assert_equals("[2 3 4]", run(engine, "(+ [1 2 3] 1)"))
+        assert_equals("[9 8]", run(engine, "(- 10 [1 2])"))
+        assert_equals("[1 0 0]", run(engine, "(< [1 2 3] 2)"))
+        assert_equals("[1 2]", run(engine, "(mod [7 8] 3)"))
+        assert_equals("[13 14]", run(engine, "(+ 1 [2 3] 10)"))
+
+
+def test_elementwise_errors():
+    for name, engine in ENGINES.items():
+        with assert_raises_regexp(LispError, "vectors of different lengths"):
+            run(engine, "(+ [1 2] [1 2 3])")
+        with assert_raises_regexp(LispError, "can only use integers"):
+            run(engine, "(+ [1 2] 'x)")
+        with assert_raises_regexp(LispError, "integers in range"):
+            run(engine, "(* [4611686018427387904] 4)")
+
+
+def test_vector_procedures():
+    for name, engine in ENGINES.items():
+        assert_equals("[1 2 3]", run(engine, "(vector 1 2 (+ 1 2))"))
+        assert_equals("[1 2]", run(engine, "(list->vector (cons 1 '(2)))"))
+        assert_equals("(1 2)", run(engine, "(vector->list [1 2])"))
+        assert_equals("3", run(engine, "(vlength [7 8 9])"))
+        assert_equals("8", run(engine, "(vref [7 8 9] 1)"))
+        assert_equals("[8 9]", run(engine, "(vslice [7 8 9] 1 3)"))
+        assert_equals("[]", run(engine, "(vslice [7 8 9] 1 1)"))
+        assert_equals("14", run(engine, "(vsum (* [1 2 3] [1 2 3]))"))
+        assert_equals("0", run(engine, "(vsum [])"))
+        assert_equals("[]", run(engine, "(vector)"))
+
+        env = Environment()
+        engine(parse("(define h (lambda (f) (f)))"), env)
+        assert_equals("[]", unparse(engine(parse("(h vector)"), env)), name)
+
+
+def test_vmap():
+    for name, engine in ENGINES.items():
+        assert_equals("[-1 -2]", run(engine, "(vmap - [1 2])"))
+        assert_equals("[5 7]", run(engine, "(vmap + [1 2] [4 5])"))
+        assert_equals("[10 20]", run(engine, "(vmap (lambda (x) (* x 10)) [1 2])"))
+        assert_equals("[1 0]", run(engine, "(vmap (lambda (x y) (< x y)) [1 5] [2 3])"))
+
+
+def test_vector_procedure_errors():
+    for name, engine in ENGINES.items():
+        with assert_raises_regexp(LispError, "vsum: not a vector: \\(1 2\\)"):
+            run(engine, "(vsum '(1 2))")
+        with assert_raises_regexp(LispError, "vref: index out of range: 3"):
+            run(engine, "(vref [1 2 3] 3)")
+        with assert_raises_regexp(LispError, "vslice: indices out of range"):
+            run(engine, "(vslice [1 2 3] 2 1)")
+        with assert_raises_regexp(LispError, "vector elements must be integers"):
+            run(engine, "(list->vector '(1 x))")
+        with assert_raises_regexp(LispError, "vmap: vectors of different lengths"):
+            run(engine, "(vmap + [1] [1 2])")
+        with assert_raises_regexp(LispError, "mod: wrong number of arguments: 1"):
+            run(engine, "(vmap mod [1])")
+        with assert_raises_regexp(LispError, "vlength: wrong number of arguments: 2"):
+            run(engine, "(vlength [1] [2])")
+
+
+def test_vectors_are_values():
+    assert_equals("#t", interpret("(atom [1 2])"))
+    assert_equals("#t", interpret("(eq [1 2] (vector 1 2))"))
+    assert_equals("#f", interpret("(eq [1 2] [2 1])"))
+    assert_equals("2", interpret("(if [] 1 2)"))
+    assert_equals(parse("[2 3]"), optimize(parse("(if [1] [2 3] 4)")))
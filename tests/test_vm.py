@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+from nose.tools import assert_equals, assert_raises_regexp
+
+from diylisp.bytecode import compile_ast, CALL, TAIL_CALL
+from diylisp.parser import parse
+from diylisp.types import LispError, Environment
+from diylisp.vm import execute
+
+"""
+Tests for the bytecode compiler and virtual machine. Programs run on the VM
+should give the same results, and raise the same errors, as with `evaluate`.
+"""
+
+
+def test_define_and_call():
+    env = Environment()
+    execute(parse("(define add (lambda (x y) (+ x y)))"), env)
+    assert_equals(3, execute(parse("(add 1 2)"), env))
+
+
+def test_deep_recursion_does_not_use_the_python_stack():
+    env = Environment()
+    execute(parse("""
+        (define sum-to
+            (lambda (n)
+                (if (eq n 0)
+                    0
+                    (+ n (sum-to (- n 1))))))
+    """), env)
+    assert_equals(50005000, execute(parse("(sum-to 10000)"), env))
+
+
+def test_calls_in_tail_position():
+    code = compile_ast(parse("(lambda (n) (if (eq n 0) (f 1) (g (h n))))"))
+    body = code.consts[0].code
+    calls = [body.ops[pc] for pc in range(0, len(body.ops), 2)
+             if body.ops[pc] in (CALL, TAIL_CALL)]
+    assert_equals([TAIL_CALL, CALL, TAIL_CALL], calls)
+
+
+def test_errors():
+    assert_equals(42, execute(parse("(if #t 42 (define x))"), Environment()))
+
+    with assert_raises_regexp(LispError, "Wrong number of arguments"):
+        execute(parse("(define x)"), Environment())
+    with assert_raises_regexp(LispError, "not a function"):
+        execute(parse("(42)"), Environment())
+    with assert_raises_regexp(LispError, "Can't call"):
+        execute(parse("(x 1)"), Environment({"x": 1}))
+    with assert_raises_regexp(LispError, "wrong number of arguments, expected 2 got 3"):
+        execute(parse("((lambda (a b) a) 1 2 3)"), Environment())
+    with assert_raises_regexp(LispError, "head: empty list"):
+        execute(parse("(head '())"), Environment())